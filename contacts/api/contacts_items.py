@@ -1,160 +1,388 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import Optional, List
-from dependencies.auth import get_current_user_email
-from dependencies.database import get_db, SessionLocal
-from depenedencies.rate_limiter import rate_limit
-from schemas.contacts_schemas import Contact, ContactCreate, ContactUpdate
-from services.contacts_service import ContactService
-from services.user_service import UserService
-
-router = APIRouter()
-
-
-@router.get('/')
-async def list_contacts(first_name: Optional[str] = None, last_name: Optional[str] = None,
-                        email: Optional[str] = None, current_email: str = Depends(get_current_user_email),
-                        db: SessionLocal = Depends(get_db), rl=Depends(rate_limit)) -> List[Contact]:
-    """
-    Retrieve a list of contacts based on specified criteria.
-
-    :param first_name: Filter by first name.
-    :type first_name: str, optional
-    :param last_name: Filter by last name.
-    :type last_name: str, optional
-    :param email: Filter by email.
-    :type email: str, optional
-    :param current_email: The email of the current user.
-    :type current_email: str
-    :param db: Database session dependency.
-    :type db: SessionLocal
-    :param rl: Rate limit dependency.
-    :type rl: RateLimiter
-    :return: A list of contacts matching the criteria.
-    :rtype: List[Contact]
-    """
-    user_service = UserService(db=db)
-    user = user_service.get_by_email(current_email)
-    if user is None:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Invalid email from token')
-    else:
-        contact_service = ContactService(db=db)
-        result = []
-        if first_name:
-            contact = await contact_service.get_by_first_name(first_name, current_email)
-            result.append(contact)
-        elif last_name:
-            contact = await contact_service.get_by_last_name(last_name, current_email)
-            result.append(contact)
-        elif email:
-            contact = await contact_service.get_by_email(email, current_email)
-            result.append(contact)
-        else:
-            contact = await contact_service.get_all_contacts(current_email)
-            result.append(contact)
-        return result
-
-
-@router.get('/{id}')
-async def get_contact_by_id(id: int, db: SessionLocal = Depends(get_db),
-                            current_email: str = Depends(get_current_user_email), rl=Depends(rate_limit)) -> Contact:
-    """
-    Retrieve a contact by its ID.
-
-    :param id: The ID of the contact to retrieve.
-    :type id: int
-    :param db: Database session dependency.
-    :type db: SessionLocal
-    :param current_email: The email of the current user.
-    :type current_email: str
-    :param rl: Rate limit dependency.
-    :type rl: RateLimiter
-    :return: The contact with the specified ID.
-    :rtype: Contact
-    """
-    contact_item = await ContactService(db=db).get_by_id(id, current_email)
-    return contact_item
-
-
-@router.post('/')
-async def create_contact(contact_item: ContactCreate, db: SessionLocal = Depends(get_db),
-                         current_email: str = Depends(get_current_user_email), rl=Depends(rate_limit)) -> Contact:
-    """
-    Create a new contact.
-
-    :param contact_item: Data for the new contact.
-    :type contact_item: ContactCreate
-    :param db: Database session dependency.
-    :type db: SessionLocal
-    :param current_email: The email of the current user.
-    :type current_email: str
-    :param rl: Rate limit dependency.
-    :type rl: RateLimiter
-    :return: The newly created contact.
-    :rtype: Contact
-    """
-    new_contact = await ContactService(db=db).create_contact(contact_item, current_email)
-    return new_contact
-
-
-@router.put('/{id}')
-async def update_contact(id: int, contact_item: ContactUpdate, db: SessionLocal = Depends(get_db),
-                         current_email: str = Depends(get_current_user_email), rl=Depends(rate_limit)) -> Contact:
-    """
-    Update an existing contact.
-
-    :param id: The ID of the contact to update.
-    :type id: int
-    :param contact_item: Updated data for the contact.
-    :type contact_item: ContactUpdate
-    :param db: Database session dependency.
-    :type db: SessionLocal
-    :param current_email: The email of the current user.
-    :type current_email: str
-    :param rl: Rate limit dependency.
-    :type rl: RateLimiter
-    :return: The updated contact.
-    :rtype: Contact
-    """
-    updated_contact = await ContactService(db=db).update(id, contact_item, current_email)
-    return updated_contact
-
-
-@router.delete('/{id}')
-async def delete_contact(id: int, db: SessionLocal = Depends(get_db),
-                         current_email: str = Depends(get_current_user_email), rl=Depends(rate_limit)) -> Contact:
-    """
-    Delete a contact.
-
-    :param id: The ID of the contact to delete.
-    :type id: int
-    :param db: Database session dependency.
-    :type db: SessionLocal
-    :param current_email: The email of the current user.
-    :type current_email: str
-    :param rl: Rate limit dependency.
-    :type rl: RateLimiter
-    :return: The removed contact.
-    :rtype: Contact
-    """
-    removed_contact = await ContactService(db=db).remove(id, current_email)
-    return removed_contact
-
-
-@router.get('/birthdays_in_7_days')
-async def contacts_birthdays_in_7_days(db: SessionLocal = Depends(get_db),
-                                       current_email: str = Depends(get_current_user_email),
-                                       rl=Depends(rate_limit)) -> list[Contact]:
-    """
-    Retrieve contacts with birthdays in the next 7 days.
-
-    :param db: Database session dependency.
-    :type db: SessionLocal
-    :param current_email: The email of the current user.
-    :type current_email: str
-    :param rl: Rate limit dependency.
-    :type rl: RateLimiter
-    :return: Contacts with birthdays in the next 7 days.
-    :rtype: list[Contact]
-    """
-    contacts = ContactService(db=db).contacts_birthdays_in_7_days(current_email)
-    return contacts
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional, List
+from contacts.dependencies.auth import get_current_user, get_current_user_email
+from contacts.dependencies.database import get_db
+from contacts.dependencies.etag import etag_matches
+from contacts.dependencies.rate_limiter import rate_limit, LOOKUP_RATE_LIMITER
+from contacts.schemas.contacts_schemas import (Contact, ContactCreate, ContactUpdate, ContactImportResult,
+                                               ContactBatchUpdate, ContactFilter, ContactChanges)
+from contacts.services.contacts_io import EXPORTERS
+from contacts.services.contacts_service import ContactService
+from contacts.schemas.users_schema import User
+
+router = APIRouter()
+
+
+@router.get('/')
+async def list_contacts(response: Response, q: Optional[str] = Query(None, min_length=1, max_length=100),
+                        first_name: Optional[str] = None, last_name: Optional[str] = None,
+                        email: Optional[str] = None, phone: Optional[str] = None,
+                        limit: Optional[int] = Query(None, ge=1, le=1000),
+                        after_id: Optional[int] = None, offset: int = Query(0, ge=0), stream: bool = False,
+                        if_none_match: Optional[str] = Header(None),
+                        current_user: User = Depends(get_current_user),
+                        db: AsyncSession = Depends(get_db), rl=Depends(rate_limit)) -> List[Contact]:
+    """
+    Retrieve a list of contacts based on specified criteria.
+
+    ``q`` searches names, email and phone for a substring and returns the best matches
+    first, paged with ``limit`` (50 by default) and ``offset``.
+    Without filters contacts are returned ordered by id; pass the id of the last
+    contact of a page as ``after_id`` to get the next one. With ``stream`` set the
+    whole address book is sent as NDJSON straight from a database cursor.
+
+    Responses carry a weak ETag of the whole address book; when it matches
+    ``If-None-Match`` a 304 is returned after a single aggregate query.
+
+    :param response: The response, to set the ETag on.
+    :type response: Response
+    :param q: Search text.
+    :type q: str, optional
+    :param first_name: Filter by first name.
+    :type first_name: str, optional
+    :param last_name: Filter by last name.
+    :type last_name: str, optional
+    :param email: Filter by email.
+    :type email: str, optional
+    :param phone: Filter by phone number, in any format.
+    :type phone: str, optional
+    :param limit: Page size.
+    :type limit: int, optional
+    :param after_id: Return only contacts with id greater than this one.
+    :type after_id: int, optional
+    :param offset: Number of search results to skip.
+    :type offset: int
+    :param stream: Stream all contacts as NDJSON instead of returning a page.
+    :type stream: bool
+    :param if_none_match: ETags of the representations the client already has.
+    :type if_none_match: str, optional
+    :param current_user: The authenticated user.
+    :type current_user: User
+    :param db: Database session dependency.
+    :type db: AsyncSession
+    :param rl: Rate limit dependency.
+    :type rl: RateLimiter
+    :return: A list of contacts matching the criteria.
+    :rtype: List[Contact]
+    """
+    current_email = current_user.email
+    contact_service = ContactService(db=db)
+    if not stream:
+        etag = await contact_service.get_collection_etag(current_email)
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+        response.headers['ETag'] = etag
+    result = []
+    if q:
+        result = await contact_service.search(q, current_email, limit=limit or 50, offset=offset)
+    elif first_name:
+        contact = await contact_service.get_by_first_name(first_name, current_email)
+        result.append(contact)
+    elif last_name:
+        contact = await contact_service.get_by_last_name(last_name, current_email)
+        result.append(contact)
+    elif email:
+        contact = await contact_service.get_by_email(email, current_email)
+        result.append(contact)
+    elif phone:
+        result = await contact_service.get_by_phone(phone, current_email)
+    elif stream:
+        return StreamingResponse(contact_service.stream_contacts(current_email),
+                                 media_type='application/x-ndjson')
+    else:
+        result = await contact_service.get_all_contacts(current_email, limit=limit, after_id=after_id)
+    return result
+
+
+@router.get('/birthdays_in_7_days')
+async def contacts_birthdays_in_7_days(days: int = Query(7, ge=0, le=366), db: AsyncSession = Depends(get_db),
+                                       current_email: str = Depends(get_current_user_email),
+                                       rl=Depends(rate_limit)) -> list[Contact]:
+    """
+    Retrieve contacts with birthdays in the next days, 7 by default.
+
+    :param days: How many days ahead to look.
+    :type days: int
+    :param db: Database session dependency.
+    :type db: AsyncSession
+    :param current_email: The email of the current user.
+    :type current_email: str
+    :param rl: Rate limit dependency.
+    :type rl: RateLimiter
+    :return: Contacts with birthdays in the window.
+    :rtype: list[Contact]
+    """
+    contacts = await ContactService(db=db).contacts_birthdays_in_7_days(current_email, days=days)
+    return contacts
+
+
+@router.get('/lookup')
+async def lookup_contacts(name: Optional[str] = Query(None, min_length=1, max_length=100),
+                          phone: Optional[str] = Query(None, min_length=1, max_length=32),
+                          limit: int = Query(10, ge=1, le=100), db: AsyncSession = Depends(get_db),
+                          current_email: str = Depends(get_current_user_email),
+                          rl=Depends(LOOKUP_RATE_LIMITER)) -> list[Contact]:
+    """
+    Look up contacts by name prefix and/or phone number suffix, e.g. for caller ID.
+
+    :param name: Prefix of the first, last or full name, case insensitive.
+    :type name: str, optional
+    :param phone: Trailing digits of the phone number; other characters are ignored.
+    :type phone: str, optional
+    :param limit: Maximum number of contacts to return.
+    :type limit: int
+    :param db: Database session dependency.
+    :type db: AsyncSession
+    :param current_email: The email of the current user.
+    :type current_email: str
+    :param rl: Rate limit dependency.
+    :type rl: RateLimiter
+    :raises HTTPException: If neither name nor phone is given.
+    :return: Matching contacts.
+    :rtype: list[Contact]
+    """
+    if not name and not phone:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Pass name or phone')
+    contacts = await ContactService(db=db).lookup(current_email, name=name, phone=phone, limit=limit)
+    return contacts
+
+
+@router.get('/changes')
+async def get_contact_changes(since: Optional[int] = Query(None, ge=0), limit: int = Query(1000, ge=1, le=5000),
+                              db: AsyncSession = Depends(get_db),
+                              current_email: str = Depends(get_current_user_email),
+                              rl=Depends(rate_limit)) -> ContactChanges:
+    """
+    Retrieve the contacts inserted, updated and deleted since the previous sync.
+
+    Without ``since`` only the current token is returned: take it, fetch all contacts, then
+    pass it as ``since`` on the next call. Repeat while ``has_more`` is set.
+
+    :param since: The token returned by the previous call.
+    :type since: int, optional
+    :param limit: Maximum number of changes to read at once.
+    :type limit: int
+    :param db: Database session dependency.
+    :type db: AsyncSession
+    :param current_email: The email of the current user.
+    :type current_email: str
+    :param rl: Rate limit dependency.
+    :type rl: RateLimiter
+    :raises HTTPException: 410 if the token is older than the kept change log.
+    :return: The changes and the next token.
+    :rtype: ContactChanges
+    """
+    changes = await ContactService(db=db).get_changes(current_email, since=since, limit=limit)
+    if changes is None:
+        raise HTTPException(status_code=status.HTTP_410_GONE, detail='Sync token expired, fetch all contacts again')
+    return changes
+
+
+@router.get('/export')
+async def export_contacts(format: str = Query('csv', pattern='^(csv|ndjson|vcf)$'), gzip: bool = False,
+                          db: AsyncSession = Depends(get_db), current_email: str = Depends(get_current_user_email),
+                          rl=Depends(rate_limit)) -> StreamingResponse:
+    """
+    Export all contacts of the current user as a CSV, NDJSON or vCard file.
+
+    The file is streamed while it is read from the database; with ``gzip`` it is sent
+    compressed with ``Content-Encoding: gzip``.
+
+    :param format: One of csv, ndjson or vcf.
+    :type format: str
+    :param gzip: Compress the response.
+    :type gzip: bool
+    :param db: Database session dependency.
+    :type db: AsyncSession
+    :param current_email: The email of the current user.
+    :type current_email: str
+    :param rl: Rate limit dependency.
+    :type rl: RateLimiter
+    :return: The streamed file.
+    :rtype: StreamingResponse
+    """
+    headers = {'Content-Disposition': f'attachment; filename="contacts.{format}"'}
+    if gzip:
+        headers['Content-Encoding'] = 'gzip'
+    return StreamingResponse(ContactService(db=db).export_contacts(current_email, format=format, compress=gzip),
+                             media_type=EXPORTERS[format][0], headers=headers)
+
+
+@router.patch('/batch')
+async def batch_update_contacts(contact_batch: ContactBatchUpdate, db: AsyncSession = Depends(get_db),
+                                current_email: str = Depends(get_current_user_email),
+                                rl=Depends(rate_limit)) -> list[Contact]:
+    """
+    Update many contacts at once, selected by ids and/or field values.
+
+    :param contact_batch: Which contacts to update and the fields to change.
+    :type contact_batch: ContactBatchUpdate
+    :param db: Database session dependency.
+    :type db: AsyncSession
+    :param current_email: The email of the current user.
+    :type current_email: str
+    :param rl: Rate limit dependency.
+    :type rl: RateLimiter
+    :return: The updated contacts.
+    :rtype: list[Contact]
+    """
+    contacts = await ContactService(db=db).batch_update(contact_batch, current_email)
+    return contacts
+
+
+@router.delete('/batch')
+async def batch_delete_contacts(contact_filter: ContactFilter, db: AsyncSession = Depends(get_db),
+                                current_email: str = Depends(get_current_user_email),
+                                rl=Depends(rate_limit)) -> list[Contact]:
+    """
+    Delete many contacts at once, selected by ids and/or field values.
+
+    :param contact_filter: Which contacts to delete.
+    :type contact_filter: ContactFilter
+    :param db: Database session dependency.
+    :type db: AsyncSession
+    :param current_email: The email of the current user.
+    :type current_email: str
+    :param rl: Rate limit dependency.
+    :type rl: RateLimiter
+    :return: The removed contacts.
+    :rtype: list[Contact]
+    """
+    contacts = await ContactService(db=db).batch_remove(contact_filter, current_email)
+    return contacts
+
+
+@router.get('/{id}')
+async def get_contact_by_id(id: int, response: Response, if_none_match: Optional[str] = Header(None),
+                            db: AsyncSession = Depends(get_db), current_email: str = Depends(get_current_user_email),
+                            rl=Depends(rate_limit)) -> Contact:
+    """
+    Retrieve a contact by its ID.
+
+    The response carries a weak ETag; when it matches ``If-None-Match`` a 304 is returned.
+
+    :param id: The ID of the contact to retrieve.
+    :type id: int
+    :param response: The response, to set the ETag on.
+    :type response: Response
+    :param if_none_match: ETags of the representations the client already has.
+    :type if_none_match: str, optional
+    :param db: Database session dependency.
+    :type db: AsyncSession
+    :param current_email: The email of the current user.
+    :type current_email: str
+    :param rl: Rate limit dependency.
+    :type rl: RateLimiter
+    :raises HTTPException: 404 if the contact does not exist.
+    :return: The contact with the specified ID.
+    :rtype: Contact
+    """
+    result = await ContactService(db=db).get_if_modified(id, current_email, if_none_match)
+    if result is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Contact not found")
+    etag, contact_item = result
+    if contact_item is None:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+    response.headers['ETag'] = etag
+    return contact_item
+
+
+@router.post('/')
+async def create_contact(contact_item: ContactCreate, db: AsyncSession = Depends(get_db),
+                         current_email: str = Depends(get_current_user_email), rl=Depends(rate_limit)) -> Contact:
+    """
+    Create a new contact.
+
+    :param contact_item: Data for the new contact.
+    :type contact_item: ContactCreate
+    :param db: Database session dependency.
+    :type db: AsyncSession
+    :param current_email: The email of the current user.
+    :type current_email: str
+    :param rl: Rate limit dependency.
+    :type rl: RateLimiter
+    :return: The newly created contact.
+    :rtype: Contact
+    """
+    new_contact = await ContactService(db=db).create_contact(contact_item, current_email)
+    return new_contact
+
+
+@router.post('/bulk')
+async def import_contacts(request: Request, format: Optional[str] = Query(None, pattern='^(csv|json|ndjson)$'),
+                          db: AsyncSession = Depends(get_db), current_email: str = Depends(get_current_user_email),
+                          rl=Depends(rate_limit)) -> ContactImportResult:
+    """
+    Import contacts in bulk from a CSV file with a header row, a JSON array or NDJSON.
+
+    The body is parsed while it is being uploaded and written in batches; rows that
+    fail validation are skipped and reported with their row number.
+
+    :param request: The incoming HTTP request with the file as its body.
+    :type request: Request
+    :param format: One of csv, json or ndjson; taken from the Content-Type header or the content if omitted.
+    :type format: str, optional
+    :param db: Database session dependency.
+    :type db: AsyncSession
+    :param current_email: The email of the current user.
+    :type current_email: str
+    :param rl: Rate limit dependency.
+    :type rl: RateLimiter
+    :return: The number of imported contacts and the errors per row.
+    :rtype: ContactImportResult
+    """
+    result = await ContactService(db=db).import_contacts(request.stream(), current_email, format=format,
+                                                         content_type=request.headers.get('content-type'))
+    return result
+
+
+@router.put('/{id}')
+async def update_contact(id: int, contact_item: ContactUpdate, db: AsyncSession = Depends(get_db),
+                         current_email: str = Depends(get_current_user_email), rl=Depends(rate_limit)) -> Contact:
+    """
+    Update an existing contact.
+
+    :param id: The ID of the contact to update.
+    :type id: int
+    :param contact_item: Updated data for the contact.
+    :type contact_item: ContactUpdate
+    :param db: Database session dependency.
+    :type db: AsyncSession
+    :param current_email: The email of the current user.
+    :type current_email: str
+    :param rl: Rate limit dependency.
+    :type rl: RateLimiter
+    :raises HTTPException: 404 if the contact does not exist.
+    :return: The updated contact.
+    :rtype: Contact
+    """
+    updated_contact = await ContactService(db=db).update(contact_item, id, current_email)
+    if updated_contact is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Contact not found")
+    return updated_contact
+
+
+@router.delete('/{id}')
+async def delete_contact(id: int, db: AsyncSession = Depends(get_db),
+                         current_email: str = Depends(get_current_user_email), rl=Depends(rate_limit)) -> Contact:
+    """
+    Delete a contact.
+
+    :param id: The ID of the contact to delete.
+    :type id: int
+    :param db: Database session dependency.
+    :type db: AsyncSession
+    :param current_email: The email of the current user.
+    :type current_email: str
+    :param rl: Rate limit dependency.
+    :type rl: RateLimiter
+    :raises HTTPException: 404 if the contact does not exist.
+    :return: The removed contact.
+    :rtype: Contact
+    """
+    removed_contact = await ContactService(db=db).remove(id, current_email)
+    if removed_contact is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Contact not found")
+    return removed_contact
@@ -1,136 +1,176 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Security, File, UploadFile
-from dependencies.database import get_db, SessionLocal
-from depenedencies.rate_limiter import rate_limit
-from dependencies.auth import create_access_token, create_refresh_token, decode_refresh_token, get_current_user_email
-from schemas.users_schema import User, TokenModel, UserActivation
-from services.user_service import UserService
-from fastapi.security import OAuth2PasswordRequestForm, HTTPAuthorizationCredentials, HTTPBearer
-
-from depenedencies.cloudinary_dep import get_uploader
-
-router = APIRouter()
-security = HTTPBearer()
-
-
-@router.post("/register/", status_code=status.HTTP_201_CREATED)
-async def register(user: User, db: SessionLocal = Depends(get_db), rl=Depends(rate_limit)):
-    """
-        Register a new user.
-
-        :param user: User data for registration.
-        :type user: User
-        :param db: Database session dependency.
-        :type db: SessionLocal
-        :param rl: Rate limit dependency.
-        :type rl: RateLimiter
-        :return: The newly registered user.
-        :rtype: User
-        """
-    user_service = UserService(db)
-    exist_user = user_service.get_by_email(user.email)
-    if exist_user:
-        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Account already exists")
-    return user_service.create_new(user)
-
-
-@router.post("/activate/", response_model=User)
-async def activate(data: UserActivation, db: SessionLocal = Depends(get_db), rl=Depends(rate_limit)):
-    """
-    Activate a user account.
-
-    :param data: User activation data.
-    :type data: UserActivation
-    :param db: Database session dependency.
-    :type db: SessionLocal
-    :param rl: Rate limit dependency.
-    :type rl: RateLimiter
-    :return: The activated user.
-    :rtype: User
-    """
-    user_service = UserService(db)
-    return user_service.activate_user(data)
-
-
-@router.post('/login/')
-async def login(body: OAuth2PasswordRequestForm = Depends(), db: SessionLocal = Depends(get_db)):
-    """
-        Log in a user.
-
-        :param body: Login request form data.
-        :type body: OAuth2PasswordRequestForm
-        :param db: Database session dependency.
-        :type db: SessionLocal
-        :return: Access and refresh tokens.
-        :rtype: dict
-        """
-    user_service = UserService(db)
-    user = user_service.get_by_email(body.username)
-    if user is None:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid email")
-    if not user.confirmed:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Email not confirmed")
-    if not user_service.verify_password(user.email, body.password):
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid password")
-    access_token = await create_access_token(user.email)
-    refresh_token = await create_refresh_token(user.email)
-    user_service.update_token(user, refresh_token)
-    return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
-
-
-@router.get('/refresh_token', response_model=TokenModel)
-async def refresh_token(credentials: HTTPAuthorizationCredentials = Security(security),
-                        db: SessionLocal = Depends(get_db)):
-    """
-        Refresh access and refresh tokens.
-
-        :param credentials: HTTP authorization credentials.
-        :type credentials: HTTPAuthorizationCredentials
-        :param db: Database session dependency.
-        :type db: SessionLocal
-        :return: New access and refresh tokens.
-        :rtype: TokenModel
-        """
-    token = credentials.credentials
-    email = await decode_refresh_token(token)
-    user_service = UserService(db)
-    user = user_service.get_user_by_email(email)
-    if user_service.get_user_refresh_token(user) != token:
-        user_service.update_token(user, None)
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid refresh token")
-
-    access_token = await create_access_token(data={"sub": email})
-    refresh_token = await create_refresh_token(data={"sub": email})
-    user_service.update_token(user, refresh_token, db)
-    return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
-
-
-@router.post("/upload_image")
-def upload(current_email: str = Depends(get_current_user_email), file: UploadFile = File(...),
-           uploader=Depends(get_uploader), db: SessionLocal = Depends(get_db)):
-    """
-        Upload a user profile image.
-
-        :param current_email: The email of the current user.
-        :type current_email: str
-        :param file: The image file to upload.
-        :type file: UploadFile
-        :param uploader: The uploader dependency.
-        :type uploader: UploadService
-        :param db: Database session dependency.
-        :type db: SessionLocal
-        :return: Success message or error message.
-        :rtype: dict
-        """
-    try:
-        user_service = UserService(db)
-        contents = file.file.read()
-        response = uploader.upload(contents, public_id=file.filename)
-        response.get('secure_url')
-        user_service.set_image(current_email, response.get('secure_url'))
-
-    except Exception:
-        return {"message": "There was an error uploading the file"}
-    finally:
-        file.file.close()
-
-    return {"message": f"Successfully uploaded {file.filename}"}
+from fastapi import APIRouter, Depends, HTTPException, status, Security, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from contacts.dependencies.database import get_db
+from contacts.dependencies.rate_limiter import rate_limit
+from contacts.dependencies.settings import Settings, get_settings
+from contacts.dependencies.auth import create_access_token, create_refresh_token, decode_refresh_token, \
+    get_current_user_email
+from contacts.schemas.users_schema import User, TokenModel, UserActivation, AvatarJob
+from contacts.services.user_service import UserService
+from fastapi.security import OAuth2PasswordRequestForm, HTTPAuthorizationCredentials, HTTPBearer
+
+from contacts.services.avatars import AVATAR_JOBS, MULTIPART_OVERHEAD, NotAnImage, \
+    UploadTooLarge, receive_avatar
+
+router = APIRouter()
+security = HTTPBearer()
+
+
+@router.post("/register/", status_code=status.HTTP_201_CREATED)
+async def register(user: User, db: AsyncSession = Depends(get_db), rl=Depends(rate_limit)):
+    """
+        Register a new user.
+
+        :param user: User data for registration.
+        :type user: User
+        :param db: Database session dependency.
+        :type db: AsyncSession
+        :param rl: Rate limit dependency.
+        :type rl: RateLimiter
+        :return: The newly registered user.
+        :rtype: User
+        """
+    user_service = UserService(db)
+    exist_user = await user_service.get_by_email(user.email)
+    if exist_user:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Account already exists")
+    return await user_service.create_new(user)
+
+
+@router.post("/activate/", response_model=User)
+async def activate(data: UserActivation, db: AsyncSession = Depends(get_db), rl=Depends(rate_limit)):
+    """
+    Activate a user account.
+
+    :param data: User activation data.
+    :type data: UserActivation
+    :param db: Database session dependency.
+    :type db: AsyncSession
+    :param rl: Rate limit dependency.
+    :type rl: RateLimiter
+    :return: The activated user.
+    :rtype: User
+    """
+    user_service = UserService(db)
+    return await user_service.activate_user(data)
+
+
+@router.post('/login/')
+async def login(body: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
+    """
+        Log in a user.
+
+        :param body: Login request form data.
+        :type body: OAuth2PasswordRequestForm
+        :param db: Database session dependency.
+        :type db: AsyncSession
+        :return: Access and refresh tokens.
+        :rtype: dict
+        """
+    user_service = UserService(db)
+    user = await user_service.get_by_email(body.username)
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid email")
+    if not user.confirmed:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Email not confirmed")
+    if not await user_service.verify_password(user.email, body.password):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid password")
+    access_token = await create_access_token(user.email)
+    refresh_token = await create_refresh_token(user.email)
+    await user_service.update_token(user, refresh_token)
+    return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
+
+
+@router.get('/refresh_token', response_model=TokenModel)
+async def refresh_token(credentials: HTTPAuthorizationCredentials = Security(security),
+                        db: AsyncSession = Depends(get_db)):
+    """
+        Refresh access and refresh tokens.
+
+        :param credentials: HTTP authorization credentials.
+        :type credentials: HTTPAuthorizationCredentials
+        :param db: Database session dependency.
+        :type db: AsyncSession
+        :return: New access and refresh tokens.
+        :rtype: TokenModel
+        """
+    token = credentials.credentials
+    email = await decode_refresh_token(token)
+    user_service = UserService(db)
+    user = await user_service.get_by_email(email)
+    if await user_service.get_user_refresh_token(user) != token:
+        await user_service.update_token(user, None)
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid refresh token")
+
+    access_token = await create_access_token(email)
+    refresh_token = await create_refresh_token(email)
+    await user_service.update_token(user, refresh_token)
+    return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
+
+
+@router.post("/upload_image", status_code=status.HTTP_202_ACCEPTED, response_model=AvatarJob, openapi_extra={
+    "requestBody": {
+        "required": True,
+        "content": {"multipart/form-data": {
+            "schema": {"type": "object", "required": ["file"],
+                       "properties": {"file": {"type": "string", "format": "binary"}}}
+        }},
+    }
+})
+async def upload(request: Request, current_email: str = Depends(get_current_user_email),
+                 db: AsyncSession = Depends(get_db), settings: Settings = Depends(get_settings)):
+    """
+        Upload a user profile image.
+
+        The image is streamed to a temporary file as it arrives, so it is never held in memory,
+        and is refused as soon as it is too large or does not start like an image. The avatars
+        are made and stored by a background job; poll ``/upload_image/{job_id}`` for its status.
+
+        :param request: The request with the image in a multipart ``file`` field.
+        :type request: Request
+        :param current_email: The email of the current user.
+        :type current_email: str
+        :param db: Database session dependency.
+        :type db: AsyncSession
+        :param settings: Settings dependency, for the size limit of the image.
+        :type settings: Settings
+        :return: The queued job.
+        :rtype: AvatarJob
+        """
+    max_bytes = settings.avatar_max_bytes
+    content_length = request.headers.get('content-length')
+    if content_length and content_length.isdigit() and int(content_length) > max_bytes + MULTIPART_OVERHEAD:
+        raise HTTPException(status_code=status.HTTP_413_CONTENT_TOO_LARGE, detail="The image is too large")
+    # the user was looked up to authenticate, give its connection back while the upload is received
+    await db.close()
+    try:
+        upload = await receive_avatar(request.headers.get('content-type'), request.stream(), max_bytes=max_bytes)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=status.HTTP_413_CONTENT_TOO_LARGE, detail=str(e))
+    except NotAnImage as e:
+        raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    try:
+        return await AVATAR_JOBS.submit(current_email, upload.path, upload.filename, upload.digest)
+    except Exception:
+        upload.remove()
+        raise
+
+
+@router.get("/upload_image/{job_id}", response_model=AvatarJob)
+async def upload_status(job_id: str, current_email: str = Depends(get_current_user_email)):
+    """
+        Get the status of a profile image upload.
+
+        :param job_id: The id of the job returned by the upload.
+        :type job_id: str
+        :param current_email: The email of the current user.
+        :type current_email: str
+        :return: The job: queued, running, done with the new image URL, or failed with the reason.
+        :rtype: AvatarJob
+        """
+    job = await AVATAR_JOBS.get(job_id)
+    if job is None or job.user_email != current_email:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Upload not found")
+    return job
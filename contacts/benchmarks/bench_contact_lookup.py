@@ -0,0 +1,44 @@
+"""
+Measure name prefix and phone suffix lookup latency of the in-memory contact index.
+
+Usage: DATABASE_URL=... python -m contacts.benchmarks.bench_contact_lookup --contacts 100000
+"""
+import argparse
+import random
+import statistics
+import string
+import time
+
+from contacts.dependencies.contact_index import TenantIndex
+from contacts.schemas.contacts_schemas import Contact
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--contacts', type=int, default=100000)
+    parser.add_argument('--lookups', type=int, default=10000)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    contacts = [Contact(id=n, first_name=''.join(rng.choices(string.ascii_lowercase, k=8)),
+                        last_name=''.join(rng.choices(string.ascii_lowercase, k=8)), email=None,
+                        phone_number=f'+38067{rng.randrange(10 ** 7):07d}', birthday=None, favorite=False)
+                for n in range(args.contacts)]
+    start = time.perf_counter()
+    index = TenantIndex(contacts)
+    print(f'build: {(time.perf_counter() - start) * 1000:.0f} ms for {args.contacts} contacts')
+
+    for label, make_query in (('name', lambda: {'name': ''.join(rng.choices(string.ascii_lowercase, k=3))}),
+                              ('phone', lambda: {'phone': f'{rng.randrange(10 ** 5):05d}'})):
+        timings = []
+        for _ in range(args.lookups):
+            query = make_query()
+            start = time.perf_counter()
+            index.lookup(**query)
+            timings.append((time.perf_counter() - start) * 1e6)
+        percentiles = statistics.quantiles(timings, n=100)
+        print(f'{label:>5}: p50 {percentiles[49]:6.1f} us  p99 {percentiles[98]:6.1f} us')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+"""
+Measure login throughput of the password hashing pool.
+
+Runs concurrent password checks through ``run_in_hash_pool`` for a range of PBKDF2
+iteration counts and prints logins per second, so PASSWORD_HASH_ITERATIONS and
+PASSWORD_HASH_WORKERS can be tuned for the target hardware.
+
+Usage: DATABASE_URL=... python -m contacts.benchmarks.bench_password_hashing --iterations 100000 600000 --logins 32
+"""
+import argparse
+import asyncio
+import time
+
+from contacts.dependencies.hashing import HASH_EXECUTOR, run_in_hash_pool
+from contacts.repository.users_repo import UserRepo
+
+
+async def measure(iterations, logins):
+    repo = UserRepo(None)
+    hashed_password, salt = repo.hash_password('password123', iterations=iterations)
+    start = time.perf_counter()
+    await asyncio.gather(*(run_in_hash_pool(repo.check_password, 'password123', hashed_password, salt)
+                           for _ in range(logins)))
+    return logins / (time.perf_counter() - start)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--iterations', type=int, nargs='+', default=[100000, 300000, 600000])
+    parser.add_argument('--logins', type=int, default=32, help='concurrent logins per run')
+    args = parser.parse_args()
+
+    print(f'workers: {HASH_EXECUTOR._max_workers}')
+    for iterations in args.iterations:
+        print(f'{iterations:>9} iterations: {await measure(iterations, args.logins):8.1f} logins/s')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
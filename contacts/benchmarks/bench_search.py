@@ -0,0 +1,80 @@
+"""
+Measure p50/p99 latency of contact search at different address book sizes.
+
+Seeds one tenant with N contacts in the database given by --url (a throwaway SQLite
+file by default, or e.g. a PostgreSQL database for the trigram index) and runs random
+substring queries through ContactsRepo.search.
+
+Usage: DATABASE_URL=... python -m contacts.benchmarks.bench_search --sizes 10000 100000 1000000
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import string
+import time
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from contacts.dependencies.database import Base
+from contacts.models.contacts_model import ContactModel
+from contacts.models.user import UserModel
+from contacts.repository.contacts_repo import ContactsRepo
+
+TENANT = 'bench@example.com'
+
+
+def random_name(rng):
+    return rng.choice(string.ascii_uppercase) + ''.join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 9)))
+
+
+async def seed(engine, size, rng, batch_size=10000):
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(insert(UserModel), [{'email': TENANT}])
+    for start in range(0, size, batch_size):
+        async with engine.begin() as conn:
+            await conn.execute(insert(ContactModel), [
+                {'first_name': random_name(rng), 'last_name': random_name(rng), 'email': f'c{n}@example.com',
+                 'phone_number': f'+38067{rng.randrange(10 ** 7):07d}', 'user_email': TENANT}
+                for n in range(start, min(start + batch_size, size))
+            ])
+
+
+async def measure(engine, queries, rng):
+    session_maker = async_sessionmaker(bind=engine, expire_on_commit=False)
+    timings = []
+    for _ in range(queries):
+        q = random_name(rng)[1:4] if rng.random() < 0.8 else f'{rng.randrange(1000):03d}'
+        async with session_maker() as session:
+            start = time.perf_counter()
+            await ContactsRepo(session).search(q, TENANT)
+            timings.append((time.perf_counter() - start) * 1000)
+    percentiles = statistics.quantiles(timings, n=100)
+    return percentiles[49], percentiles[98]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--url', default='sqlite+aiosqlite:///./bench_search.db')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--queries', type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    engine = create_async_engine(args.url)
+    try:
+        for size in args.sizes:
+            await seed(engine, size, rng)
+            p50, p99 = await measure(engine, args.queries, rng)
+            print(f'{size:>9} contacts: p50 {p50:8.2f} ms  p99 {p99:8.2f} ms')
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+    finally:
+        await engine.dispose()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,37 @@
+"""
+Measure the latency of access token verification with the token cache on and off.
+
+Usage: DATABASE_URL=... python -m contacts.benchmarks.bench_token_cache --requests 20000
+"""
+import argparse
+import time
+from unittest.mock import patch
+
+from contacts.dependencies import auth
+from contacts.dependencies.cache import TOKEN_CACHE
+
+
+def measure(token, requests):
+    start = time.perf_counter()
+    for _ in range(requests):
+        auth.decode_access_token(token)
+    return (time.perf_counter() - start) / requests * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=20000, help='verifications per run')
+    args = parser.parse_args()
+
+    with patch.multiple(auth, SECRET_KEY='benchmark-secret', ALGORITHM='HS256'):
+        token = auth.jwt.encode({'sub': 'user@example.com', 'exp': time.time() + 1800, 'scope': 'access_token'},
+                                auth.SECRET_KEY, algorithm=auth.ALGORITHM)
+        maxsize = TOKEN_CACHE.maxsize
+        TOKEN_CACHE.maxsize = 0
+        print(f'cache off: {measure(token, args.requests):7.2f} us/request')
+        TOKEN_CACHE.maxsize = maxsize
+        print(f'cache on:  {measure(token, args.requests):7.2f} us/request')
+
+
+if __name__ == '__main__':
+    main()
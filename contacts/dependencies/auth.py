@@ -1,107 +1,150 @@
-from fastapi.security import OAuth2PasswordBearer
-from fastapi import HTTPException, status, Depends
-from dependencies.database import get_db, SessionLocal
-from services.user_service import UserService
-import datetime
-from jose import JWTError, jwt
-from dotenv import load_dotenv
-import os
-
-load_dotenv()
-
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
-
-SECRET_KEY = os.getenv('SECRET_KEY')
-ALGORITHM = os.getenv('ALGORITHM')
-
-
-async def create_access_token(email: str):
-    """
-    Create an access token.
-
-    :param email: The email of the user.
-    :type email: str
-    :return: The access token.
-    :rtype: str
-    """
-    token_data = {
-        "sub": email,
-        "exp": datetime.datetime.utcnow() + datetime.timedelta(minutes=30),
-        "scope": "access_token"
-    }
-    to_encode = token_data.copy()
-    token = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-
-    return token
-
-
-async def create_refresh_token(email: str):
-    """
-    Create a refresh token.
-
-    :param email: The email of the user.
-    :type email: str
-    :return: The refresh token.
-    :rtype: str
-    """
-    token_data = {
-        "sub": email,
-        "exp": datetime.datetime.utcnow() + datetime.timedelta(days=7),
-        "scope": "refresh_token"
-    }
-    to_encode = token_data.copy()
-    token = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-
-    return token
-
-
-async def decode_refresh_token(refresh_token: str):
-    """
-    Decode a refresh token.
-
-    :param refresh_token: The refresh token to decode.
-    :type refresh_token: str
-    :return: The email associated with the refresh token.
-    :rtype: str
-    """
-    try:
-        payload = jwt.decode(refresh_token, SECRET_KEY, algorithms=ALGORITHM)
-        if payload['scope'] == 'refresh_token':
-            email = payload['sub']
-            return email
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Invalid scope for token')
-    except JWTError:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Could not validate credentials')
-
-
-async def get_current_user_email(token: str = Depends(oauth2_scheme), db: SessionLocal = Depends(get_db)):
-    """
-    Get the email of the current user from the token.
-
-    :param token: The token containing user information.
-    :type token: str
-    :param db: Database session dependency.
-    :type db: SessionLocal
-    :return: The email of the current user.
-    :rtype: str
-    """
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=ALGORITHM)
-        if payload['scope'] == 'access_token':
-            email = payload["sub"]
-            if email is None:
-                raise credentials_exception
-        else:
-            raise credentials_exception
-    except JWTError:
-        raise credentials_exception
-    user_service = UserService(db)
-    user = user_service.get_user_by_email(email)
-    if user is None:
-        raise credentials_exception
-    return email
+from fastapi.security import OAuth2PasswordBearer
+from fastapi import HTTPException, status, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+from contacts.dependencies.cache import TOKEN_CACHE
+from contacts.dependencies.database import get_db
+from contacts.services.user_service import UserService
+from contacts.schemas.users_schema import User
+import datetime
+import hashlib
+import time
+from jose import JWTError, jwt
+from contacts.dependencies.settings import get_settings, secret
+
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+
+settings = get_settings()
+SECRET_KEY = secret(settings.secret_key)
+ALGORITHM = settings.algorithm
+ACCESS_TOKEN_TTL = datetime.timedelta(minutes=settings.access_token_ttl_minutes)
+REFRESH_TOKEN_TTL = datetime.timedelta(days=settings.refresh_token_ttl_days)
+
+
+async def create_access_token(email: str):
+    """
+    Create an access token.
+
+    :param email: The email of the user.
+    :type email: str
+    :return: The access token.
+    :rtype: str
+    """
+    token_data = {
+        "sub": email,
+        "exp": datetime.datetime.utcnow() + ACCESS_TOKEN_TTL,
+        "scope": "access_token"
+    }
+    to_encode = token_data.copy()
+    token = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+
+    return token
+
+
+async def create_refresh_token(email: str):
+    """
+    Create a refresh token.
+
+    :param email: The email of the user.
+    :type email: str
+    :return: The refresh token.
+    :rtype: str
+    """
+    token_data = {
+        "sub": email,
+        "exp": datetime.datetime.utcnow() + REFRESH_TOKEN_TTL,
+        "scope": "refresh_token"
+    }
+    to_encode = token_data.copy()
+    token = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+
+    return token
+
+
+async def decode_refresh_token(refresh_token: str):
+    """
+    Decode a refresh token.
+
+    :param refresh_token: The refresh token to decode.
+    :type refresh_token: str
+    :return: The email associated with the refresh token.
+    :rtype: str
+    """
+    try:
+        payload = jwt.decode(refresh_token, SECRET_KEY, algorithms=ALGORITHM)
+        if payload['scope'] == 'refresh_token':
+            email = payload['sub']
+            return email
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Invalid scope for token')
+    except JWTError:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Could not validate credentials')
+
+
+def decode_access_token(token: str):
+    """
+    Verify an access token and return the email it was issued to.
+
+    Verified tokens are cached by their digest for the token cache TTL, or until they
+    expire if that comes first, so a client reusing the same token skips the signature
+    check on later requests.
+
+    :param token: The access token.
+    :type token: str
+    :return: The email of the user, or None if the token is invalid.
+    :rtype: str | None
+    """
+    key = hashlib.sha256(token.encode()).digest()
+    email = TOKEN_CACHE.get(key)
+    if email is not None:
+        return email
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=ALGORITHM)
+    except JWTError:
+        return None
+    email = payload.get("sub")
+    if payload.get('scope') != 'access_token' or email is None:
+        return None
+    if 'exp' in payload:
+        now = time.monotonic()
+        TOKEN_CACHE.set(key, email, expires_at=min(now + TOKEN_CACHE.ttl, now + payload['exp'] - time.time()))
+    return email
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)) -> User:
+    """
+    Resolve the authenticated user from the token.
+
+    FastAPI caches dependency results per request, so the user is looked up once
+    no matter how many dependencies of a handler ask for it.
+
+    :param token: The token containing user information.
+    :type token: str
+    :param db: Database session dependency.
+    :type db: AsyncSession
+    :return: The current user.
+    :rtype: User
+    """
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    email = decode_access_token(token)
+    if email is None:
+        raise credentials_exception
+    user_service = UserService(db)
+    user = await user_service.get_by_email(email)
+    if user is None:
+        raise credentials_exception
+    return user
+
+
+async def get_current_user_email(user: User = Depends(get_current_user)):
+    """
+    Get the email of the current user from the token.
+
+    :param user: The current user.
+    :type user: User
+    :return: The email of the current user.
+    :rtype: str
+    """
+    return user.email
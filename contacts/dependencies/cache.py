@@ -0,0 +1,242 @@
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+
+from contacts.dependencies.settings import get_settings
+
+
+class TTLCache:
+    """
+    Bounded least-recently-used cache whose entries expire after a time to live.
+    """
+    def __init__(self, maxsize, ttl):
+        """
+        Initialize the TTLCache instance.
+
+        :param maxsize: Maximum number of entries kept; the least recently used one is evicted first.
+        :type maxsize: int
+        :param ttl: Default time (in seconds) an entry stays valid.
+        :type ttl: float
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+
+    def get(self, key, default=None):
+        """
+        Return a cached value and mark it as recently used.
+
+        :param key: The cache key.
+        :type key: Hashable
+        :param default: Value returned on a miss or an expired entry.
+        :type default: Any
+        :return: The cached value or the default.
+        :rtype: Any
+        """
+        entry = self.entries.get(key)
+        if entry is None:
+            return default
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            self.pop(key)
+            return default
+        self.entries.move_to_end(key)
+        return value
+
+    def set(self, key, value, ttl=None, expires_at=None):
+        """
+        Store a value, evicting the least recently used entry when the cache is full.
+
+        :param key: The cache key.
+        :type key: Hashable
+        :param value: The value to cache.
+        :type value: Any
+        :param ttl: Time to live for this entry, the cache default if None.
+        :type ttl: float, optional
+        :param expires_at: Absolute expiry on the ``time.monotonic`` clock, overrides ttl.
+        :type expires_at: float, optional
+        """
+        if expires_at is None:
+            expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        self.entries[key] = (value, expires_at)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.pop(next(iter(self.entries)))
+
+    def pop(self, key):
+        """
+        Drop an entry if it is cached.
+
+        :param key: The cache key.
+        :type key: Hashable
+        """
+        self.entries.pop(key, None)
+
+    def clear(self):
+        """
+        Drop all entries.
+        """
+        self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class IndexedTTLCache(TTLCache):
+    """
+    TTLCache that also keeps its keys by value, so every entry holding a value can be
+    dropped without scanning the cache. Values have to be hashable.
+    """
+    def __init__(self, maxsize, ttl):
+        super().__init__(maxsize, ttl)
+        self.keys_by_value = {}
+
+    def set(self, key, value, ttl=None, expires_at=None):
+        self.pop(key)
+        self.keys_by_value.setdefault(value, set()).add(key)
+        super().set(key, value, ttl=ttl, expires_at=expires_at)
+
+    def pop(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            keys = self.keys_by_value[entry[0]]
+            keys.discard(key)
+            if not keys:
+                del self.keys_by_value[entry[0]]
+
+    def pop_value(self, value):
+        """
+        Drop every entry holding the value.
+
+        :param value: The cached value to drop.
+        :type value: Hashable
+        """
+        for key in self.keys_by_value.pop(value, ()):
+            del self.entries[key]
+
+    def clear(self):
+        super().clear()
+        self.keys_by_value.clear()
+
+
+class DiskLRUCache:
+    """
+    Files kept in a directory up to a total size; the least recently used ones are deleted
+    first. Use order survives restarts through the modification times of the files.
+
+    Processes sharing the directory each keep their own account of it, so together they
+    may hold more than max_bytes until one of them evicts.
+    """
+    def __init__(self, directory, max_bytes):
+        """
+        Initialize the DiskLRUCache instance.
+
+        :param directory: Directory the files are kept in, created when needed.
+        :type directory: str
+        :param max_bytes: Maximum total size of the files.
+        :type max_bytes: int
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.entries = None
+        self.size = 0
+        self.hits = self.misses = self.evictions = 0
+        self.lock = threading.Lock()
+
+    def load(self):
+        """
+        Account for the files already in the directory, oldest first.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and not entry.name.startswith('.'):
+                stat = entry.stat()
+                files.append((stat.st_mtime, entry.name, stat.st_size))
+        self.entries = OrderedDict((name, size) for _, name, size in sorted(files))
+        self.size = sum(self.entries.values())
+
+    def path(self, key):
+        """
+        Path of the file of a key; keys are plain file names.
+
+        :param key: The cache key.
+        :type key: str
+        :return: The path.
+        :rtype: str
+        """
+        if os.path.basename(key) != key or key.startswith('.'):
+            raise ValueError(f'Invalid cache key: {key!r}')
+        return os.path.join(self.directory, key)
+
+    def get(self, key):
+        """
+        Path of a cached file, marked as recently used.
+
+        :param key: The cache key.
+        :type key: str
+        :return: The path, None on a miss.
+        :rtype: str | None
+        """
+        path = self.path(key)
+        with self.lock:
+            if self.entries is None:
+                self.load()
+            if key in self.entries:
+                try:
+                    os.utime(path)
+                except FileNotFoundError:
+                    self.size -= self.entries.pop(key)
+                else:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return path
+            self.misses += 1
+            return None
+
+    def put(self, key, source):
+        """
+        Copy a file into the cache, evicting the least recently used files to make room.
+
+        :param key: The cache key.
+        :type key: str
+        :param source: Path of the file to cache.
+        :type source: str
+        :return: Path of the cached copy.
+        :rtype: str
+        """
+        path = self.path(key)
+        with self.lock:
+            if self.entries is None:
+                self.load()
+            partial = os.path.join(self.directory, f'.{key}.{threading.get_ident()}')
+            shutil.copyfile(source, partial)
+            os.replace(partial, path)
+            self.size += os.path.getsize(path) - self.entries.pop(key, 0)
+            self.entries[key] = os.path.getsize(path)
+            while self.size > self.max_bytes and len(self.entries) > 1:
+                evicted, size = self.entries.popitem(last=False)
+                self.size -= size
+                self.evictions += 1
+                try:
+                    os.remove(os.path.join(self.directory, evicted))
+                except FileNotFoundError:
+                    pass
+            return path
+
+    def snapshot(self):
+        """
+        Counters and size of the cache.
+
+        :return: Hits, misses, evictions, files and bytes.
+        :rtype: dict
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'files': len(self.entries or ()), 'bytes': self.size, 'max_bytes': self.max_bytes}
+
+
+settings = get_settings()
+USER_CACHE = TTLCache(settings.user_cache_size, settings.user_cache_ttl)
+TOKEN_CACHE = IndexedTTLCache(settings.token_cache_size, settings.token_cache_ttl)
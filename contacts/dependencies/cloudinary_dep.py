@@ -1,16 +1,23 @@
-import cloudinary
-import cloudinary.uploader as uploader
-from dotenv import load_dotenv
-import os
+import functools
 
-load_dotenv()
-
-cloudinary.config(
-  cloud_name=os.getenv("CLOUD_NAME"),
-  api_key=os.getenv("API_KEY"),
-  api_secret=os.getenv("API_SECRET")
-)
+from contacts.dependencies.settings import get_settings, secret
 
 
+@functools.lru_cache(maxsize=None)
 def get_uploader():
-    return uploader
+    """
+    The Cloudinary uploader, imported and configured on first use.
+
+    :return: The ``cloudinary.uploader`` module.
+    :rtype: module
+    """
+    import cloudinary
+    import cloudinary.uploader
+
+    settings = get_settings()
+    cloudinary.config(
+      cloud_name=settings.cloud_name,
+      api_key=settings.api_key,
+      api_secret=secret(settings.api_secret)
+    )
+    return cloudinary.uploader
@@ -0,0 +1,251 @@
+import bisect
+import time
+from collections import OrderedDict
+
+from contacts.dependencies.settings import get_settings
+from contacts.schemas.contacts_schemas import Contact
+
+CONTACT_INDEX_TENANTS = get_settings().contact_index_tenants
+CONTACT_INDEX_TTL = get_settings().contact_index_ttl
+
+
+def phone_key(phone_number):
+    """
+    Turn a phone number into its digits in reverse order, so that a suffix of the
+    number becomes a prefix of the key.
+
+    :param phone_number: The phone number in any format.
+    :type phone_number: str | None
+    :return: The reversed digits.
+    :rtype: str
+    """
+    return ''.join(char for char in reversed(phone_number or '') if char.isdigit())
+
+
+def name_keys(contact):
+    """
+    Keys a contact is found under by name prefix: first name, last name and full name.
+
+    :param contact: The contact.
+    :type contact: Contact
+    :return: Lowercase keys.
+    :rtype: set[str]
+    """
+    first_name, last_name = (contact.first_name or '').lower(), (contact.last_name or '').lower()
+    return {key for key in (first_name, last_name, f'{first_name} {last_name}'.strip()) if key}
+
+
+def prefix_range(keys, prefix):
+    """
+    Find the slice of a sorted list of (key, id) pairs whose keys start with a prefix.
+
+    :param keys: Sorted (key, id) pairs.
+    :type keys: list[tuple[str, int]]
+    :param prefix: The prefix.
+    :type prefix: str
+    :return: Start and end of the slice.
+    :rtype: tuple[int, int]
+    """
+    start = bisect.bisect_left(keys, (prefix,))
+    # The first string above every key with the prefix: drop trailing U+10FFFF and bump the last character left.
+    upper = prefix.rstrip('\U0010ffff')
+    if not upper:
+        return start, len(keys)
+    return start, bisect.bisect_left(keys, (upper[:-1] + chr(ord(upper[-1]) + 1),))
+
+
+class TenantIndex:
+    """
+    Contacts of one user kept in sorted arrays for name prefix and phone suffix lookups.
+    """
+    def __init__(self, contacts=()):
+        """
+        Initialize the TenantIndex instance.
+
+        :param contacts: The contacts of the user.
+        :type contacts: Iterable[Contact]
+        """
+        self.contacts = {contact.id: contact for contact in contacts}
+        self.names = sorted((key, contact.id) for contact in self.contacts.values() for key in name_keys(contact))
+        self.phones = sorted((phone_key(contact.phone_number), contact.id) for contact in self.contacts.values())
+
+    def add(self, contact):
+        """
+        Add a contact, replacing the previous version of it.
+
+        :param contact: The contact.
+        :type contact: Contact
+        """
+        self.remove(contact.id)
+        self.contacts[contact.id] = contact
+        for key in name_keys(contact):
+            bisect.insort(self.names, (key, contact.id))
+        bisect.insort(self.phones, (phone_key(contact.phone_number), contact.id))
+
+    def remove(self, id):
+        """
+        Remove a contact if it is indexed.
+
+        :param id: The ID of the contact.
+        :type id: int
+        """
+        contact = self.contacts.pop(id, None)
+        if contact is None:
+            return
+        for key in name_keys(contact):
+            del self.names[bisect.bisect_left(self.names, (key, id))]
+        del self.phones[bisect.bisect_left(self.phones, (phone_key(contact.phone_number), id))]
+
+    def lookup(self, name=None, phone=None, limit=10):
+        """
+        Find contacts whose name starts with ``name`` and whose phone number ends with the
+        digits of ``phone``; either criterion may be omitted.
+
+        :param name: Prefix of the first, last or full name, case insensitive.
+        :type name: str, optional
+        :param phone: Trailing digits of the phone number.
+        :type phone: str, optional
+        :param limit: Maximum number of contacts to return.
+        :type limit: int
+        :return: Matching contacts, ordered by the matched key.
+        :rtype: list[Contact]
+        """
+        if phone:
+            keys, prefix = self.phones, phone_key(phone)
+            matches = (lambda contact: any(key.startswith(name.lower()) for key in name_keys(contact))) if name \
+                else None
+        else:
+            keys, prefix, matches = self.names, (name or '').lower(), None
+        start, end = prefix_range(keys, prefix)
+        result, seen = [], set()
+        for _, id in keys[start:end]:
+            if id in seen:
+                continue
+            seen.add(id)
+            contact = self.contacts[id]
+            if matches is None or matches(contact):
+                result.append(contact)
+                if len(result) >= limit:
+                    break
+        return result
+
+
+class ContactIndex:
+    """
+    In-memory TenantIndex per user, built on first use and kept up to date by the
+    contacts repository.
+
+    Only the most recently used tenants are kept, and an index is dropped after a time
+    to live so that changes made by other worker processes show up eventually.
+    """
+    def __init__(self, max_tenants=CONTACT_INDEX_TENANTS, ttl=CONTACT_INDEX_TTL):
+        """
+        Initialize the ContactIndex instance.
+
+        :param max_tenants: Maximum number of users indexed at once, 0 disables the index.
+        :type max_tenants: int
+        :param ttl: Time (in seconds) an index is used before it is rebuilt.
+        :type ttl: float
+        """
+        self.max_tenants = max_tenants
+        self.ttl = ttl
+        self.tenants = OrderedDict()
+        # builds in progress; a change to the tenant drops its entry so the build is thrown away
+        self.loading = {}
+
+    @property
+    def enabled(self):
+        return self.max_tenants > 0
+
+    def get(self, user_email):
+        """
+        Return the index of a user if it is loaded and fresh.
+
+        :param user_email: The email of the user.
+        :type user_email: str
+        :return: The index or None.
+        :rtype: TenantIndex | None
+        """
+        entry = self.tenants.get(user_email)
+        if entry is None:
+            return None
+        index, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self.tenants[user_email]
+            return None
+        self.tenants.move_to_end(user_email)
+        return index
+
+    async def load(self, user_email, chunks):
+        """
+        Build the index of a user from all of their contacts.
+
+        :param user_email: The email of the user.
+        :type user_email: str
+        :param chunks: Chunks of the contacts of the user, e.g. ``ContactsRepo.stream_all``.
+        :type chunks: AsyncIterator[list[ContactModel]]
+        :return: The index.
+        :rtype: TenantIndex
+        """
+        token = self.loading[user_email] = object()
+        try:
+            contacts = [Contact.from_orm(item) async for chunk in chunks for item in chunk]
+        finally:
+            current = self.loading.get(user_email)
+            if current is token:
+                del self.loading[user_email]
+        index = TenantIndex(contacts)
+        if self.enabled and current is token:
+            self.tenants[user_email] = (index, time.monotonic() + self.ttl)
+            self.tenants.move_to_end(user_email)
+            while len(self.tenants) > self.max_tenants:
+                self.tenants.popitem(last=False)
+        return index
+
+    def changed(self, user_email, contact):
+        """
+        Apply a created or updated contact to the index of its user, if loaded.
+
+        :param user_email: The email of the user.
+        :type user_email: str
+        :param contact: The contact as stored.
+        :type contact: ContactModel
+        """
+        self.loading.pop(user_email, None)
+        index = self.get(user_email)
+        if index is not None:
+            index.add(Contact.from_orm(contact))
+
+    def removed(self, user_email, id):
+        """
+        Drop a deleted contact from the index of its user, if loaded.
+
+        :param user_email: The email of the user.
+        :type user_email: str
+        :param id: The ID of the contact.
+        :type id: int
+        """
+        self.loading.pop(user_email, None)
+        index = self.get(user_email)
+        if index is not None:
+            index.remove(id)
+
+    def invalidate(self, user_email):
+        """
+        Drop the index of a user, e.g. after a bulk change; it is rebuilt on next use.
+
+        :param user_email: The email of the user.
+        :type user_email: str
+        """
+        self.loading.pop(user_email, None)
+        self.tenants.pop(user_email, None)
+
+    def clear(self):
+        """
+        Drop all indexes.
+        """
+        self.tenants.clear()
+        self.loading.clear()
+
+
+CONTACT_INDEX = ContactIndex()
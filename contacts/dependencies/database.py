@@ -1,20 +1,233 @@
-from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from dotenv import load_dotenv
-import os
-
-load_dotenv()
-
-DATABASE_URL = os.getenv("DATABASE_URL")
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base = declarative_base()
-
-
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+import time
+
+from sqlalchemy import exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from contacts.dependencies.replicas import ReplicaSet
+from contacts.dependencies.settings import get_settings
+
+settings = get_settings()
+
+DATABASE_URL = settings.database_url
+DATABASE_REPLICA_URLS = settings.database_replica_urls
+DB_POOL_SIZE = settings.db_pool_size
+DB_MAX_OVERFLOW = settings.db_max_overflow
+DB_POOL_TIMEOUT = settings.db_pool_timeout
+DB_POOL_RECYCLE = settings.db_pool_recycle
+DB_POOL_PRE_PING = settings.db_pool_pre_ping
+DB_STATEMENT_TIMEOUT = settings.db_statement_timeout
+
+
+class PoolMetrics:
+    """
+    How long requests wait for a pooled connection, to size the pool against the number
+    of workers: long or timed out waits mean the pool is too small.
+    """
+    def __init__(self):
+        """
+        Initialize the PoolMetrics instance.
+        """
+        self.reset()
+
+    def reset(self):
+        """
+        Start counting from zero.
+        """
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_time = 0.0
+        self.max_wait_time = 0.0
+
+    def record(self, seconds, timed_out=False):
+        """
+        Record one connection checkout.
+
+        :param seconds: Time spent waiting for the connection.
+        :type seconds: float
+        :param timed_out: The pool had no connection to give within its timeout.
+        :type timed_out: bool
+        """
+        if timed_out:
+            self.timeouts += 1
+        else:
+            self.checkouts += 1
+        self.wait_time += seconds
+        self.max_wait_time = max(self.max_wait_time, seconds)
+
+    def snapshot(self, pool):
+        """
+        Current gauges of a pool together with the recorded wait times.
+
+        :param pool: The pool of the engine.
+        :type pool: sqlalchemy.pool.Pool
+        :return: Metrics by name.
+        :rtype: dict
+        """
+        metrics = {}
+        if isinstance(pool, QueuePool):
+            metrics.update(size=pool.size(), checked_out=pool.checkedout(), checked_in=pool.checkedin(),
+                           overflow=max(pool.overflow(), 0), max_overflow=pool._max_overflow)
+        metrics.update(checkouts=self.checkouts, timeouts=self.timeouts, wait_time=round(self.wait_time, 6),
+                       max_wait_time=round(self.max_wait_time, 6),
+                       avg_wait_time=round(self.wait_time / self.checkouts, 6) if self.checkouts else 0.0)
+        return metrics
+
+
+POOL_METRICS = PoolMetrics()
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """
+    Queue pool that records the time every checkout waits, including the pre-ping
+    and opening a new connection.
+    """
+    metrics = POOL_METRICS
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            self.metrics.record(time.perf_counter() - start, timed_out=True)
+            raise
+        self.metrics.record(time.perf_counter() - start)
+        return connection
+
+
+def engine_options(database_url):
+    """
+    Keyword arguments of ``create_async_engine`` for a database, taken from the environment.
+
+    In-memory SQLite keeps its single shared connection, other databases get an instrumented
+    queue pool. The statement timeout is set per connection on PostgreSQL.
+
+    :param database_url: The database URL.
+    :type database_url: str
+    :return: The engine options.
+    :rtype: dict
+    """
+    url = make_url(database_url)
+    options = {'pool_pre_ping': DB_POOL_PRE_PING, 'pool_recycle': DB_POOL_RECYCLE}
+    if url.get_backend_name() != 'sqlite' or url.database not in (None, '', ':memory:'):
+        options.update(poolclass=InstrumentedPool, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW,
+                       pool_timeout=DB_POOL_TIMEOUT)
+    if url.get_backend_name() == 'postgresql' and DB_STATEMENT_TIMEOUT:
+        options['connect_args'] = {'server_settings': {'statement_timeout': str(DB_STATEMENT_TIMEOUT)}}
+    return options
+
+
+def create_replica_engine(database_url):
+    """
+    Create the engine of a read replica, with its own pool metrics.
+
+    :param database_url: The replica URL.
+    :type database_url: str
+    :return: The engine.
+    :rtype: AsyncEngine
+    """
+    replica = create_async_engine(database_url, **engine_options(database_url))
+    if isinstance(replica.pool, InstrumentedPool):
+        replica.pool.metrics = PoolMetrics()
+    return replica
+
+
+Base = declarative_base()
+
+# created on first use, so importing the application does not connect anywhere
+ENGINE = None
+REPLICAS = None
+SESSIONMAKER = None
+
+
+def get_engine():
+    """
+    The engine of the application database.
+
+    :return: The engine.
+    :rtype: AsyncEngine
+    """
+    global ENGINE
+    if ENGINE is None:
+        ENGINE = create_async_engine(DATABASE_URL, **engine_options(DATABASE_URL))
+    return ENGINE
+
+
+def get_replicas():
+    """
+    The read replicas of the application database.
+
+    :return: The replicas.
+    :rtype: ReplicaSet
+    """
+    global REPLICAS
+    if REPLICAS is None:
+        REPLICAS = ReplicaSet(create_replica_engine(url) for url in DATABASE_REPLICA_URLS)
+    return REPLICAS
+
+
+def get_sessionmaker():
+    """
+    The factory of the sessions of the application database.
+
+    :return: The session factory.
+    :rtype: async_sessionmaker
+    """
+    global SESSIONMAKER
+    if SESSIONMAKER is None:
+        SESSIONMAKER = async_sessionmaker(bind=get_engine(), class_=AsyncSession, info={'replicas': get_replicas()},
+                                          autoflush=False, expire_on_commit=False)
+    return SESSIONMAKER
+
+
+def new_session():
+    """
+    A new session of the application database, for work outside of a request.
+
+    :return: The session.
+    :rtype: AsyncSession
+    """
+    return get_sessionmaker()()
+
+
+async def dispose_engines():
+    """
+    Close the connection pools of the engine and the replicas, if they were created.
+    """
+    if ENGINE is not None:
+        await ENGINE.dispose()
+    if REPLICAS is not None:
+        await REPLICAS.dispose()
+
+
+async def get_db():
+    """
+    Provide an async database session for the duration of a request.
+
+    The session checks a connection out of the pool on its first statement and returns
+    it on commit or when the request ends, so requests that never query the database,
+    e.g. ones answered from the user cache, do not wait for the pool.
+
+    :return: An async database session.
+    :rtype: AsyncSession
+    """
+    async with new_session() as db:
+        yield db
+
+
+def pool_metrics():
+    """
+    Gauges and wait times of the connection pool of the application engine, and of each
+    read replica if there are any.
+
+    :return: Metrics by name.
+    :rtype: dict
+    """
+    engine, replicas = get_engine(), get_replicas()
+    metrics = getattr(engine.pool, 'metrics', POOL_METRICS).snapshot(engine.pool)
+    if replicas.engines:
+        metrics['replicas'] = [dict(getattr(replica.pool, 'metrics', POOL_METRICS).snapshot(replica.pool),
+                                    healthy=replica not in replicas.down) for replica in replicas.engines]
+    return metrics
@@ -1,20 +1,227 @@
+import asyncio
 import smtplib
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
-from dotenv import load_dotenv
-import os
 
-load_dotenv()
+from contacts.dependencies.settings import get_settings, secret
 
-EMAIL_HOST = 'smtp.meta.ua'
-EMAIL_PORT = 465
-EMAIL_HOST_USER = os.getenv("EMAIL_HOST_USER")
-EMAIL_HOST_PASSWORD = os.getenv("EMAIL_HOST_PASSWORD")
+settings = get_settings()
+EMAIL_HOST = settings.email_host
+EMAIL_PORT = settings.email_port
+EMAIL_HOST_USER = settings.email_host_user
+EMAIL_HOST_PASSWORD = secret(settings.email_host_password)
+
+
+class EmailOutbox:
+    """
+    Queue of outgoing emails delivered in the background.
+
+    Each worker keeps its own authenticated SMTP connection open between messages, sends
+    whatever has piled up in the queue as one batch over it, and puts failed messages
+    back into the queue with exponential backoff.
+    """
+    def __init__(self, host, port, username=None, password=None, sender=None, use_ssl=None, use_tls=True,
+                 workers=2, batch_size=20, max_retries=3, backoff=1.0, idle_timeout=30.0, timeout=30.0):
+        """
+        Initialize the EmailOutbox instance.
+
+        :param host: SMTP server host.
+        :type host: str
+        :param port: SMTP server port.
+        :type port: int
+        :param username: Login for the SMTP server, no login if None.
+        :type username: str, optional
+        :param password: Password for the SMTP server.
+        :type password: str, optional
+        :param sender: Address the emails are sent from, the username by default.
+        :type sender: str, optional
+        :param use_ssl: Connect over implicit TLS, defaults to True for port 465.
+        :type use_ssl: bool, optional
+        :param use_tls: Upgrade a plain connection with STARTTLS.
+        :type use_tls: bool
+        :param workers: Number of concurrent senders, each with its own connection.
+        :type workers: int
+        :param batch_size: Maximum number of messages sent in one go over a connection.
+        :type batch_size: int
+        :param max_retries: How many times a failed message is retried before it is dropped.
+        :type max_retries: int
+        :param backoff: Delay (in seconds) before the first retry, doubled on each next one.
+        :type backoff: float
+        :param idle_timeout: Seconds without messages after which a worker closes its connection.
+        :type idle_timeout: float
+        :param timeout: Seconds a connect or SMTP command may take before it fails.
+        :type timeout: float
+        """
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.sender = sender or username
+        self.use_ssl = port == 465 if use_ssl is None else use_ssl
+        self.use_tls = use_tls
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.queue = None
+        self.tasks = []
+
+    def connect(self):
+        """
+        Open and authenticate a new SMTP connection.
+
+        :return: The SMTP connection.
+        :rtype: smtplib.SMTP
+        """
+        if self.use_ssl:
+            server = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout)
+        else:
+            server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if not self.use_ssl and self.use_tls:
+                server.starttls()
+            if self.username:
+                server.login(self.username, self.password)
+        except Exception:
+            self.close(server)
+            raise
+        return server
+
+    def start(self):
+        """
+        Start the workers on the running event loop.
+        """
+        if self.tasks:
+            return
+        self.queue = asyncio.Queue()
+        self.tasks = [asyncio.create_task(self.worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """
+        Wait until every queued message has been handled and stop the workers.
+        """
+        if not self.tasks:
+            return
+        await self.queue.join()
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    def put(self, subject, message, to_email):
+        """
+        Queue an email for delivery and return immediately.
+
+        :param subject: The subject of the email.
+        :type subject: str
+        :param message: The message content of the email.
+        :type message: str
+        :param to_email: The recipient's email address.
+        :type to_email: str
+        """
+        self.start()
+        msg = MIMEMultipart()
+        msg['From'] = self.sender
+        msg['To'] = to_email
+        msg['Subject'] = subject
+        msg.attach(MIMEText(message, 'plain'))
+        self.queue.put_nowait((to_email, msg.as_string(), 0))
+
+    async def worker(self):
+        server = None
+        try:
+            while True:
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), self.idle_timeout)
+                except asyncio.TimeoutError:
+                    server = await asyncio.to_thread(self.close, server)
+                    continue
+                batch = [item]
+                while len(batch) < self.batch_size and not self.queue.empty():
+                    batch.append(self.queue.get_nowait())
+                try:
+                    server, failed = await asyncio.to_thread(self.send_batch, server, batch)
+                except Exception as e:
+                    print(f"Failed to send email: {e}")
+                    server, failed = await asyncio.to_thread(self.close, server), batch
+                for _ in range(len(batch) - len(failed)):
+                    self.queue.task_done()
+                for item in failed:
+                    self.retry(item)
+        finally:
+            self.close(server)
+
+    def send_batch(self, server, batch):
+        """
+        Send a batch of messages over one connection, reconnecting once if it went stale.
+
+        :param server: An open connection or None.
+        :type server: smtplib.SMTP | None
+        :param batch: Messages as (recipient, text, attempt) tuples.
+        :type batch: list[tuple]
+        :return: The connection to reuse and the messages that could not be sent.
+        :rtype: tuple[smtplib.SMTP | None, list[tuple]]
+        """
+        failed = []
+        for to_email, text, attempt in batch:
+            for reconnect in (False, True):
+                try:
+                    if server is None:
+                        server = self.connect()
+                    server.sendmail(self.sender, to_email, text)
+                    break
+                except OSError as e:
+                    # SMTPException is an OSError too, but only a dropped connection is worth reconnecting for
+                    stale = not isinstance(e, smtplib.SMTPException) or isinstance(e, smtplib.SMTPServerDisconnected)
+                    if stale:
+                        server = self.close(server)
+                    if reconnect or not stale:
+                        failed.append((to_email, text, attempt))
+                        print(f"Failed to send email: {e}")
+                        break
+        return server, failed
+
+    def retry(self, item):
+        """
+        Put a failed message back into the queue after a backoff delay, or drop it
+        once it is out of retries. The message stays unfinished while it waits, so
+        ``stop`` does not return before it has been retried.
+
+        :param item: The message as a (recipient, text, attempt) tuple.
+        :type item: tuple
+        """
+        to_email, text, attempt = item
+        if attempt >= self.max_retries:
+            print(f"Failed to send email to {to_email} after {attempt + 1} attempts")
+            self.queue.task_done()
+            return
+        asyncio.get_running_loop().call_later(self.backoff * 2 ** attempt, self.requeue,
+                                              (to_email, text, attempt + 1))
+
+    def requeue(self, item):
+        self.queue.put_nowait(item)
+        self.queue.task_done()
+
+    @staticmethod
+    def close(server):
+        if server is not None:
+            try:
+                server.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+        return None
+
+
+OUTBOX = EmailOutbox(EMAIL_HOST, EMAIL_PORT, EMAIL_HOST_USER, EMAIL_HOST_PASSWORD,
+                     workers=settings.email_workers, batch_size=settings.email_batch_size,
+                     timeout=settings.email_timeout)
 
 
 def send_email(subject, message, to_email):
     """
-    Send an email.
+    Queue an email; it is sent in the background by the outbox workers.
 
     :param subject: The subject of the email.
     :type subject: str
@@ -23,19 +230,4 @@ def send_email(subject, message, to_email):
     :param to_email: The recipient's email address.
     :type to_email: str
     """
-    msg = MIMEMultipart()
-    msg['From'] = EMAIL_HOST_USER
-    msg['To'] = to_email
-    msg['Subject'] = subject
-    msg.attach(MIMEText(message, 'plain'))
-
-    try:
-        server = smtplib.SMTP(EMAIL_HOST, EMAIL_PORT)
-        server.starttls()
-        server.login(EMAIL_HOST_USER, EMAIL_HOST_PASSWORD)
-        text = msg.as_string()
-        server.sendmail(EMAIL_HOST_USER, to_email, text)
-        server.quit()
-        print("Email sent successfully")
-    except Exception as e:
-        print(f"Failed to send email: {e}")
+    OUTBOX.put(subject, message, to_email)
@@ -0,0 +1,63 @@
+import datetime
+
+
+def version(updated_at):
+    """
+    Turn a modification time into a compact version string.
+
+    :param updated_at: Modification time in UTC, or None for rows that never had one.
+    :type updated_at: datetime.datetime | None
+    :return: Microseconds since the epoch in hex.
+    :rtype: str
+    """
+    if updated_at is None:
+        return '0'
+    return format(int(updated_at.replace(tzinfo=datetime.timezone.utc).timestamp() * 1000000), 'x')
+
+
+def contact_etag(contact):
+    """
+    Weak ETag of a single contact.
+
+    :param contact: The contact.
+    :type contact: ContactModel
+    :return: The ETag.
+    :rtype: str
+    """
+    return f'W/"{contact.id}-{version(contact.updated_at)}"'
+
+
+def collection_etag(count, updated_at):
+    """
+    Weak ETag of the contacts of a user, from their number and the latest modification time.
+    Creating or changing a contact moves the time, deleting one changes the number.
+
+    :param count: Number of contacts.
+    :type count: int
+    :param updated_at: Latest modification time.
+    :type updated_at: datetime.datetime | None
+    :return: The ETag.
+    :rtype: str
+    """
+    return f'W/"{count}-{version(updated_at)}"'
+
+
+def etag_matches(if_none_match, etag):
+    """
+    Weak comparison of an ETag with an If-None-Match header.
+
+    :param if_none_match: The If-None-Match header, may list several ETags or be ``*``.
+    :type if_none_match: str | None
+    :param etag: The current ETag.
+    :type etag: str
+    :return: True if the client already has the current representation.
+    :rtype: bool
+    """
+    if not if_none_match:
+        return False
+    opaque = etag.removeprefix('W/')
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate == '*' or candidate.removeprefix('W/') == opaque:
+            return True
+    return False
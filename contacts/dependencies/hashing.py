@@ -0,0 +1,27 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from contacts.dependencies.settings import get_settings
+
+PASSWORD_HASH_ITERATIONS = get_settings().password_hash_iterations
+PASSWORD_HASH_WORKERS = get_settings().password_hash_workers
+
+HASH_EXECUTOR = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix='password-hash')
+
+
+async def run_in_hash_pool(func, *args, **kwargs):
+    """
+    Run a CPU-heavy password function on the hashing thread pool.
+
+    The pool size caps how many hashes are computed at once; further calls wait
+    for a free worker without blocking the event loop. hashlib releases the GIL
+    while deriving keys, so the workers run in parallel.
+
+    :param func: The function to run.
+    :type func: Callable
+    :return: The result of the function.
+    :rtype: Any
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(HASH_EXECUTOR, functools.partial(func, *args, **kwargs))
@@ -0,0 +1,305 @@
+import asyncio
+import datetime
+import uuid
+from abc import ABC, abstractmethod
+
+from sqlalchemy import delete, insert, select, update
+
+from contacts.dependencies.cache import TTLCache
+from contacts.models.avatar_job import AvatarJobModel
+
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+
+
+class Job:
+    """
+    A unit of background work and its outcome.
+    """
+    def __init__(self, user_email, path, filename=None, digest=None, id=None, status=QUEUED, result=None,
+                 error=None, created_at=None, updated_at=None):
+        """
+        Initialize the Job instance.
+
+        :param user_email: The email of the user the job runs for.
+        :type user_email: str
+        :param path: Path of the file the job works on.
+        :type path: str
+        :param filename: Name of the file on the client.
+        :type filename: str, optional
+        :param digest: SHA-256 of the file, hex encoded.
+        :type digest: str, optional
+        :param id: Id of the job, a new one if None.
+        :type id: str, optional
+        :param status: queued, running, done or failed.
+        :type status: str
+        :param result: What a finished job produced, e.g. a URL.
+        :type result: str, optional
+        :param error: Why a failed job failed.
+        :type error: str, optional
+        """
+        now = datetime.datetime.utcnow()
+        self.id = id or uuid.uuid4().hex
+        self.user_email = user_email
+        self.path = path
+        self.filename = filename
+        self.digest = digest
+        self.status = status
+        self.result = result
+        self.error = error
+        self.created_at = created_at or now
+        self.updated_at = updated_at or now
+
+    @property
+    def finished(self):
+        return self.status in (DONE, FAILED)
+
+
+class JobStore(ABC):
+    """
+    Where jobs and their status are kept between the request that submits them, the
+    worker that runs them and the requests that poll them.
+    """
+    @abstractmethod
+    async def add(self, job):
+        """
+        Store a new job.
+
+        :param job: The job.
+        :type job: Job
+        """
+
+    @abstractmethod
+    async def save(self, job):
+        """
+        Store the status, result and error of a job.
+
+        :param job: The job.
+        :type job: Job
+        """
+
+    @abstractmethod
+    async def get(self, job_id):
+        """
+        Look a job up.
+
+        :param job_id: Id of the job.
+        :type job_id: str
+        :return: The job, None if unknown or expired.
+        :rtype: Job | None
+        """
+
+    @abstractmethod
+    async def unfinished(self):
+        """
+        Jobs still queued or running, for a restarted queue to pick up.
+
+        :return: The jobs, oldest first.
+        :rtype: list[Job]
+        """
+
+
+class MemoryJobStore(JobStore):
+    """
+    Jobs kept by this worker process only; they are lost on restart and cannot be
+    polled through another worker.
+    """
+    def __init__(self, max_jobs=10000, ttl=3600):
+        """
+        Initialize the MemoryJobStore instance.
+
+        :param max_jobs: Maximum number of jobs kept.
+        :type max_jobs: int
+        :param ttl: Seconds a job is kept after its last change.
+        :type ttl: float
+        """
+        self.jobs = TTLCache(max_jobs, ttl)
+
+    async def add(self, job):
+        self.jobs.set(job.id, job)
+
+    async def save(self, job):
+        self.jobs.set(job.id, job)
+
+    async def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    async def unfinished(self):
+        return []
+
+
+class DatabaseJobStore(JobStore):
+    """
+    Jobs kept in the ``avatar_jobs`` table, shared by all workers and kept across restarts.
+    Finished jobs are deleted once they are older than the time to live.
+    """
+    def __init__(self, sessionmaker, ttl=3600):
+        """
+        Initialize the DatabaseJobStore instance.
+
+        :param sessionmaker: Factory of the sessions the store works in.
+        :type sessionmaker: Callable[[], AsyncSession]
+        :param ttl: Seconds a finished job is kept.
+        :type ttl: float
+        """
+        self.sessionmaker = sessionmaker
+        self.ttl = ttl
+
+    async def add(self, job):
+        cutoff = datetime.datetime.utcnow() - datetime.timedelta(seconds=self.ttl)
+        async with self.sessionmaker() as db:
+            await db.execute(delete(AvatarJobModel).where(AvatarJobModel.status.in_([DONE, FAILED]),
+                                                          AvatarJobModel.updated_at < cutoff))
+            await db.execute(insert(AvatarJobModel).values(
+                id=job.id, user_email=job.user_email, path=job.path, filename=job.filename, digest=job.digest,
+                status=job.status, created_at=job.created_at, updated_at=job.updated_at))
+            await db.commit()
+
+    async def save(self, job):
+        async with self.sessionmaker() as db:
+            await db.execute(update(AvatarJobModel).where(AvatarJobModel.id == job.id).values(
+                status=job.status, result=job.result, error=job.error, updated_at=job.updated_at))
+            await db.commit()
+
+    async def get(self, job_id):
+        async with self.sessionmaker() as db:
+            row = (await db.execute(select(AvatarJobModel.__table__).where(AvatarJobModel.id == job_id))).first()
+        return Job(**row._mapping) if row else None
+
+    async def unfinished(self):
+        async with self.sessionmaker() as db:
+            rows = await db.execute(select(AvatarJobModel.__table__)
+                                    .where(AvatarJobModel.status.in_([QUEUED, RUNNING]))
+                                    .order_by(AvatarJobModel.created_at))
+        return [Job(**row._mapping) for row in rows]
+
+
+class JobQueue:
+    """
+    Jobs run in the background by a few workers on the event loop; their status is kept
+    in a job store and can be polled.
+    """
+    def __init__(self, handler, store, workers=2, cleanup=None):
+        """
+        Initialize the JobQueue instance.
+
+        :param handler: Coroutine function run for each job; what it returns is the job's result.
+        :type handler: Callable[[Job], Awaitable[str]]
+        :param store: Where the jobs are kept.
+        :type store: JobStore
+        :param workers: Number of jobs run at the same time.
+        :type workers: int
+        :param cleanup: Called with each job once it is finished, e.g. to delete its file.
+        :type cleanup: Callable[[Job], None], optional
+        """
+        self.handler = handler
+        self.store = store
+        self.workers = workers
+        self.cleanup = cleanup
+        self.queue = None
+        self.tasks = []
+
+    def start(self):
+        """
+        Start the workers on the running event loop.
+        """
+        if self.tasks:
+            return
+        self.queue = asyncio.Queue()
+        self.tasks = [asyncio.create_task(self.worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """
+        Wait until every queued job has been run and stop the workers.
+        """
+        if not self.tasks:
+            return
+        await self.queue.join()
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    async def recover(self):
+        """
+        Queue again the jobs a previous run of the application left unfinished. With several
+        application processes sharing a store each of them does so, so handlers have to be
+        safe to run twice.
+
+        :return: Number of jobs queued.
+        :rtype: int
+        """
+        self.start()
+        jobs = await self.store.unfinished()
+        for job in jobs:
+            self.queue.put_nowait(job)
+        return len(jobs)
+
+    async def submit(self, user_email, path, filename=None, digest=None):
+        """
+        Store a new job and queue it; it is run in the background.
+
+        :param user_email: The email of the user the job runs for.
+        :type user_email: str
+        :param path: Path of the file the job works on.
+        :type path: str
+        :param filename: Name of the file on the client.
+        :type filename: str, optional
+        :param digest: SHA-256 of the file, hex encoded.
+        :type digest: str, optional
+        :return: The queued job.
+        :rtype: Job
+        """
+        self.start()
+        job = Job(user_email, path, filename, digest)
+        await self.store.add(job)
+        self.queue.put_nowait(job)
+        return job
+
+    async def get(self, job_id):
+        """
+        Look a job up.
+
+        :param job_id: Id of the job.
+        :type job_id: str
+        :return: The job, None if unknown or expired.
+        :rtype: Job | None
+        """
+        return await self.store.get(job_id)
+
+    async def worker(self):
+        while True:
+            job = await self.queue.get()
+            try:
+                await self.run(job)
+            finally:
+                self.queue.task_done()
+
+    async def run(self, job):
+        """
+        Run a job and store how it ended.
+
+        :param job: The job.
+        :type job: Job
+        """
+        await self.update(job, RUNNING)
+        try:
+            result = await self.handler(job)
+        except asyncio.CancelledError:
+            raise
+        except ValueError as e:
+            await self.update(job, FAILED, error=str(e))
+        except Exception as e:
+            print(f"Job {job.id} failed: {e!r}")
+            await self.update(job, FAILED, error='There was an error processing the job')
+        else:
+            await self.update(job, DONE, result=result)
+        if job.finished and self.cleanup is not None:
+            self.cleanup(job)
+
+    async def update(self, job, status, result=None, error=None):
+        job.status, job.result, job.error = status, result, error
+        job.updated_at = datetime.datetime.utcnow()
+        try:
+            await self.store.save(job)
+        except Exception as e:
+            print(f"Failed to save job {job.id}: {e!r}")
@@ -1,12 +1,142 @@
 import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
 from fastapi import Request, HTTPException
 
+from contacts.dependencies.settings import get_settings
+
+
+class RateLimitBackend(ABC):
+    """
+    Storage for request counters. Implementations decide where the counters live.
+    """
+    @abstractmethod
+    async def hit(self, key, max_requests, window_time):
+        """
+        Count a request for the key and tell whether it fits into the limit.
+
+        :param key: Counter key, made of the limiter scope and the client id.
+        :type key: str
+        :param max_requests: Maximum number of requests allowed within the window time.
+        :type max_requests: int
+        :param window_time: Length of the sliding window in seconds.
+        :type window_time: int
+        :return: True if the request is allowed, False otherwise.
+        :rtype: bool
+        """
+
+
+def sliding_window_estimate(previous_count, current_count, window_time, now):
+    """
+    Estimate the number of requests in the sliding window ending now.
+
+    The previous fixed window is weighted by the part of it the sliding window still
+    covers, which gives a close approximation with two counters per client.
+
+    :param previous_count: Requests counted in the previous fixed window.
+    :type previous_count: int
+    :param current_count: Requests counted in the current fixed window.
+    :type current_count: int
+    :param window_time: Length of the window in seconds.
+    :type window_time: int
+    :param now: Current time in seconds.
+    :type now: float
+    :return: Estimated number of requests.
+    :rtype: float
+    """
+    elapsed = now % window_time
+    return previous_count * (window_time - elapsed) / window_time + current_count
+
+
+class InMemoryBackend(RateLimitBackend):
+    """
+    Sliding window counters kept in the memory of the current process.
+
+    Clients are kept in least recently seen order, so idle ones are dropped from the
+    front of the dict while serving requests and the number of tracked clients is capped.
+    """
+    def __init__(self, max_clients=10000):
+        """
+        Initialize the InMemoryBackend instance.
+
+        :param max_clients: Maximum number of clients tracked at once.
+        :type max_clients: int
+        """
+        self.max_clients = max_clients
+        self.requests = OrderedDict()
+
+    async def hit(self, key, max_requests, window_time):
+        now = time.time()
+        window = int(now // window_time)
+        request_info = self.requests.pop(key, None)
+
+        if request_info is None or window - request_info[0] > 1:
+            previous_count, current_count = 0, 0
+        elif window - request_info[0] == 1:
+            previous_count, current_count = request_info[2], 0
+        else:
+            previous_count, current_count = request_info[1], request_info[2]
+
+        allowed = sliding_window_estimate(previous_count, current_count, window_time, now) < max_requests
+        if allowed:
+            current_count += 1
+        self.requests[key] = (window, previous_count, current_count, now + 2 * window_time)
+        self.evict(now)
+        return allowed
+
+    def evict(self, now):
+        """
+        Drop clients that have been idle for two windows and keep the dict within max_clients.
+
+        :param now: Current time in seconds.
+        :type now: float
+        """
+        while self.requests:
+            key, request_info = next(iter(self.requests.items()))
+            if request_info[3] > now and len(self.requests) <= self.max_clients:
+                break
+            del self.requests[key]
+
+
+class SharedStoreBackend(RateLimitBackend):
+    """
+    Sliding window counters kept in a store shared by all workers, such as Redis.
+
+    The store client needs async ``get``, ``incr``, ``decr`` and ``expire`` methods
+    with Redis semantics, e.g. ``redis.asyncio.Redis``.
+    """
+    def __init__(self, client, prefix='rate_limit'):
+        """
+        Initialize the SharedStoreBackend instance.
+
+        :param client: Async client of the shared store.
+        :type client: redis.asyncio.Redis
+        :param prefix: Prefix of the keys written to the store.
+        :type prefix: str
+        """
+        self.client = client
+        self.prefix = prefix
+
+    async def hit(self, key, max_requests, window_time):
+        now = time.time()
+        window = int(now // window_time)
+        current_key = f'{self.prefix}:{key}:{window}'
+        previous_count = int(await self.client.get(f'{self.prefix}:{key}:{window - 1}') or 0)
+        current_count = await self.client.incr(current_key)
+        await self.client.expire(current_key, 2 * window_time)
+        if sliding_window_estimate(previous_count, current_count - 1, window_time, now) < max_requests:
+            return True
+        await self.client.decr(current_key)
+        return False
+
 
 class RateLimiter:
     """
     Rate limiter class to limit the number of requests from clients.
+
+    An instance can be used directly as a route dependency to give the route its own limit.
     """
-    def __init__(self, max_requests, window_time):
+    def __init__(self, max_requests, window_time, scope='global', backend=None):
         """
         Initialize the RateLimiter instance.
 
@@ -14,12 +144,17 @@ class RateLimiter:
         :type max_requests: int
         :param window_time: Time window (in seconds) within which the maximum number of requests are allowed.
         :type window_time: int
+        :param scope: Name that keeps the counters of this limiter apart from other limiters.
+        :type scope: str
+        :param backend: Where the counters are stored, process memory by default.
+        :type backend: RateLimitBackend, optional
         """
-        self.requests = {}
         self.max_requests = max_requests
         self.window_time = window_time
+        self.scope = scope
+        self.backend = backend or InMemoryBackend()
 
-    def is_allowed(self, client_id):
+    async def is_allowed(self, client_id):
         """
         Check if the client is allowed to make a request based on rate limiting rules.
 
@@ -28,27 +163,28 @@ class RateLimiter:
         :return: True if the request is allowed, False otherwise.
         :rtype: bool
         """
-        current_time = time.time()
-        request_info = self.requests.get(client_id)
-
-        if request_info is None:
-            self.requests[client_id] = [current_time, 1]
-            return True
-
-        last_request_time, request_count = request_info
+        return await self.backend.hit(f'{self.scope}:{client_id}', self.max_requests, self.window_time)
 
-        if current_time - last_request_time > self.window_time:
-            self.requests[client_id] = [current_time, 1]
-            return True
-
-        if request_count < self.max_requests:
-            self.requests[client_id][1] += 1
-            return True
+    async def __call__(self, request: Request):
+        """
+        Rate limit dependency to restrict the number of requests from clients.
 
-        return False
+        :param request: The incoming HTTP request.
+        :type request: Request
+        :raises HTTPException: If the number of requests exceeds the limit, raises a 429 Too Many Requests error.
+        :return: True if the request is allowed, otherwise raises an exception.
+        :rtype: bool
+        """
+        if not await self.is_allowed(request.client.host):
+            raise HTTPException(status_code=429, detail="Too Many Requests")
+        return True
 
 
-RATE_LIMITER = RateLimiter(3, 120)
+settings = get_settings()
+RATE_LIMITER = RateLimiter(settings.rate_limit_requests, settings.rate_limit_window)
+# caller ID lookups come from dialers at a steady high rate
+LOOKUP_RATE_LIMITER = RateLimiter(settings.lookup_rate_limit_requests, settings.lookup_rate_limit_window,
+                                  scope='lookup')
 
 
 async def rate_limit(request: Request):
@@ -61,8 +197,4 @@ async def rate_limit(request: Request):
     :return: True if the request is allowed, otherwise raises an exception.
     :rtype: bool
     """
-    global RATE_LIMITER
-    client_id = request.client.host
-    if not RATE_LIMITER.is_allowed(client_id):
-        raise HTTPException(status_code=429, detail="Too Many Requests")
-    return True
+    return await RATE_LIMITER(request)
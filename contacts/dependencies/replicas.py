@@ -0,0 +1,241 @@
+import asyncio
+import copy
+import functools
+import inspect
+import itertools
+import time
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from contacts.dependencies.cache import TTLCache
+from contacts.dependencies.settings import get_settings
+
+settings = get_settings()
+
+REPLICA_STICKY_SECONDS = settings.replica_sticky_seconds
+REPLICA_RETRY_AFTER = settings.replica_retry_after
+REPLICA_CHECK_TIMEOUT = settings.replica_check_timeout
+
+
+class ReplicaSet:
+    """
+    Read replicas used in turn. A replica that fails is left out for a while and is only
+    used again once it answers a health check.
+
+    Users who wrote recently are remembered by this worker process only; with several
+    workers, a read served by another worker may still go to a replica.
+    """
+    def __init__(self, engines=(), sticky_for=REPLICA_STICKY_SECONDS, retry_after=REPLICA_RETRY_AFTER,
+                 check_timeout=REPLICA_CHECK_TIMEOUT, max_users=10000):
+        """
+        Initialize the ReplicaSet instance.
+
+        :param engines: Engines of the replicas.
+        :type engines: Iterable[AsyncEngine]
+        :param sticky_for: Seconds the reads of a user go to the primary after they wrote.
+        :type sticky_for: float
+        :param retry_after: Seconds a failed replica is left out before it is checked again.
+        :type retry_after: float
+        :param check_timeout: Seconds a health check may take.
+        :type check_timeout: float
+        :param max_users: Maximum number of recent writers remembered.
+        :type max_users: int
+        """
+        self.engines = list(engines)
+        self.retry_after = retry_after
+        self.check_timeout = check_timeout
+        self.recent_writers = TTLCache(max_users, sticky_for)
+        self.down = {}
+        self.counter = itertools.count()
+
+    def wrote(self, user_email):
+        """
+        Keep the reads of a user on the primary for the sticky window.
+
+        :param user_email: The email of the user.
+        :type user_email: str
+        """
+        if self.engines:
+            self.recent_writers.set(user_email, True)
+
+    def mark_down(self, engine):
+        """
+        Leave a replica out until it is due for a health check.
+
+        :param engine: The replica.
+        :type engine: AsyncEngine
+        """
+        self.down[engine] = time.monotonic() + self.retry_after
+
+    async def check(self, engine):
+        """
+        Check that a replica answers a query, and mark it up or down accordingly.
+
+        :param engine: The replica.
+        :type engine: AsyncEngine
+        :return: True if the replica is healthy.
+        :rtype: bool
+        """
+        async def ping():
+            async with engine.connect() as connection:
+                await connection.execute(text('SELECT 1'))
+
+        try:
+            await asyncio.wait_for(ping(), self.check_timeout)
+        except (DBAPIError, OSError, asyncio.TimeoutError):
+            self.mark_down(engine)
+            return False
+        self.down.pop(engine, None)
+        return True
+
+    def is_sticky(self, user_email):
+        """
+        Whether the reads of a user have to stay on the primary.
+
+        :param user_email: The email of the user.
+        :type user_email: str | None
+        :return: True if the user wrote within the sticky window.
+        :rtype: bool
+        """
+        return user_email is not None and self.recent_writers.get(user_email, False)
+
+    async def acquire(self):
+        """
+        Pick the next healthy replica, checking the ones due for a retry on the way.
+
+        :return: The replica, or None if there is no healthy one.
+        :rtype: AsyncEngine | None
+        """
+        for _ in range(len(self.engines)):
+            engine = self.engines[next(self.counter) % len(self.engines)]
+            down_until = self.down.get(engine)
+            if down_until is None or (down_until <= time.monotonic() and await self.check(engine)):
+                return engine
+        return None
+
+    async def dispose(self):
+        """
+        Close the connection pools of all replicas.
+        """
+        for engine in self.engines:
+            await engine.dispose()
+
+
+def user_email_of(signature, args, kwargs):
+    """
+    The ``user_email`` argument of a repository method call, None if it has none.
+    """
+    return signature.bind(*args, **kwargs).arguments.get('user_email')
+
+
+async def replica_for(db, user_email):
+    """
+    The replica a session reads from: the one it already uses, or the next healthy one.
+
+    :param db: The session of the repository.
+    :type db: AsyncSession
+    :param user_email: The email of the user whose data is read.
+    :type user_email: str | None
+    :return: The replica, or None to read from the primary.
+    :rtype: AsyncEngine | None
+    """
+    replicas = db.info.get('replicas')
+    if not isinstance(replicas, ReplicaSet) or db.info.get('writing') or replicas.is_sticky(user_email):
+        return None
+    replica = db.info.get('replica')
+    if replica is None or replica in replicas.down:
+        replica = db.info['replica'] = await replicas.acquire()
+    return replica
+
+
+def on_replica(repo, replica):
+    """
+    A copy of a repository reading through its own session on a replica, so the session of
+    the request, and whatever it holds, is left alone if the replica fails.
+
+    :param repo: The repository.
+    :type repo: object
+    :param replica: The replica.
+    :type replica: AsyncEngine
+    :return: The copy and its session, which the caller closes.
+    :rtype: tuple[object, AsyncSession]
+    """
+    db = AsyncSession(bind=replica, autoflush=False, expire_on_commit=False)
+    repo = copy.copy(repo)
+    repo.db = db
+    return repo, db
+
+
+def read_only(method):
+    """
+    Run a repository method that only reads on a replica, unless the user wrote recently.
+    The replica is read through a session of its own; objects it returns are detached.
+    If the replica fails the method is run again on the primary.
+
+    :param method: The repository method; its session is ``self.db``.
+    :type method: Callable
+    :return: The wrapped method.
+    :rtype: Callable
+    """
+    signature = inspect.signature(method)
+
+    if inspect.isasyncgenfunction(method):
+        @functools.wraps(method)
+        async def stream(self, *args, **kwargs):
+            replica = await replica_for(self.db, user_email_of(signature, (self, *args), kwargs))
+            if replica is None:
+                async for item in method(self, *args, **kwargs):
+                    yield item
+                return
+            repo, db = on_replica(self, replica)
+            try:
+                async for item in method(repo, *args, **kwargs):
+                    yield item
+            finally:
+                await db.close()
+        return stream
+
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        replica = await replica_for(self.db, user_email_of(signature, (self, *args), kwargs))
+        if replica is None:
+            return await method(self, *args, **kwargs)
+        repo, db = on_replica(self, replica)
+        try:
+            return await method(repo, *args, **kwargs)
+        except (OperationalError, InterfaceError):
+            # the replica is unreachable or cannot answer, leave it out and read from the primary
+            self.db.info['replicas'].mark_down(replica)
+        finally:
+            await db.close()
+        self.db.info.pop('replica', None)
+        return await method(self, *args, **kwargs)
+    return wrapper
+
+
+def writes(method):
+    """
+    Run a repository method that writes on the primary, reads inside it included, and keep
+    the reads of the user on the primary for the sticky window afterwards.
+
+    :param method: The repository method; its session is ``self.db``.
+    :type method: Callable
+    :return: The wrapped method.
+    :rtype: Callable
+    """
+    signature = inspect.signature(method)
+
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        writing = self.db.info.get('writing')
+        self.db.info['writing'] = True
+        try:
+            return await method(self, *args, **kwargs)
+        finally:
+            self.db.info['writing'] = writing
+            replicas = self.db.info.get('replicas')
+            if isinstance(replicas, ReplicaSet):
+                replicas.wrote(user_email_of(signature, (self, *args), kwargs))
+    return wrapper
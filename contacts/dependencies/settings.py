@@ -0,0 +1,144 @@
+import functools
+import os
+import tempfile
+from typing import Literal
+
+from dotenv import load_dotenv
+from pydantic import (BaseModel, ConfigDict, Field, NonNegativeFloat, NonNegativeInt, PositiveFloat, PositiveInt,
+                      SecretStr, field_validator)
+
+
+class Settings(BaseModel):
+    """
+    Configuration of the application, read from the environment (and .env) once.
+    Every field is set by the environment variable of the same name in upper case,
+    so each deployment can tune it without code changes.
+
+    Most fields are read when the module using them is imported, to build long-lived
+    objects such as the engine, the rate limiters, the caches and the email outbox;
+    changing them takes a restart.
+    """
+    model_config = ConfigDict(frozen=True)
+
+    database_url: str | None = None
+    # comma separated URLs of read replicas of DATABASE_URL
+    database_replica_urls: list[str] = []
+    db_pool_size: PositiveInt = 5
+    db_max_overflow: NonNegativeInt = 10
+    db_pool_timeout: PositiveFloat = 30
+    # seconds, -1 to keep connections forever
+    db_pool_recycle: int = Field(1800, ge=-1)
+    db_pool_pre_ping: bool = True
+    # milliseconds, 0 for no limit; only PostgreSQL enforces it
+    db_statement_timeout: NonNegativeInt = 0
+
+    # a user's reads stay on the primary this long after they changed something, to outlast replication lag
+    replica_sticky_seconds: NonNegativeFloat = 10
+    replica_retry_after: NonNegativeFloat = 30
+    replica_check_timeout: PositiveFloat = 2
+
+    secret_key: SecretStr | None = None
+    algorithm: str | None = None
+    access_token_ttl_minutes: PositiveInt = 30
+    refresh_token_ttl_days: PositiveInt = 7
+    password_hash_iterations: PositiveInt = 600000
+    password_hash_workers: PositiveInt = 2
+
+    # requests per window and window length in seconds, per client IP
+    rate_limit_requests: PositiveInt = 3
+    rate_limit_window: PositiveInt = 120
+    # caller ID lookups come from dialers at a steady high rate
+    lookup_rate_limit_requests: PositiveInt = 600
+    lookup_rate_limit_window: PositiveInt = 60
+
+    user_cache_size: PositiveInt = 1024
+    user_cache_ttl: NonNegativeFloat = 60
+    # verified access tokens; entries never outlive the token itself
+    token_cache_size: PositiveInt = 4096
+    token_cache_ttl: NonNegativeFloat = 30 * 60
+
+    email_host: str = 'smtp.meta.ua'
+    email_port: PositiveInt = 465
+    email_host_user: str | None = None
+    email_host_password: SecretStr | None = None
+    email_workers: PositiveInt = 2
+    # seconds an SMTP connect or command may block a worker
+    email_timeout: PositiveFloat = 30
+    email_batch_size: PositiveInt = 20
+
+    cloud_name: str | None = None
+    api_key: str | None = None
+    api_secret: SecretStr | None = None
+
+    contact_index_tenants: PositiveInt = 256
+    contact_index_ttl: NonNegativeFloat = 300
+    # change log entries are kept this many days, sync tokens older than that have to start over
+    contact_changes_retention_days: PositiveInt = 30
+    # a user's change log is compacted every time this many entries have been written
+    contact_changes_compact_every: PositiveInt = 1000
+    # country calling code assumed for numbers written in national format, e.g. 067 123 45 67
+    default_country_code: str = "380"
+
+    avatar_storage: Literal['cloudinary', 'local'] = "cloudinary"
+    avatar_dir: str = "media"
+    avatar_base_url: str | None = None
+    avatar_max_bytes: PositiveInt = 5 * 1024 * 1024
+    avatar_max_pixels: PositiveInt = 40000000
+    # edge lengths of the square avatars made from an upload, the first one is the user's image
+    avatar_sizes: list[PositiveInt] = Field([400, 100], min_length=1)
+    avatar_workers: PositiveInt = 2
+    # uploads wait here for their job; with the database job store keep it on a disk that outlives restarts
+    avatar_spool_dir: str | None = None
+    avatar_job_store: Literal['memory', 'database'] = "memory"
+    avatar_job_workers: PositiveInt = 2
+    avatar_job_ttl: PositiveFloat = 3600
+    # avatars made recently, so an image uploaded again is not decoded again even if storing it failed
+    avatar_cache_dir: str = os.path.join(tempfile.gettempdir(), "avatar-cache")
+    avatar_cache_max_bytes: NonNegativeInt = 64 * 1024 * 1024
+
+    @field_validator('database_replica_urls', 'avatar_sizes', mode='before')
+    @classmethod
+    def split_list(cls, value):
+        if isinstance(value, str):
+            return [item.strip() for item in value.split(',') if item.strip()]
+        return value
+
+    @classmethod
+    def from_env(cls, environ=None):
+        """
+        Read the settings from environment variables.
+
+        :param environ: The variables, ``os.environ`` if None.
+        :type environ: Mapping[str, str], optional
+        :return: The settings.
+        :rtype: Settings
+        """
+        environ = os.environ if environ is None else environ
+        return cls(**{name: environ[name.upper()] for name in cls.model_fields if name.upper() in environ})
+
+
+@functools.lru_cache(maxsize=None)
+def get_settings():
+    """
+    The settings of the application; .env and the environment are read on the first call only.
+    Use it as a dependency, ``settings: Settings = Depends(get_settings)``, to let tests
+    override it; an override only reaches the handlers that take it this way, not the
+    objects built from the settings at import time.
+
+    :return: The settings.
+    :rtype: Settings
+    """
+    load_dotenv()
+    return Settings.from_env()
+
+
+def secret(value):
+    """
+    The plain value of an optional secret setting.
+
+    :param value: The setting.
+    :type value: SecretStr | None
+    :return: The value, None if the setting is not set.
+    :rtype: str | None
+    """
+    return value.get_secret_value() if value is not None else None
@@ -0,0 +1,96 @@
+import shutil
+from abc import ABC, abstractmethod
+from pathlib import Path
+
+from fastapi.concurrency import run_in_threadpool
+
+from contacts.dependencies.cloudinary_dep import get_uploader
+from contacts.dependencies.settings import get_settings
+
+AVATAR_STORAGE = get_settings().avatar_storage
+AVATAR_DIR = get_settings().avatar_dir
+AVATAR_BASE_URL = get_settings().avatar_base_url
+
+
+class AvatarStorage(ABC):
+    """
+    Where avatar images are kept. Implementations decide how files are stored and served.
+    """
+    @abstractmethod
+    async def save(self, path, key):
+        """
+        Store an image file under a key, replacing the one stored under it before.
+
+        :param path: Path of the local file to store.
+        :type path: str
+        :param key: Name of the image, e.g. ``avatars/<user>_400``.
+        :type key: str
+        :return: URL of the stored image.
+        :rtype: str
+        """
+
+
+class CloudinaryStorage(AvatarStorage):
+    """
+    Images uploaded to Cloudinary; the blocking SDK call runs in the thread pool.
+    """
+    def __init__(self, uploader=None):
+        """
+        Initialize the CloudinaryStorage instance.
+
+        :param uploader: The uploader, ``cloudinary.uploader`` (configured on first upload) if None.
+        :type uploader: module, optional
+        """
+        self.uploader = uploader
+
+    async def save(self, path, key):
+        uploader = self.uploader or get_uploader()
+        response = await run_in_threadpool(uploader.upload, path, public_id=key, overwrite=True)
+        return response.get('secure_url')
+
+
+class LocalStorage(AvatarStorage):
+    """
+    Images copied into a local directory, for development and tests.
+    """
+    def __init__(self, directory=AVATAR_DIR, base_url=AVATAR_BASE_URL):
+        """
+        Initialize the LocalStorage instance.
+
+        :param directory: Directory the images are copied to.
+        :type directory: str
+        :param base_url: URL the directory is served under, file URLs if None.
+        :type base_url: str, optional
+        """
+        self.directory = Path(directory)
+        self.base_url = base_url
+
+    async def save(self, path, key):
+        target = self.directory / (key + Path(path).suffix)
+
+        def copy():
+            target.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(path, target)
+
+        await run_in_threadpool(copy)
+        if self.base_url:
+            return f'{self.base_url.rstrip("/")}/{target.relative_to(self.directory).as_posix()}'
+        return target.resolve().as_uri()
+
+
+STORAGES = {
+    'cloudinary': CloudinaryStorage,
+    'local': LocalStorage,
+}
+
+STORAGE = STORAGES[AVATAR_STORAGE]()
+
+
+def get_storage():
+    """
+    The avatar storage configured with ``AVATAR_STORAGE``.
+
+    :return: The storage.
+    :rtype: AvatarStorage
+    """
+    return STORAGE
@@ -9,6 +9,7 @@ import sys
 import os
 
 sys.path.append(os.path.abspath('..'))
+sys.path.append(os.path.abspath('../..'))
 project = 'contacts_api'
 copyright = '2024, AntonGPT'
 author = 'AntonGPT'
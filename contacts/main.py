@@ -1,31 +1,76 @@
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
-from api.contacts_items import router as contacts_router
-from api.users_items import router as user_router
-from models import contacts_model
-from dependencies.database import engine
-
-contacts_model.Base.metadata.create_all(bind=engine)
-
-app = FastAPI()
-
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["http://127.0.0.1:8000"],
-    allow_credentials=True,
-)
-
-app.include_router(contacts_router, prefix='/contacts')
-app.include_router(user_router, prefix="/users")
-
-
-@app.get('/')
-async def health_check():
-    """
-    function to check connection
-
-    :return: dict with message
-    :rtype: dict
-    """
-    print('or')
-    return {'status': 'OK'}
+from contextlib import asynccontextmanager
+
+from fastapi import Depends, FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+from contacts.api.contacts_items import router as contacts_router
+from contacts.api.users_items import router as user_router
+from contacts.dependencies.auth import get_current_user_email
+from contacts.dependencies.database import dispose_engines, pool_metrics
+from contacts.dependencies.emails import OUTBOX
+from contacts.services.avatars import AVATAR_JOBS, avatar_metrics
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Pick up unfinished avatar jobs on startup; on shutdown finish queued avatar jobs, deliver
+    queued emails and release the engine and replica pools.
+
+    The database schema is created and upgraded by the migrations (``alembic upgrade head``),
+    and the engine, Cloudinary and SMTP clients are created on first use, so starting a
+    worker does not wait on any of them.
+
+    :param app: The application instance.
+    :type app: FastAPI
+    """
+    await AVATAR_JOBS.recover()
+    yield
+    await AVATAR_JOBS.stop()
+    await OUTBOX.stop()
+    await dispose_engines()
+
+
+app = FastAPI(lifespan=lifespan)
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["http://127.0.0.1:8000"],
+    allow_credentials=True,
+)
+
+app.include_router(contacts_router, prefix='/contacts')
+app.include_router(user_router, prefix="/users")
+
+
+@app.get('/')
+async def health_check():
+    """
+    function to check connection
+
+    :return: dict with message
+    :rtype: dict
+    """
+    print('or')
+    return {'status': 'OK'}
+
+
+@app.get('/metrics/pool', dependencies=[Depends(get_current_user_email)])
+async def database_pool_metrics():
+    """
+    Connection pool gauges (size, checked out, overflow) and checkout wait times.
+
+    :return: dict with the metrics
+    :rtype: dict
+    """
+    return pool_metrics()
+
+
+@app.get('/metrics/avatars', dependencies=[Depends(get_current_user_email)])
+async def avatar_cache_metrics():
+    """
+    Thumbnail cache hits, misses and evictions, and avatars reused instead of stored again.
+
+    :return: dict with the metrics
+    :rtype: dict
+    """
+    return avatar_metrics()
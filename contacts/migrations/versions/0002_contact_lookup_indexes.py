@@ -0,0 +1,37 @@
+"""composite indexes for per-user contact lookups
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 10:05:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, Sequence[str], None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = {
+    'ix_contacts_user_email_id': ['user_email', 'id'],
+    'ix_contacts_user_email_first_name': ['user_email', 'first_name'],
+    'ix_contacts_user_email_last_name': ['user_email', 'last_name'],
+    'ix_contacts_user_email_email': ['user_email', 'email'],
+    'ix_contacts_user_email_birthday': ['user_email', 'birthday'],
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for name, columns in INDEXES.items():
+        op.create_index(name, 'contacts', columns)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for name in INDEXES:
+        op.drop_index(name, table_name='contacts')
@@ -0,0 +1,41 @@
+"""recurring birthday key for upcoming-birthday lookups
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 10:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, Sequence[str], None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL = {
+    'postgresql': "UPDATE contacts SET birthday_md = EXTRACT(MONTH FROM birthday) * 100 + EXTRACT(DAY FROM birthday) "
+                  "WHERE birthday IS NOT NULL",
+    'sqlite': "UPDATE contacts SET birthday_md = CAST(strftime('%m%d', birthday) AS INTEGER) "
+              "WHERE birthday IS NOT NULL",
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('contacts', sa.Column('birthday_md', sa.SmallInteger(), nullable=True))
+    op.execute(BACKFILL[op.get_bind().dialect.name])
+    op.create_index('ix_contacts_user_email_birthday_md', 'contacts', ['user_email', 'birthday_md'])
+    op.drop_index('ix_contacts_user_email_birthday', table_name='contacts')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index('ix_contacts_user_email_birthday', 'contacts', ['user_email', 'birthday'])
+    op.drop_index('ix_contacts_user_email_birthday_md', table_name='contacts')
+    with op.batch_alter_table('contacts') as batch_op:
+        batch_op.drop_column('birthday_md')
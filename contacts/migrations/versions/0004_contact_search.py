@@ -0,0 +1,66 @@
+"""trigram search over contact names, email and phone
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 12:40:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, Sequence[str], None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SEARCH_DOCUMENT = ("coalesce(first_name, '') || ' ' || coalesce(last_name, '') || ' ' || coalesce(email, '') "
+                   "|| ' ' || coalesce(phone_number, '')")
+
+UPGRADE = {
+    'postgresql': [
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+        f"CREATE INDEX ix_contacts_search_trgm ON contacts USING gin (({SEARCH_DOCUMENT}) gin_trgm_ops)",
+    ],
+    'sqlite': [
+        "CREATE VIRTUAL TABLE contacts_fts USING fts5(first_name, last_name, email, phone_number, "
+        "content='contacts', content_rowid='id', tokenize='trigram')",
+        "CREATE TRIGGER contacts_fts_insert AFTER INSERT ON contacts BEGIN "
+        "INSERT INTO contacts_fts(rowid, first_name, last_name, email, phone_number) "
+        "VALUES (new.id, new.first_name, new.last_name, new.email, new.phone_number); END",
+        "CREATE TRIGGER contacts_fts_delete AFTER DELETE ON contacts BEGIN "
+        "INSERT INTO contacts_fts(contacts_fts, rowid, first_name, last_name, email, phone_number) "
+        "VALUES ('delete', old.id, old.first_name, old.last_name, old.email, old.phone_number); END",
+        "CREATE TRIGGER contacts_fts_update AFTER UPDATE OF first_name, last_name, email, phone_number "
+        "ON contacts BEGIN "
+        "INSERT INTO contacts_fts(contacts_fts, rowid, first_name, last_name, email, phone_number) "
+        "VALUES ('delete', old.id, old.first_name, old.last_name, old.email, old.phone_number); "
+        "INSERT INTO contacts_fts(rowid, first_name, last_name, email, phone_number) "
+        "VALUES (new.id, new.first_name, new.last_name, new.email, new.phone_number); END",
+        "INSERT INTO contacts_fts(contacts_fts) VALUES ('rebuild')",
+    ],
+}
+
+DOWNGRADE = {
+    'postgresql': ["DROP INDEX ix_contacts_search_trgm"],
+    'sqlite': [
+        "DROP TRIGGER contacts_fts_insert",
+        "DROP TRIGGER contacts_fts_delete",
+        "DROP TRIGGER contacts_fts_update",
+        "DROP TABLE contacts_fts",
+    ],
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for statement in UPGRADE[op.get_bind().dialect.name]:
+        op.execute(statement)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for statement in DOWNGRADE[op.get_bind().dialect.name]:
+        op.execute(statement)
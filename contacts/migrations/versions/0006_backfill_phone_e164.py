@@ -0,0 +1,55 @@
+"""backfill phone_e164 of existing contacts
+
+Runs in batches of BATCH_SIZE rows, each committed on its own, so a large table is
+never locked for long. Only rows without phone_e164 are touched, so if the
+migration is interrupted, running it again picks up where it stopped.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17 14:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from contacts.schemas.phone import normalize_phone
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0006'
+down_revision: Union[str, Sequence[str], None] = '0005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 5000
+
+contacts = sa.table('contacts', sa.column('id', sa.Integer), sa.column('phone_number', sa.String),
+                    sa.column('phone_e164', sa.String))
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    last_id = 0
+    with op.get_context().autocommit_block():
+        while True:
+            rows = bind.execute(
+                sa.select(contacts.c.id, contacts.c.phone_number)
+                .where(contacts.c.id > last_id, contacts.c.phone_e164.is_(None))
+                .order_by(contacts.c.id).limit(BATCH_SIZE)
+            ).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+            values = [{'contact_id': row.id, 'phone_e164': normalize_phone(row.phone_number)} for row in rows]
+            values = [value for value in values if value['phone_e164'] is not None]
+            if values:
+                bind.execute(contacts.update().where(contacts.c.id == sa.bindparam('contact_id'))
+                             .values(phone_e164=sa.bindparam('phone_e164')), values)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute(contacts.update().values(phone_e164=None))
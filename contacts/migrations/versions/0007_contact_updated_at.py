@@ -0,0 +1,32 @@
+"""modification time of contacts for ETags
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17 15:20:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0007'
+down_revision: Union[str, Sequence[str], None] = '0006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('contacts', sa.Column('updated_at', sa.DateTime(), nullable=True))
+    op.execute(sa.text("UPDATE contacts SET updated_at = CURRENT_TIMESTAMP"))
+    op.create_index('ix_contacts_user_email_updated_at', 'contacts', ['user_email', 'updated_at'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_contacts_user_email_updated_at', table_name='contacts')
+    with op.batch_alter_table('contacts') as batch_op:
+        batch_op.drop_column('updated_at')
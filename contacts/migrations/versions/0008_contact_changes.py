@@ -0,0 +1,46 @@
+"""per-user change log of contacts for delta sync
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-17 16:40:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0008'
+down_revision: Union[str, Sequence[str], None] = '0007'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'contact_changes',
+        sa.Column('user_email', sa.String(), nullable=False),
+        sa.Column('seq', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('contact_id', sa.Integer(), nullable=False),
+        sa.Column('op', sa.String(length=6), nullable=False),
+        sa.Column('changed_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['user_email'], ['users.email'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_email', 'seq'),
+    )
+    op.create_table(
+        'contact_sync',
+        sa.Column('user_email', sa.String(), nullable=False),
+        sa.Column('last_seq', sa.Integer(), nullable=False),
+        sa.Column('compacted_seq', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['user_email'], ['users.email'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_email'),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('contact_sync')
+    op.drop_table('contact_changes')
@@ -0,0 +1,43 @@
+"""background jobs of avatar uploads
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-17 19:20:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0009'
+down_revision: Union[str, Sequence[str], None] = '0008'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'avatar_jobs',
+        sa.Column('id', sa.String(length=32), nullable=False),
+        sa.Column('user_email', sa.String(), nullable=False),
+        sa.Column('status', sa.String(length=8), nullable=False),
+        sa.Column('path', sa.String(), nullable=False),
+        sa.Column('filename', sa.String(), nullable=True),
+        sa.Column('result', sa.String(), nullable=True),
+        sa.Column('error', sa.String(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['user_email'], ['users.email'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_avatar_jobs_status_updated_at', 'avatar_jobs', ['status', 'updated_at'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_avatar_jobs_status_updated_at', table_name='avatar_jobs')
+    op.drop_table('avatar_jobs')
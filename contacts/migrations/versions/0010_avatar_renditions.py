@@ -0,0 +1,38 @@
+"""content-addressed index of stored avatars
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-17 21:05:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0010'
+down_revision: Union[str, Sequence[str], None] = '0009'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'avatar_renditions',
+        sa.Column('digest', sa.String(length=64), nullable=False),
+        sa.Column('size', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('url', sa.String(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('digest', 'size'),
+    )
+    op.add_column('avatar_jobs', sa.Column('digest', sa.String(length=64), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('avatar_jobs') as batch_op:
+        batch_op.drop_column('digest')
+    op.drop_table('avatar_renditions')
@@ -0,0 +1,42 @@
+import datetime
+
+from sqlalchemy import Column, String, Integer, DateTime, Index
+from sqlalchemy.sql.schema import ForeignKey
+
+from .base import Base
+
+
+class AvatarJobModel(Base):
+    """
+    An avatar upload waiting to be processed, being processed or finished, kept so its
+    status can be polled and unfinished jobs are picked up again after a restart.
+    """
+    __tablename__ = 'avatar_jobs'
+
+    id = Column(String(32), primary_key=True)
+    user_email = Column(ForeignKey('users.email', ondelete='CASCADE'), nullable=False)
+    status = Column(String(8), nullable=False)
+    path = Column(String, nullable=False)
+    filename = Column(String, nullable=True)
+    digest = Column(String(64), nullable=True)
+    result = Column(String, nullable=True)
+    error = Column(String, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.datetime.utcnow)
+    updated_at = Column(DateTime, nullable=False, default=datetime.datetime.utcnow)
+
+    __table_args__ = (
+        Index('ix_avatar_jobs_status_updated_at', 'status', 'updated_at'),
+    )
+
+
+class AvatarRenditionModel(Base):
+    """
+    A stored avatar of an image, found by the SHA-256 of the uploaded bytes, so an image
+    uploaded again, by anyone, reuses what was stored for it before.
+    """
+    __tablename__ = 'avatar_renditions'
+
+    digest = Column(String(64), primary_key=True)
+    size = Column(Integer, primary_key=True, autoincrement=False)
+    url = Column(String, nullable=False)
+    created_at = Column(DateTime, nullable=False, default=datetime.datetime.utcnow)
@@ -1,8 +1,8 @@
-from contacts.dependencies.database import Base
-from sqlalchemy import Column, Integer
-
-
-class BaseModel(Base):
-    __abstract__ = True
-
-    id = Column(Integer, primary_key=True, index=True)
+from contacts.dependencies.database import Base
+from sqlalchemy import Column, Integer
+
+
+class BaseModel(Base):
+    __abstract__ = True
+
+    id = Column(Integer, primary_key=True, index=True)
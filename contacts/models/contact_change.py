@@ -0,0 +1,32 @@
+import datetime
+
+from sqlalchemy import Column, String, Integer, DateTime
+from sqlalchemy.sql.schema import ForeignKey
+
+from .base import Base
+
+
+class ContactChangeModel(Base):
+    """
+    One entry of the change log of a user's contacts: a contact was inserted, updated or
+    deleted. Entries are numbered per user in the order their transactions commit.
+    """
+    __tablename__ = 'contact_changes'
+
+    user_email = Column(ForeignKey('users.email', ondelete='CASCADE'), primary_key=True)
+    seq = Column(Integer, primary_key=True, autoincrement=False)
+    contact_id = Column(Integer, nullable=False)
+    op = Column(String(6), nullable=False)
+    changed_at = Column(DateTime, nullable=False, default=datetime.datetime.utcnow)
+
+
+class ContactSyncModel(Base):
+    """
+    Change log state of a user: the last sequence number handed out and the last one
+    dropped by compaction.
+    """
+    __tablename__ = 'contact_sync'
+
+    user_email = Column(ForeignKey('users.email', ondelete='CASCADE'), primary_key=True)
+    last_seq = Column(Integer, nullable=False, default=0)
+    compacted_seq = Column(Integer, nullable=False, default=0)
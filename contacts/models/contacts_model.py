@@ -1,18 +1,101 @@
-from sqlalchemy import Column, String, Date, Boolean
-from .base import BaseModel, Base
-from sqlalchemy.sql.schema import ForeignKey
-from sqlalchemy.orm import relationship
-from .user import UserModel
-
-
-class ContactModel(BaseModel):
-    __tablename__ = 'contacts'
-
-    first_name = Column(String, nullable=False)
-    last_name = Column(String, nullable=False)
-    email = Column(String)
-    phone_number = Column(String, nullable=False)
-    birthday = Column(Date)
-    favorite = Column(Boolean, default=False)
-    user_email = Column('user_email', ForeignKey('users.email', ondelete='CASCADE'), default=None)
-    user = relationship('UserModel', backref="contacts")
+import datetime
+
+from sqlalchemy import Column, String, Date, DateTime, Boolean, Index, SmallInteger, DDL, event, func, literal
+from .base import BaseModel, Base
+from sqlalchemy.sql.schema import ForeignKey
+from sqlalchemy.orm import relationship, validates
+from .user import UserModel
+
+
+def birthday_key(birthday):
+    """
+    Turn a date into its recurring month-day key, e.g. 14 February -> 214.
+
+    The key orders the same way as the calendar within a year, so an upcoming
+    birthdays window becomes a range over an index on this key.
+
+    :param birthday: The date to convert.
+    :type birthday: date | None
+    :return: ``month * 100 + day`` or None.
+    :rtype: int | None
+    """
+    if birthday is None:
+        return None
+    return birthday.month * 100 + birthday.day
+
+
+class ContactModel(BaseModel):
+    __tablename__ = 'contacts'
+    __table_args__ = (
+        Index('ix_contacts_user_email_id', 'user_email', 'id'),
+        Index('ix_contacts_user_email_first_name', 'user_email', 'first_name'),
+        Index('ix_contacts_user_email_last_name', 'user_email', 'last_name'),
+        Index('ix_contacts_user_email_email', 'user_email', 'email'),
+        Index('ix_contacts_user_email_birthday_md', 'user_email', 'birthday_md'),
+        Index('ix_contacts_user_email_phone_e164', 'user_email', 'phone_e164'),
+        Index('ix_contacts_user_email_updated_at', 'user_email', 'updated_at'),
+    )
+
+    first_name = Column(String, nullable=False)
+    last_name = Column(String, nullable=False)
+    email = Column(String)
+    phone_number = Column(String, nullable=False)
+    phone_e164 = Column(String)
+    birthday = Column(Date)
+    birthday_md = Column(SmallInteger)
+    favorite = Column(Boolean, default=False)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+    user_email = Column('user_email', ForeignKey('users.email', ondelete='CASCADE'), default=None)
+    user = relationship('UserModel', backref="contacts")
+
+    @validates('birthday')
+    def _set_birthday_md(self, key, birthday):
+        self.birthday_md = birthday_key(birthday)
+        return birthday
+
+
+def search_document(contact=ContactModel):
+    """
+    The text searched by ``q=``: names, email and phone joined by spaces.
+
+    Literals are rendered inline so that queries match the expression of the trigram
+    index on PostgreSQL even when they are sent as prepared statements.
+
+    :param contact: The contacts entity or an alias of it.
+    :type contact: type[ContactModel]
+    :return: SQL expression of the document.
+    :rtype: ColumnElement[str]
+    """
+    space = literal(' ', literal_execute=True)
+    empty = literal('', literal_execute=True)
+    return (func.coalesce(contact.first_name, empty) + space + func.coalesce(contact.last_name, empty) + space
+            + func.coalesce(contact.email, empty) + space + func.coalesce(contact.phone_number, empty))
+
+
+Index('ix_contacts_search_trgm', search_document().label('search_document'), postgresql_using='gin',
+      postgresql_ops={'search_document': 'gin_trgm_ops'}).ddl_if(dialect='postgresql')
+
+event.listen(ContactModel.__table__, 'before_create',
+             DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(dialect='postgresql'))
+
+# SQLite has no trigram indexes, an external content FTS5 table kept in sync by triggers stands in for one
+SQLITE_FTS_DDL = [
+    "CREATE VIRTUAL TABLE contacts_fts USING fts5(first_name, last_name, email, phone_number, "
+    "content='contacts', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER contacts_fts_insert AFTER INSERT ON contacts BEGIN "
+    "INSERT INTO contacts_fts(rowid, first_name, last_name, email, phone_number) "
+    "VALUES (new.id, new.first_name, new.last_name, new.email, new.phone_number); END",
+    "CREATE TRIGGER contacts_fts_delete AFTER DELETE ON contacts BEGIN "
+    "INSERT INTO contacts_fts(contacts_fts, rowid, first_name, last_name, email, phone_number) "
+    "VALUES ('delete', old.id, old.first_name, old.last_name, old.email, old.phone_number); END",
+    "CREATE TRIGGER contacts_fts_update AFTER UPDATE OF first_name, last_name, email, phone_number ON contacts BEGIN "
+    "INSERT INTO contacts_fts(contacts_fts, rowid, first_name, last_name, email, phone_number) "
+    "VALUES ('delete', old.id, old.first_name, old.last_name, old.email, old.phone_number); "
+    "INSERT INTO contacts_fts(rowid, first_name, last_name, email, phone_number) "
+    "VALUES (new.id, new.first_name, new.last_name, new.email, new.phone_number); END",
+]
+
+for statement in SQLITE_FTS_DDL:
+    event.listen(ContactModel.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+event.listen(ContactModel.__table__, 'after_drop',
+             DDL('DROP TABLE IF EXISTS contacts_fts').execute_if(dialect='sqlite'))
@@ -1,15 +1,15 @@
-from sqlalchemy import Column, String, Boolean
-
-from .base import BaseModel, Base
-
-
-class UserModel(BaseModel):
-    __tablename__ = "users"
-    
-    email = Column(String)
-    password = Column(String)
-    salt = Column(String)
-    refresh_token = Column(String(255), nullable=True)
-    is_active = Column(Boolean, default=False)
-    otp = Column(String)
-    image = Column(String)
+from sqlalchemy import Column, String, Boolean
+
+from .base import BaseModel, Base
+
+
+class UserModel(BaseModel):
+    __tablename__ = "users"
+    
+    email = Column(String, unique=True, index=True)
+    password = Column(String)
+    salt = Column(String)
+    refresh_token = Column(String(255), nullable=True)
+    is_active = Column(Boolean, default=False)
+    otp = Column(String)
+    image = Column(String)
@@ -0,0 +1,52 @@
+from sqlalchemy import select
+from sqlalchemy.dialects import sqlite
+
+from contacts.models.avatar_job import AvatarRenditionModel
+from contacts.repository.contacts_repo import UPSERTS
+
+
+class AvatarsRepo:
+    """
+    A repository of the stored avatars of images, by content hash.
+
+    :param db: A database session.
+    :type db: sqlalchemy.ext.asyncio.AsyncSession
+    """
+    def __init__(self, db) -> None:
+        """
+        Initialize the AvatarsRepo instance.
+
+        :param db: A database session.
+        :type db: sqlalchemy.ext.asyncio.AsyncSession
+        """
+        self.db = db
+
+    async def get_renditions(self, digest):
+        """
+        Get the stored avatars of an image.
+
+        :param digest: SHA-256 of the image bytes, hex encoded.
+        :type digest: str
+        :return: URLs of the avatars by size.
+        :rtype: dict[int, str]
+        """
+        rows = await self.db.execute(select(AvatarRenditionModel.size, AvatarRenditionModel.url)
+                                     .where(AvatarRenditionModel.digest == digest))
+        return dict(rows.all())
+
+    async def add_renditions(self, digest, urls):
+        """
+        Record stored avatars of an image; ones recorded concurrently are kept.
+
+        :param digest: SHA-256 of the image bytes, hex encoded.
+        :type digest: str
+        :param urls: URLs of the avatars by size.
+        :type urls: dict[int, str]
+        """
+        if not urls:
+            return
+        upsert = UPSERTS.get(self.db.get_bind().dialect.name, sqlite.insert)
+        await self.db.execute(upsert(AvatarRenditionModel).on_conflict_do_nothing(), [
+            {'digest': digest, 'size': size, 'url': url} for size, url in urls.items()
+        ])
+        await self.db.commit()
@@ -1,160 +1,614 @@
-from datetime import date, timedelta
-
-from contacts.models.contacts_model import ContactModel
-
-
-class ContactsRepo():
-    """
-    A repository for managing user data.
-
-    :param db: A database session.
-    :type db: sqlalchemy.orm.session.Session
-    """
-
-    def __init__(self, db):
-        """
-        Initialize the UserRepo instance.
-
-        :param db: A database session.
-        :type db: sqlalchemy.orm.session.Session
-        """
-        self.db = db
-
-    async def get_all(self, user_email):
-        """
-        Retrieves a list of contacts for a specific user
-
-        :param user_email: users email
-        :type user_email: str
-        :return: A list of contacts
-        :rtype: List[ContactModel]
-        """
-        return self.db.query(ContactModel).filter(ContactModel.user_email == user_email).all()
-
-    async def create(self, contact_item, user_email):
-        """
-        Create a new contact for a specific user
-
-        :param contact_item: the data to create contact
-        :type contact_item: ContactCreate
-        :param user_email: users email
-        :type user_email: str
-        :return: created Contact
-        :rtype: ContactModel
-        """
-        new_contact = ContactModel(user_email=user_email, **contact_item.dict())
-        self.db.add(new_contact)
-        self.db.commit()
-        self.db.refresh(new_contact)
-        return new_contact
-
-    async def get_by_id(self, id, user_email):
-        """
-        Retrieves a single contact with specified id for a specific user
-
-        :param id: contacts id to retrieve
-        :type id: int
-        :param user_email: users email
-        :type user_email: str
-        :return: The contact with the specified ID, or None if it does not exist.
-        :rtype: ContactModel | None
-        """
-        return self.db.query(ContactModel).filter(ContactModel.id == id, ContactModel.user_email == user_email).first()
-
-    async def update(self, contact_item, id, user_email):
-        """
-        Update an existing contact with specified id for a specific user
-
-        :param contact_item: the data to update in contacts info
-        :type contact_item: ContactUpdate
-        :param id: contacts id
-        :type id: int
-        :param user_email: users email
-        :type user_email: str
-        :return: updated contact or None if it does not exist
-        :rtype: ContactModel | None
-        """
-        contact_for_update = self.db.query(ContactModel).filter(ContactModel.id == id,
-                                                                ContactModel.user_email == user_email).first()
-        if contact_for_update:
-            contact_item_data = contact_item.dict(exclude_unset=True)
-            for key, value in contact_item_data.items():
-                setattr(contact_for_update, key, value)
-            self.db.commit()
-            return contact_for_update
-
-    async def remove(self, id, user_email):
-        """
-        Delete a contact with specified id for a specific user
-
-        :param id: contacts id
-        :type id: int
-        :param user_email: users email
-        :type user_email: str
-        :return: deleted contact or None if it does not exist
-        :rtype: ContactModel | None
-        """
-        contact_to_delete = self.db.query(ContactModel).filter(ContactModel.id == id,
-                                                               ContactModel.user_email == user_email).first()
-        if contact_to_delete:
-            self.db.delete(contact_to_delete)
-            self.db.commit()
-        return contact_to_delete
-
-    async def get_by_first_name(self, first_name, user_email):
-        """
-        Retrieve a contact by first name for a specific user
-
-        :param first_name: contacts first name
-        :type first_name: str
-        :param user_email: users email
-        :type user_email: str
-        :return: a contact with specified first name or None if it does not exist
-        :rtype: ContactModel | None
-        """
-        return self.db.query(ContactModel).filter(ContactModel.first_name == first_name,
-                                                  ContactModel.user_email == user_email).first()
-
-    async def get_by_last_name(self, last_name, user_email):
-        """
-        Retrieve a contact by last name for a specific user
-
-        :param last_name: contacts last name
-        :type last_name: str
-        :param user_email: users email
-        :type user_email: str
-        :return: a contact with specified last name or None if it does not exist
-        :rtype: ContactModel | None
-        """
-        return self.db.query(ContactModel).filter(ContactModel.last_name == last_name,
-                                                  ContactModel.user_email == user_email).first()
-
-    async def get_by_email(self, email, user_email):
-        """
-        Retrieve a contact by email for a specific user
-
-        :param email: contacts email
-        :type email: str
-        :param user_email: users email
-        :type user_email: str
-        :return: a contact with specified email or None if it does not exist
-        :rtype: ContactModel | None
-        """
-        return self.db.query(ContactModel).filter(ContactModel.email == email,
-                                                  ContactModel.user_email == user_email).first()
-
-    async def contacts_birthdays_in_7_days(self, user_email):
-        """
-        Retrieves a contacts with birthday in next seven days
-
-        :param user_email: users email
-        :type user_email: str
-        :return: list of contacts with birthday in next seven days
-        :rtype: List[ContactModel]
-        """
-        end_date = date.today() + timedelta(days=7)
-
-        return self.db.query(ContactModel).filter(ContactModel.user_email == user_email,
-                                                  (ContactModel.birthday >= date.today()) &
-                                                  (ContactModel.birthday <= end_date)
-                                                  ).all()
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import select, case, insert, update, delete, func, table, column, literal_column, text
+from sqlalchemy.dialects import postgresql, sqlite
+
+from contacts.dependencies.contact_index import CONTACT_INDEX
+from contacts.dependencies.replicas import read_only, writes
+from contacts.dependencies.settings import get_settings
+from contacts.models.contact_change import ContactChangeModel, ContactSyncModel
+from contacts.models.contacts_model import ContactModel, birthday_key, search_document
+from contacts.schemas.phone import normalize_phone
+
+CONTACT_CHANGES_RETENTION_DAYS = get_settings().contact_changes_retention_days
+CONTACT_CHANGES_COMPACT_EVERY = get_settings().contact_changes_compact_every
+
+UPSERTS = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}
+
+# columns the database requires but ContactCreate lets through as None
+REQUIRED_COLUMNS = [column.name for column in ContactModel.__table__.columns
+                    if not column.nullable and not column.primary_key and column.default is None]
+
+
+def contact_values(contact_item, user_email):
+    """
+    Build the column values of a new contact for a Core insert, including the ones
+    the ORM would otherwise fill in.
+
+    :param contact_item: the data to create contact
+    :type contact_item: ContactCreate
+    :param user_email: users email
+    :type user_email: str
+    :return: column values
+    :rtype: dict
+    """
+    values = contact_item.dict()
+    values.update(birthday_md=birthday_key(values.get('birthday')),
+                  phone_e164=normalize_phone(values.get('phone_number')), favorite=False, user_email=user_email,
+                  updated_at=datetime.utcnow())
+    return values
+
+
+def update_values(contact_item):
+    """
+    Build the column values of a Core update from the fields set in the request.
+
+    :param contact_item: the data to update in contacts info
+    :type contact_item: ContactUpdate | ContactPatch
+    :return: column values
+    :rtype: dict
+    """
+    values = contact_item.dict(exclude_unset=True)
+    if 'birthday' in values:
+        # Core statements bypass the ORM validator that keeps birthday_md in sync
+        values['birthday_md'] = birthday_key(values['birthday'])
+    if 'phone_number' in values:
+        # the normalized number is derived, clients only ever set phone_number
+        values['phone_e164'] = normalize_phone(values['phone_number'])
+    return values
+
+
+CONTACTS_FTS = table('contacts_fts', column('rowid'), column('rank'))
+
+
+def like_pattern(q):
+    """
+    Build a LIKE pattern matching q anywhere, with the LIKE wildcards in q escaped.
+
+    :param q: search text
+    :type q: str
+    :return: the pattern, to be used with escape='\\'
+    :rtype: str
+    """
+    return '%' + q.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+
+class ContactsRepo():
+    """
+    A repository for managing user data.
+
+    :param db: A database session.
+    :type db: sqlalchemy.ext.asyncio.AsyncSession
+    """
+
+    def __init__(self, db):
+        """
+        Initialize the UserRepo instance.
+
+        :param db: A database session.
+        :type db: sqlalchemy.ext.asyncio.AsyncSession
+        """
+        self.db = db
+
+    @read_only
+    async def get_all(self, user_email, limit=None, after_id=None):
+        """
+        Retrieves a list of contacts for a specific user ordered by id.
+        Pages are keyed on the primary key, so every page is an index range scan
+        no matter how deep into the address book the client is.
+
+        :param user_email: users email
+        :type user_email: str
+        :param limit: maximum number of contacts to return, all of them if None
+        :type limit: int, optional
+        :param after_id: return only contacts with id greater than this one
+        :type after_id: int, optional
+        :return: A list of contacts
+        :rtype: List[ContactModel]
+        """
+        stmt = select(ContactModel).where(ContactModel.user_email == user_email).order_by(ContactModel.id)
+        if after_id is not None:
+            stmt = stmt.where(ContactModel.id > after_id)
+        if limit is not None:
+            stmt = stmt.limit(limit)
+        contacts = await self.db.scalars(stmt)
+        return contacts.all()
+
+    @read_only
+    async def get_version(self, user_email):
+        """
+        Number of contacts of a specific user and the time the latest of them was changed,
+        read from the (user_email, updated_at) index alone
+
+        :param user_email: users email
+        :type user_email: str
+        :return: count and latest modification time
+        :rtype: Tuple[int, datetime | None]
+        """
+        stmt = select(func.count(), func.max(ContactModel.updated_at)).where(ContactModel.user_email == user_email)
+        return (await self.db.execute(stmt)).one()
+
+    @read_only
+    async def stream_all(self, user_email, chunk_size=1000):
+        """
+        Stream all contacts for a specific user from a server-side cursor
+
+        :param user_email: users email
+        :type user_email: str
+        :param chunk_size: number of rows fetched from the cursor at a time
+        :type chunk_size: int
+        :return: async iterator over chunks of contacts
+        :rtype: AsyncIterator[List[ContactModel]]
+        """
+        stmt = (select(ContactModel).where(ContactModel.user_email == user_email).order_by(ContactModel.id)
+                .execution_options(yield_per=chunk_size))
+        contacts = await self.db.stream_scalars(stmt)
+        async for chunk in contacts.partitions():
+            yield chunk
+
+    @writes
+    async def create(self, contact_item, user_email):
+        """
+        Create a new contact for a specific user with one INSERT ... RETURNING
+
+        :param contact_item: the data to create contact
+        :type contact_item: ContactCreate
+        :param user_email: users email
+        :type user_email: str
+        :return: created Contact
+        :rtype: ContactModel
+        """
+        stmt = insert(ContactModel).values(**contact_values(contact_item, user_email)).returning(ContactModel)
+        new_contact = await self.db.scalar(stmt)
+        await self.log_changes(user_email, 'insert', [new_contact.id])
+        await self.db.commit()
+        CONTACT_INDEX.changed(user_email, new_contact)
+        return new_contact
+
+    @writes
+    async def bulk_create(self, contact_items, user_email):
+        """
+        Create a batch of contacts for a specific user in one transaction.
+        Rows are written with multi-row INSERT ... RETURNING, or with COPY on PostgreSQL
+        through asyncpg.
+        Items missing a value the database requires are skipped and reported.
+
+        :param contact_items: the data to create contacts
+        :type contact_items: List[ContactCreate]
+        :param user_email: users email
+        :type user_email: str
+        :return: number of created contacts and the indexes of the skipped items with their errors
+        :rtype: Tuple[int, Dict[int, List[dict]]]
+        """
+        rows, rejected = [], {}
+        for index, contact_item in enumerate(contact_items):
+            values = contact_values(contact_item, user_email)
+            missing = [name for name in REQUIRED_COLUMNS if values.get(name) is None]
+            if missing:
+                rejected[index] = [{'loc': [name], 'msg': 'Field required'} for name in missing]
+            else:
+                rows.append(values)
+        if not rows:
+            return 0, rejected
+        seq = await self.next_seq(user_email, len(rows))
+        if self.db.get_bind().dialect.driver == 'asyncpg':
+            ids = await self.copy_rows(rows)
+        else:
+            ids = (await self.db.scalars(insert(ContactModel).returning(ContactModel.id), rows)).all()
+        await self.add_changes(user_email, 'insert', sorted(ids), seq)
+        await self.db.commit()
+        CONTACT_INDEX.invalidate(user_email)
+        return len(rows), rejected
+
+    async def copy_rows(self, rows):
+        """
+        Write contact rows with COPY, into a temporary table first and from there into contacts
+        with INSERT ... SELECT ... RETURNING, which gives the ids of the new rows. The temporary
+        table is dropped on commit.
+
+        :param rows: column values of the new contacts, all with the same columns
+        :type rows: List[dict]
+        :return: ids of the new contacts
+        :rtype: List[int]
+        """
+        columns = list(rows[0])
+        quote = self.db.get_bind().dialect.identifier_preparer.quote
+        names = ', '.join(quote(name) for name in columns)
+        await self.db.execute(text(f'CREATE TEMPORARY TABLE contacts_import ON COMMIT DROP AS '
+                                   f'SELECT {names} FROM {ContactModel.__tablename__} WITH NO DATA'))
+        connection = await self.db.connection()
+        raw_connection = await connection.get_raw_connection()
+        await raw_connection.driver_connection.copy_records_to_table(
+            'contacts_import', columns=columns, records=[tuple(row.values()) for row in rows])
+        ids = await self.db.scalars(text(f'INSERT INTO {ContactModel.__tablename__} ({names}) '
+                                         f'SELECT {names} FROM contacts_import RETURNING id'))
+        return ids.all()
+
+    def filter_criteria(self, contact_filter, user_email):
+        """
+        Build the WHERE criteria of a batch operation, always scoped to the user.
+
+        :param contact_filter: which contacts to select
+        :type contact_filter: ContactFilter
+        :param user_email: users email
+        :type user_email: str
+        :return: criteria for the contacts table
+        :rtype: List[ColumnElement[bool]]
+        """
+        criteria = [ContactModel.user_email == user_email]
+        for name, value in contact_filter.dict(exclude_unset=True).items():
+            if name == 'ids':
+                criteria.append(ContactModel.id.in_(value or []))
+            else:
+                criteria.append(getattr(ContactModel, name) == value)
+        return criteria
+
+    @writes
+    async def batch_update(self, contact_filter, contact_patch, user_email):
+        """
+        Update all matching contacts of a specific user with one UPDATE ... RETURNING
+
+        :param contact_filter: which contacts to update
+        :type contact_filter: ContactFilter
+        :param contact_patch: the fields to change
+        :type contact_patch: ContactPatch
+        :param user_email: users email
+        :type user_email: str
+        :return: updated contacts
+        :rtype: List[ContactModel]
+        """
+        values = update_values(contact_patch)
+        if not values:
+            return await self.batch_select(contact_filter, user_email)
+        stmt = (update(ContactModel).where(*self.filter_criteria(contact_filter, user_email)).values(**values)
+                .returning(ContactModel).execution_options(synchronize_session=False, populate_existing=True))
+        contacts = (await self.db.scalars(stmt)).all()
+        await self.log_changes(user_email, 'update', [contact.id for contact in contacts])
+        await self.db.commit()
+        for contact in contacts:
+            CONTACT_INDEX.changed(user_email, contact)
+        return contacts
+
+    @writes
+    async def batch_remove(self, contact_filter, user_email):
+        """
+        Delete all matching contacts of a specific user with one DELETE ... RETURNING
+
+        :param contact_filter: which contacts to delete
+        :type contact_filter: ContactFilter
+        :param user_email: users email
+        :type user_email: str
+        :return: deleted contacts
+        :rtype: List[ContactModel]
+        """
+        stmt = (delete(ContactModel).where(*self.filter_criteria(contact_filter, user_email))
+                .returning(ContactModel).execution_options(synchronize_session=False))
+        contacts = (await self.db.scalars(stmt)).all()
+        await self.log_changes(user_email, 'delete', [contact.id for contact in contacts])
+        await self.db.commit()
+        for contact in contacts:
+            CONTACT_INDEX.removed(user_email, contact.id)
+        return contacts
+
+    async def batch_select(self, contact_filter, user_email):
+        """
+        Retrieves all matching contacts of a specific user
+
+        :param contact_filter: which contacts to select
+        :type contact_filter: ContactFilter
+        :param user_email: users email
+        :type user_email: str
+        :return: A list of contacts
+        :rtype: List[ContactModel]
+        """
+        stmt = select(ContactModel).where(*self.filter_criteria(contact_filter, user_email)).order_by(ContactModel.id)
+        contacts = await self.db.scalars(stmt)
+        return contacts.all()
+
+    @read_only
+    async def get_by_id(self, id, user_email):
+        """
+        Retrieves a single contact with specified id for a specific user
+
+        :param id: contacts id to retrieve
+        :type id: int
+        :param user_email: users email
+        :type user_email: str
+        :return: The contact with the specified ID, or None if it does not exist.
+        :rtype: ContactModel | None
+        """
+        return await self.db.scalar(select(ContactModel).where(ContactModel.id == id,
+                                                               ContactModel.user_email == user_email))
+
+    @writes
+    async def update(self, contact_item, id, user_email):
+        """
+        Update an existing contact with specified id for a specific user with one UPDATE ... RETURNING
+
+        :param contact_item: the data to update in contacts info
+        :type contact_item: ContactUpdate
+        :param id: contacts id
+        :type id: int
+        :param user_email: users email
+        :type user_email: str
+        :return: updated contact or None if it does not exist
+        :rtype: ContactModel | None
+        """
+        values = update_values(contact_item)
+        if not values:
+            return await self.get_by_id(id, user_email)
+        stmt = (update(ContactModel).where(ContactModel.id == id, ContactModel.user_email == user_email)
+                .values(**values).returning(ContactModel)
+                .execution_options(synchronize_session=False, populate_existing=True))
+        contact = await self.db.scalar(stmt)
+        if contact:
+            await self.log_changes(user_email, 'update', [id])
+        await self.db.commit()
+        if contact:
+            CONTACT_INDEX.changed(user_email, contact)
+        return contact
+
+    @writes
+    async def remove(self, id, user_email):
+        """
+        Delete a contact with specified id for a specific user with one DELETE ... RETURNING
+
+        :param id: contacts id
+        :type id: int
+        :param user_email: users email
+        :type user_email: str
+        :return: deleted contact or None if it does not exist
+        :rtype: ContactModel | None
+        """
+        stmt = (delete(ContactModel).where(ContactModel.id == id, ContactModel.user_email == user_email)
+                .returning(ContactModel).execution_options(synchronize_session=False))
+        contact = await self.db.scalar(stmt)
+        if contact:
+            await self.log_changes(user_email, 'delete', [id])
+        await self.db.commit()
+        if contact:
+            CONTACT_INDEX.removed(user_email, id)
+        return contact
+
+    async def next_seq(self, user_email, count=1):
+        """
+        Reserve change sequence numbers for a specific user with one upsert of their sync state.
+        The row stays locked until commit, so changes of a user commit in sequence order
+        and a reader never skips one that shows up later.
+
+        :param user_email: users email
+        :type user_email: str
+        :param count: number of sequence numbers to reserve
+        :type count: int
+        :return: the first reserved sequence number
+        :rtype: int
+        """
+        upsert = UPSERTS.get(self.db.get_bind().dialect.name, sqlite.insert)
+        stmt = upsert(ContactSyncModel).values(user_email=user_email, last_seq=count, compacted_seq=0)
+        stmt = stmt.on_conflict_do_update(index_elements=[ContactSyncModel.user_email],
+                                          set_={'last_seq': ContactSyncModel.last_seq + count})
+        last_seq = await self.db.scalar(stmt.returning(ContactSyncModel.last_seq))
+        if last_seq // CONTACT_CHANGES_COMPACT_EVERY != (last_seq - count) // CONTACT_CHANGES_COMPACT_EVERY:
+            await self.compact_changes(user_email)
+        return last_seq - count + 1
+
+    async def add_changes(self, user_email, op, contact_ids, seq):
+        """
+        Append entries to the change log of a specific user, numbered from seq on
+
+        :param user_email: users email
+        :type user_email: str
+        :param op: insert, update or delete
+        :type op: str
+        :param contact_ids: ids of the changed contacts
+        :type contact_ids: List[int]
+        :param seq: first sequence number, reserved with ``next_seq``
+        :type seq: int
+        """
+        if not contact_ids:
+            return
+        changed_at = datetime.utcnow()
+        await self.db.execute(insert(ContactChangeModel), [
+            {'user_email': user_email, 'seq': seq + n, 'contact_id': contact_id, 'op': op, 'changed_at': changed_at}
+            for n, contact_id in enumerate(contact_ids)
+        ])
+
+    async def log_changes(self, user_email, op, contact_ids):
+        """
+        Record changed contacts of a specific user in the change log, in the current transaction
+
+        :param user_email: users email
+        :type user_email: str
+        :param op: insert, update or delete
+        :type op: str
+        :param contact_ids: ids of the changed contacts
+        :type contact_ids: List[int]
+        """
+        if contact_ids:
+            await self.add_changes(user_email, op, contact_ids, await self.next_seq(user_email, len(contact_ids)))
+
+    async def compact_changes(self, user_email, before=None):
+        """
+        Drop the change log entries of a specific user older than the retention period.
+        Sync tokens from before the dropped entries are rejected afterwards.
+
+        :param user_email: users email
+        :type user_email: str
+        :param before: drop entries changed before this time, defaults to the retention period ago
+        :type before: datetime, optional
+        :return: number of dropped entries
+        :rtype: int
+        """
+        before = before or datetime.utcnow() - timedelta(days=CONTACT_CHANGES_RETENTION_DAYS)
+        horizon = await self.db.scalar(select(func.max(ContactChangeModel.seq)).where(
+            ContactChangeModel.user_email == user_email, ContactChangeModel.changed_at < before))
+        if horizon is None:
+            return 0
+        result = await self.db.execute(delete(ContactChangeModel).where(
+            ContactChangeModel.user_email == user_email, ContactChangeModel.seq <= horizon))
+        await self.db.execute(update(ContactSyncModel).where(ContactSyncModel.user_email == user_email)
+                              .values(compacted_seq=horizon).execution_options(synchronize_session=False))
+        return result.rowcount
+
+    async def get_sync_state(self, user_email):
+        """
+        Last sequence number of the change log of a specific user and the last one compacted away
+
+        :param user_email: users email
+        :type user_email: str
+        :return: last and compacted sequence numbers, both 0 before the first change
+        :rtype: Tuple[int, int]
+        """
+        state = (await self.db.execute(select(ContactSyncModel.last_seq, ContactSyncModel.compacted_seq)
+                                       .where(ContactSyncModel.user_email == user_email))).first()
+        return tuple(state) if state else (0, 0)
+
+    async def get_changes(self, user_email, since, limit=None):
+        """
+        Retrieves the change log entries of a specific user after a sequence number, oldest first
+
+        :param user_email: users email
+        :type user_email: str
+        :param since: return entries with a greater sequence number
+        :type since: int
+        :param limit: maximum number of entries to return, all of them if None
+        :type limit: int, optional
+        :return: A list of change log entries
+        :rtype: List[ContactChangeModel]
+        """
+        stmt = (select(ContactChangeModel).where(ContactChangeModel.user_email == user_email,
+                                                 ContactChangeModel.seq > since).order_by(ContactChangeModel.seq))
+        if limit is not None:
+            stmt = stmt.limit(limit)
+        changes = await self.db.scalars(stmt)
+        return changes.all()
+
+    @read_only
+    async def search(self, q, user_email, limit=50, offset=0):
+        """
+        Search contacts of a specific user by a substring of their name, email or phone.
+        On PostgreSQL the match uses the trigram index and results are ranked by similarity,
+        on SQLite it uses the FTS5 trigram table ranked by bm25. Queries shorter than a
+        trigram fall back to LIKE and are ordered by id.
+
+        :param q: search text
+        :type q: str
+        :param user_email: users email
+        :type user_email: str
+        :param limit: page size
+        :type limit: int
+        :param offset: number of results to skip
+        :type offset: int
+        :return: A list of contacts
+        :rtype: List[ContactModel]
+        """
+        dialect = self.db.get_bind().dialect.name
+        stmt = select(ContactModel).where(ContactModel.user_email == user_email)
+        if dialect == 'sqlite' and len(q) >= 3:
+            phrase = '"' + q.replace('"', '""') + '"'
+            stmt = (stmt.join(CONTACTS_FTS, CONTACTS_FTS.c.rowid == ContactModel.id)
+                    .where(literal_column('contacts_fts').op('MATCH')(phrase))
+                    .order_by(CONTACTS_FTS.c.rank, ContactModel.id))
+        else:
+            document = search_document()
+            stmt = stmt.where(document.ilike(like_pattern(q), escape='\\'))
+            if dialect == 'postgresql':
+                stmt = stmt.order_by(func.similarity(document, q).desc(), ContactModel.id)
+            else:
+                stmt = stmt.order_by(ContactModel.id)
+        contacts = await self.db.scalars(stmt.limit(limit).offset(offset))
+        return contacts.all()
+
+    @read_only
+    async def get_by_first_name(self, first_name, user_email):
+        """
+        Retrieve a contact by first name for a specific user
+
+        :param first_name: contacts first name
+        :type first_name: str
+        :param user_email: users email
+        :type user_email: str
+        :return: a contact with specified first name or None if it does not exist
+        :rtype: ContactModel | None
+        """
+        return await self.db.scalar(select(ContactModel).where(ContactModel.first_name == first_name,
+                                                               ContactModel.user_email == user_email).limit(1))
+
+    @read_only
+    async def get_by_last_name(self, last_name, user_email):
+        """
+        Retrieve a contact by last name for a specific user
+
+        :param last_name: contacts last name
+        :type last_name: str
+        :param user_email: users email
+        :type user_email: str
+        :return: a contact with specified last name or None if it does not exist
+        :rtype: ContactModel | None
+        """
+        return await self.db.scalar(select(ContactModel).where(ContactModel.last_name == last_name,
+                                                               ContactModel.user_email == user_email).limit(1))
+
+    @read_only
+    async def get_by_email(self, email, user_email):
+        """
+        Retrieve a contact by email for a specific user
+
+        :param email: contacts email
+        :type email: str
+        :param user_email: users email
+        :type user_email: str
+        :return: a contact with specified email or None if it does not exist
+        :rtype: ContactModel | None
+        """
+        return await self.db.scalar(select(ContactModel).where(ContactModel.email == email,
+                                                               ContactModel.user_email == user_email).limit(1))
+
+    @read_only
+    async def get_by_phone(self, phone_number, user_email):
+        """
+        Retrieves contacts with a phone number for a specific user. The number is compared
+        in E.164 form, so any way of writing it finds the same contacts.
+
+        :param phone_number: phone number in any format
+        :type phone_number: str
+        :param user_email: users email
+        :type user_email: str
+        :return: A list of contacts, empty if the number cannot be normalized
+        :rtype: List[ContactModel]
+        """
+        phone_e164 = normalize_phone(phone_number)
+        if phone_e164 is None:
+            return []
+        contacts = await self.db.scalars(select(ContactModel).where(
+            ContactModel.user_email == user_email, ContactModel.phone_e164 == phone_e164).order_by(ContactModel.id))
+        return contacts.all()
+
+    @read_only
+    async def contacts_birthdays_in_7_days(self, user_email, days=7):
+        """
+        Retrieves contacts whose birthday falls within the next ``days`` days, soonest first.
+        Birthdays are matched on the indexed month-day key, so a window crossing
+        the new year turns into two ranges on the same index instead of a scan.
+
+        :param user_email: users email
+        :type user_email: str
+        :param days: size of the window, today included
+        :type days: int
+        :return: list of contacts with birthday in the window
+        :rtype: List[ContactModel]
+        """
+        today = date.today()
+        start = birthday_key(today)
+        end = birthday_key(today + timedelta(days=days))
+        if days >= 365:
+            in_window = ContactModel.birthday_md.is_not(None)
+        elif start <= end:
+            in_window = ContactModel.birthday_md.between(start, end)
+        else:
+            in_window = (ContactModel.birthday_md >= start) | (ContactModel.birthday_md <= end)
+
+        stmt = (select(ContactModel).where(ContactModel.user_email == user_email, in_window)
+                .order_by(case((ContactModel.birthday_md >= start, 0), else_=1), ContactModel.birthday_md))
+        contacts = await self.db.scalars(stmt)
+        return contacts.all()
@@ -1,146 +1,188 @@
-import os
-import hashlib
-from contacts.models.user import UserModel
-from contacts.schemas.users_schema import User
-
-
-class UserRepo:
-    """
-    A repository for managing user data.
-
-    :param db: A database session.
-    :type db: sqlalchemy.orm.session.Session
-    """
-    def __init__(self, db) -> None:
-        """
-        Initialize the UserRepo instance.
-
-        :param db: A database session.
-        :type db: sqlalchemy.orm.session.Session
-        """
-        self.db = db
-
-    def create(self, user):
-        """
-        Create a new user in the database.
-
-        :param user: User data to create.
-        :type user: User
-        :return: The newly created user.
-        :rtype: UserModel
-        """
-        password, salt = self.hash_password(user.password)
-        new_user = UserModel(**user.dict())
-        new_user.password = password
-        new_user.salt = salt
-        self.db.add(new_user)
-        self.db.commit()
-        self.db.refresh(new_user)
-        return new_user
-
-    def activate_user(self, email):
-        """
-        Activate a user account.
-
-        :param email: The email of the user to activate.
-        :type email: str
-        """
-        user = self.get_by_email(email)
-        user.confirmed = True
-        self.db.commit()
-
-    def generate_salt(self):
-        """
-        Generate a random salt.
-
-        :return: The generated salt.
-        :rtype: bytes
-        """
-        return os.urandom(16)
-
-    def hash_password(self, password, salt=None):
-        """
-        Hash a password with optional salt.
-
-        :param password: The password to hash.
-        :type password: str
-        :param salt: Optional salt value.
-        :type salt: bytes, optional
-        :return: The hashed password and the salt.
-        :rtype: tuple[str, str]
-        """
-        if salt is None:
-            salt = self.generate_salt()
-        else:
-            salt = salt
-        salted_password = password.encode() + salt
-        hashed_password = hashlib.sha256(salted_password).hexdigest()
-        return str(hashed_password), str(salt.hex())
-
-    def get_by_email(self, email):
-        """
-        Retrieve a user by email.
-
-        :param email: The email of the user to retrieve.
-        :type email: str
-        :return: The user object if found, else None.
-        :rtype: UserModel | None
-        """
-        return self.db.query(UserModel).filter(UserModel.email == email).first()
-
-    def verify_password(self, user_email, input_password):
-        """
-        Verify a user's password.
-
-        :param user_email: The email of the user.
-        :type user_email: str
-        :param input_password: The password to verify.
-        :type input_password: str
-        :return: True if the password is correct, False otherwise.
-        :rtype: bool
-        """
-        user = self.get_by_email(user_email)
-        user_password = user.password
-        user_salt = user.salt
-        hashed_pass, _ = self.hash_password(password=input_password, salt=user_salt)
-        return hashed_pass == user_password
-
-    def update_token(self, user_email, refresh_token):
-        """
-        Update the refresh token for a user.
-
-        :param user_email: The email of the user.
-        :type user_email: str
-        :param refresh_token: The new refresh token.
-        :type refresh_token: str
-        """
-        user = self.get_by_email(user_email)
-        user.refresh_token = refresh_token
-        self.db.commit()
-
-    def get_user_refresh_token(self, user: User):
-        """
-        Retrieve the refresh token for a user.
-
-        :param user: The user object.
-        :type user: User
-        :return: The refresh token.
-        :rtype: str
-        """
-        user_from_db = self.db.query(UserModel).filter(UserModel.email == user.email).first()
-        return user_from_db.refresh_token
-
-    def update_image(self, email, url):
-        """
-        Update the image URL for a user.
-
-        :param email: The email of the user.
-        :type email: str
-        :param url: The new image URL.
-        :type url: str
-        :return: The updated user object.
-        :rtype: UserModel
-        """
-        user_to_update = self.db.query(UserModel).filter(UserModel.email == email).first()
-        user_to_update.image = url
-        return user_to_update
+import os
+import hashlib
+import hmac
+
+from sqlalchemy import select
+
+from contacts.dependencies.cache import USER_CACHE, TOKEN_CACHE
+from contacts.dependencies.hashing import PASSWORD_HASH_ITERATIONS, run_in_hash_pool
+from contacts.models.user import UserModel
+from contacts.schemas.users_schema import User
+
+
+class UserRepo:
+    """
+    A repository for managing user data.
+
+    :param db: A database session.
+    :type db: sqlalchemy.ext.asyncio.AsyncSession
+    """
+    def __init__(self, db) -> None:
+        """
+        Initialize the UserRepo instance.
+
+        :param db: A database session.
+        :type db: sqlalchemy.ext.asyncio.AsyncSession
+        """
+        self.db = db
+
+    async def create(self, user):
+        """
+        Create a new user in the database.
+
+        :param user: User data to create.
+        :type user: User
+        :return: The newly created user.
+        :rtype: UserModel
+        """
+        password, salt = await run_in_hash_pool(self.hash_password, user.password)
+        new_user = UserModel(**user.dict())
+        new_user.password = password
+        new_user.salt = salt
+        self.db.add(new_user)
+        await self.db.commit()
+        await self.db.refresh(new_user)
+        return new_user
+
+    async def activate_user(self, email):
+        """
+        Activate a user account.
+
+        :param email: The email of the user to activate.
+        :type email: str
+        """
+        user = await self.get_by_email(email)
+        user.confirmed = True
+        await self.db.commit()
+        USER_CACHE.pop(email)
+
+    def generate_salt(self):
+        """
+        Generate a random salt.
+
+        :return: The generated salt.
+        :rtype: bytes
+        """
+        return os.urandom(16)
+
+    def hash_password(self, password, salt=None, iterations=None):
+        """
+        Hash a password with PBKDF2-SHA256 and optional salt.
+
+        :param password: The password to hash.
+        :type password: str
+        :param salt: Optional salt value, raw or hex encoded.
+        :type salt: bytes | str, optional
+        :param iterations: Number of PBKDF2 iterations, the configured cost if None.
+        :type iterations: int, optional
+        :return: The hashed password as ``pbkdf2_sha256$<iterations>$<hex digest>`` and the hex salt.
+        :rtype: tuple[str, str]
+        """
+        if salt is None:
+            salt = self.generate_salt()
+        elif isinstance(salt, str):
+            salt = bytes.fromhex(salt)
+        iterations = iterations or PASSWORD_HASH_ITERATIONS
+        hashed_password = hashlib.pbkdf2_hmac('sha256', password.encode(), salt, iterations)
+        return f'pbkdf2_sha256${iterations}${hashed_password.hex()}', str(salt.hex())
+
+    def check_password(self, password, hashed_password, salt):
+        """
+        Check a password against a stored hash.
+
+        Hashes without an algorithm prefix are legacy single-pass SHA-256 ones.
+
+        :param password: The password to check.
+        :type password: str
+        :param hashed_password: The stored hash.
+        :type hashed_password: str
+        :param salt: The stored hex salt.
+        :type salt: str
+        :return: Whether the password matches and whether the hash should be recomputed with the current cost.
+        :rtype: tuple[bool, bool]
+        """
+        if '$' not in hashed_password:
+            legacy_hash = hashlib.sha256(password.encode() + bytes.fromhex(salt)).hexdigest()
+            return hmac.compare_digest(legacy_hash, hashed_password), True
+        iterations = int(hashed_password.split('$')[1])
+        candidate, _ = self.hash_password(password, salt, iterations)
+        return hmac.compare_digest(candidate, hashed_password), iterations != PASSWORD_HASH_ITERATIONS
+
+    async def get_by_email(self, email):
+        """
+        Retrieve a user by email.
+
+        :param email: The email of the user to retrieve.
+        :type email: str
+        :return: The user object if found, else None.
+        :rtype: UserModel | None
+        """
+        return await self.db.scalar(select(UserModel).where(UserModel.email == email).limit(1))
+
+    async def verify_password(self, user_email, input_password):
+        """
+        Verify a user's password on the hashing pool.
+
+        A correct password stored with a legacy hash or an outdated cost is rehashed
+        with the current settings.
+
+        :param user_email: The email of the user.
+        :type user_email: str
+        :param input_password: The password to verify.
+        :type input_password: str
+        :return: True if the password is correct, False otherwise.
+        :rtype: bool
+        """
+        user = await self.get_by_email(user_email)
+        matches, needs_rehash = await run_in_hash_pool(self.check_password, input_password, user.password, user.salt)
+        if matches and needs_rehash:
+            user.password, user.salt = await run_in_hash_pool(self.hash_password, input_password)
+            await self.db.commit()
+            USER_CACHE.pop(user_email)
+        return matches
+
+    async def update_token(self, user_email, refresh_token):
+        """
+        Update the refresh token for a user.
+
+        :param user_email: The email of the user.
+        :type user_email: str
+        :param refresh_token: The new refresh token.
+        :type refresh_token: str
+        """
+        user = await self.get_by_email(user_email)
+        user.refresh_token = refresh_token
+        await self.db.commit()
+        USER_CACHE.pop(user_email)
+        # frees the cached access tokens of the user; they are still accepted until they expire,
+        # as access tokens are not revoked, only verified again on their next use
+        TOKEN_CACHE.pop_value(user_email)
+
+    async def get_user_refresh_token(self, user: User):
+        """
+        Retrieve the refresh token for a user.
+
+        :param user: The user object.
+        :type user: User
+        :return: The refresh token.
+        :rtype: str
+        """
+        user_from_db = await self.get_by_email(user.email)
+        return user_from_db.refresh_token
+
+    async def update_image(self, email, url):
+        """
+        Update the image URL for a user.
+
+        :param email: The email of the user.
+        :type email: str
+        :param url: The new image URL.
+        :type url: str
+        :return: The updated user object.
+        :rtype: UserModel
+        """
+        user_to_update = await self.get_by_email(email)
+        user_to_update.image = url
+        await self.db.commit()
+        USER_CACHE.pop(email)
+        return user_to_update
@@ -1,31 +1,100 @@
-from pydantic import BaseModel
-from datetime import date
-from typing import Optional
-
-
-class Contact(BaseModel):
-    id: int
-    first_name: str
-    last_name: str
-    email: Optional[str]
-    phone_number: str
-    birthday: Optional[date]
-    favorite: Optional[bool]
-
-    class Config:
-        from_attributes = True
-
-
-class ContactCreate(BaseModel):
-    first_name: str
-    last_name: str | None
-    phone_number: str | None
-
-
-class ContactUpdate(BaseModel):
-    first_name: str | None
-    last_name: str | None
-    email: str | None
-    phone_number: str | None
-    birthday: date | None
-    favorite: bool | None
+from pydantic import BaseModel, Field, model_validator
+from datetime import date
+from typing import Optional
+
+
+class Contact(BaseModel):
+    id: int
+    first_name: str
+    last_name: str
+    email: Optional[str]
+    phone_number: str
+    phone_e164: Optional[str] = None
+    birthday: Optional[date]
+    favorite: Optional[bool]
+
+    class Config:
+        from_attributes = True
+
+
+class ContactCreate(BaseModel):
+    first_name: str
+    last_name: str | None
+    phone_number: str | None
+    email: str | None = None
+    birthday: date | None = None
+
+
+class ContactUpdate(BaseModel):
+    first_name: str | None
+    last_name: str | None
+    email: str | None
+    phone_number: str | None
+    birthday: date | None
+    favorite: bool | None
+
+
+class ContactPatch(BaseModel):
+    """
+    Fields to change; fields left out stay as they are. Only optional fields can be set to null.
+    """
+    first_name: str | None = None
+    last_name: str | None = None
+    email: str | None = None
+    phone_number: str | None = None
+    birthday: date | None = None
+    favorite: bool | None = None
+
+    @model_validator(mode='after')
+    def reject_required_nulls(self):
+        nulls = [name for name in ('first_name', 'last_name', 'phone_number')
+                 if name in self.model_fields_set and getattr(self, name) is None]
+        if nulls:
+            raise ValueError(f"{', '.join(nulls)} cannot be null")
+        return self
+
+
+class ContactFilter(BaseModel):
+    """
+    Selects contacts by id and/or by exact field values; all given criteria must match.
+    """
+    ids: list[int] | None = Field(None, max_length=10000)
+    first_name: str | None = None
+    last_name: str | None = None
+    email: str | None = None
+    favorite: bool | None = None
+
+    @model_validator(mode='after')
+    def require_criteria(self):
+        if not self.model_fields_set:
+            raise ValueError('At least one filter criterion is required')
+        return self
+
+
+class ContactBatchUpdate(BaseModel):
+    where: ContactFilter
+    values: ContactPatch
+
+
+class ContactImportError(BaseModel):
+    row: int
+    errors: list[dict]
+
+
+class ContactImportResult(BaseModel):
+    format: str
+    inserted: int
+    errors: list[ContactImportError]
+
+
+class ContactChanges(BaseModel):
+    """
+    What changed in the contacts of a user since a sync token. ``contacts`` holds the
+    current version of the inserted and updated ones; pass ``token`` as ``since`` next time.
+    """
+    token: int
+    has_more: bool = False
+    inserted: list[int] = []
+    updated: list[int] = []
+    deleted: list[int] = []
+    contacts: list[Contact] = []
@@ -0,0 +1,38 @@
+from contacts.dependencies.settings import get_settings
+
+DEFAULT_COUNTRY_CODE = get_settings().default_country_code
+
+
+def normalize_phone(phone_number, country_code=DEFAULT_COUNTRY_CODE):
+    """
+    Normalize a phone number to E.164, e.g. "+380 (67) 123-45-67" and "0671234567" both
+    become "+380671234567".
+
+    Numbers with a leading ``+`` or ``00`` are taken as international. Numbers with a
+    leading trunk ``0`` or without the country code are taken as national numbers of
+    the default country.
+
+    :param phone_number: The phone number in any format.
+    :type phone_number: str | None
+    :param country_code: Country calling code for national numbers.
+    :type country_code: str
+    :return: The number in E.164 format, or None if it cannot be normalized.
+    :rtype: str | None
+    """
+    if not phone_number:
+        return None
+    phone_number = phone_number.strip()
+    digits = ''.join(char for char in phone_number if char.isdigit())
+    if phone_number.startswith('+'):
+        pass
+    elif digits.startswith('00'):
+        digits = digits[2:]
+    elif digits.startswith(country_code) and len(digits) > 10:
+        pass
+    elif digits.startswith('0'):
+        digits = country_code + digits[1:]
+    else:
+        digits = country_code + digits
+    if not 8 <= len(digits) <= 15 or digits.startswith('0'):
+        return None
+    return '+' + digits
@@ -0,0 +1,467 @@
+import asyncio
+import hashlib
+import importlib.util
+import os
+import tempfile
+from collections import Counter
+
+from fastapi.concurrency import run_in_threadpool
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+from contacts.dependencies.cache import DiskLRUCache
+from contacts.dependencies.database import new_session
+from contacts.dependencies.jobs import DatabaseJobStore, JobQueue, MemoryJobStore
+from contacts.dependencies.settings import get_settings
+from contacts.dependencies.storage import get_storage
+from contacts.repository.avatars_repo import AvatarsRepo
+from contacts.services.user_service import UserService
+
+# Pillow is imported by the workers that make the avatars only; without it avatars are stored as uploaded
+PILLOW = importlib.util.find_spec('PIL') is not None
+
+settings = get_settings()
+
+AVATAR_MAX_BYTES = settings.avatar_max_bytes
+AVATAR_MAX_PIXELS = settings.avatar_max_pixels
+AVATAR_SIZES = settings.avatar_sizes
+AVATAR_WORKERS = settings.avatar_workers
+AVATAR_SPOOL_DIR = settings.avatar_spool_dir
+AVATAR_JOB_STORE = settings.avatar_job_store
+AVATAR_JOB_WORKERS = settings.avatar_job_workers
+AVATAR_JOB_TTL = settings.avatar_job_ttl
+AVATAR_CACHE_DIR = settings.avatar_cache_dir
+AVATAR_CACHE_MAX_BYTES = settings.avatar_cache_max_bytes
+
+# room for the multipart boundaries and part headers around the image
+MULTIPART_OVERHEAD = 16 * 1024
+
+AVATAR_EXECUTOR = None
+THUMBNAILS = DiskLRUCache(AVATAR_CACHE_DIR, AVATAR_CACHE_MAX_BYTES)
+RENDITIONS = Counter(reused=0, stored=0)
+
+SIGNATURES = [
+    (b'\xff\xd8\xff', 'jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+]
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+class NotAnImage(ValueError):
+    pass
+
+
+def image_format(header):
+    """
+    Recognize an image by its first bytes.
+
+    :param header: At least the first 12 bytes of the file.
+    :type header: bytes
+    :return: jpeg, png, gif or webp, None for anything else.
+    :rtype: str | None
+    """
+    for signature, format in SIGNATURES:
+        if header.startswith(signature):
+            return format
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'webp'
+    return None
+
+
+class FilePart:
+    """
+    The bytes of one file field of a multipart/form-data body, read as the body arrives.
+    Other fields are skipped.
+    """
+    def __init__(self, content_type, stream, field='file'):
+        """
+        Initialize the FilePart instance.
+
+        :param content_type: The Content-Type header of the request.
+        :type content_type: str | None
+        :param stream: The body of the request.
+        :type stream: AsyncIterator[bytes]
+        :param field: Name of the file field.
+        :type field: str
+        :raises ValueError: If the body is not multipart/form-data.
+        """
+        media_type, params = parse_options_header(content_type or '')
+        if media_type != b'multipart/form-data' or not params.get(b'boundary'):
+            raise ValueError('Expected a multipart/form-data body')
+        self.stream = stream
+        self.field = field
+        self.filename = None
+        self.header_name = self.header_value = b''
+        self.disposition = b''
+        self.in_field = self.done = False
+        self.data = []
+        self.parser = MultipartParser(params[b'boundary'], {
+            'on_part_begin': self.on_part_begin,
+            'on_part_data': self.on_part_data,
+            'on_part_end': self.on_part_end,
+            'on_header_field': self.on_header_field,
+            'on_header_value': self.on_header_value,
+            'on_header_end': self.on_header_end,
+            'on_headers_finished': self.on_headers_finished,
+        })
+
+    def on_part_begin(self):
+        self.disposition = b''
+
+    def on_header_field(self, data, start, end):
+        self.header_name += data[start:end]
+
+    def on_header_value(self, data, start, end):
+        self.header_value += data[start:end]
+
+    def on_header_end(self):
+        if self.header_name.lower() == b'content-disposition':
+            self.disposition = self.header_value
+        self.header_name = self.header_value = b''
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self.disposition)
+        self.in_field = not self.done and options.get(b'name') == self.field.encode() and b'filename' in options
+        if self.in_field:
+            self.filename = options[b'filename'].decode('utf-8', 'replace')
+
+    def on_part_data(self, data, start, end):
+        if self.in_field:
+            self.data.append(data[start:end])
+
+    def on_part_end(self):
+        if self.in_field:
+            self.in_field, self.done = False, True
+
+    async def __aiter__(self):
+        async for chunk in self.stream:
+            self.parser.write(chunk)
+            if self.data:
+                data, self.data = b''.join(self.data), []
+                yield data
+        self.parser.finalize()
+
+
+class AvatarUpload:
+    """
+    An uploaded image spooled to a temporary file.
+    """
+    def __init__(self, path, filename, format, digest=None):
+        """
+        Initialize the AvatarUpload instance.
+
+        :param path: Path of the temporary file.
+        :type path: str
+        :param filename: Name of the file on the client.
+        :type filename: str | None
+        :param format: Format recognized from the first bytes.
+        :type format: str | None
+        :param digest: SHA-256 of the image, hex encoded.
+        :type digest: str, optional
+        """
+        self.path = path
+        self.filename = filename
+        self.format = format
+        self.digest = digest
+
+    def remove(self):
+        """
+        Delete the temporary file.
+        """
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+async def spool_image(chunks, max_bytes=AVATAR_MAX_BYTES):
+    """
+    Write an upload to a temporary file chunk by chunk, hashing it on the way. The image
+    header is checked as soon as the first bytes arrive and the size as it grows, so a bad
+    upload is cut off early.
+
+    :param chunks: The bytes of the image.
+    :type chunks: AsyncIterator[bytes]
+    :param max_bytes: Maximum size of the image.
+    :type max_bytes: int
+    :return: Path of the temporary file, the image format and the SHA-256 of the image.
+    :rtype: tuple[str, str, str]
+    :raises UploadTooLarge: If the image is larger than max_bytes.
+    :raises NotAnImage: If the file is not a JPEG, PNG, GIF or WebP image.
+    """
+    descriptor, path = tempfile.mkstemp(prefix='avatar-', dir=AVATAR_SPOOL_DIR)
+    size, header, format = 0, b'', None
+    digest = hashlib.sha256()
+    try:
+        with os.fdopen(descriptor, 'wb') as file:
+            async for chunk in chunks:
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge(f'The image is larger than {max_bytes} bytes')
+                if format is None:
+                    header += chunk[:12]
+                    if len(header) >= 12:
+                        format = image_format(header)
+                        if format is None:
+                            raise NotAnImage('Upload a JPEG, PNG, GIF or WebP image')
+                digest.update(chunk)
+                await run_in_threadpool(file.write, chunk)
+        if format is None:
+            format = image_format(header)
+            if format is None:
+                raise NotAnImage('Upload a JPEG, PNG, GIF or WebP image')
+    except BaseException:
+        os.remove(path)
+        raise
+    return path, format, digest.hexdigest()
+
+
+async def receive_avatar(content_type, stream, max_bytes=AVATAR_MAX_BYTES):
+    """
+    Receive the ``file`` field of a multipart upload into a temporary file as it arrives.
+
+    :param content_type: The Content-Type header of the request.
+    :type content_type: str | None
+    :param stream: The body of the request.
+    :type stream: AsyncIterator[bytes]
+    :param max_bytes: Maximum size of the image.
+    :type max_bytes: int
+    :return: The spooled upload; remove it when done.
+    :rtype: AvatarUpload
+    :raises UploadTooLarge: If the image is larger than max_bytes.
+    :raises NotAnImage: If the file is missing or not an image.
+    :raises ValueError: If the body is not multipart/form-data.
+    """
+    part = FilePart(content_type, stream)
+    path, format, digest = await spool_image(part, max_bytes=max_bytes)
+    return AvatarUpload(path, part.filename, format, digest)
+
+
+def make_avatars(path, sizes=tuple(AVATAR_SIZES), max_pixels=AVATAR_MAX_PIXELS):
+    """
+    Crop an image to squares of the given sizes and save them as JPEG next to it.
+    Runs in a worker process of the avatar executor.
+
+    :param path: Path of the uploaded image.
+    :type path: str
+    :param sizes: Edge lengths of the avatars.
+    :type sizes: Sequence[int]
+    :param max_pixels: Largest image accepted, against decompression bombs.
+    :type max_pixels: int
+    :return: Paths of the avatars by size; the original image under 0 without Pillow.
+    :rtype: list[tuple[int, str]]
+    :raises NotAnImage: If the image cannot be decoded.
+    """
+    if not PILLOW:
+        return [(0, path)]
+    from PIL import Image, ImageOps
+
+    avatars = []
+    try:
+        with Image.open(path) as image:
+            if image.width * image.height > max_pixels:
+                raise NotAnImage('The image has too many pixels')
+            # lets JPEG decode at a fraction of the resolution when the avatars are much smaller
+            image.draft('RGB', (max(sizes), max(sizes)))
+            image = ImageOps.exif_transpose(image)
+            if image.mode in ('RGBA', 'LA', 'P'):
+                image = image.convert('RGBA')
+                background = Image.new('RGBA', image.size, 'white')
+                image = Image.alpha_composite(background, image)
+            image = image.convert('RGB')
+            for size in sizes:
+                target = f'{path}_{size}.jpg'
+                ImageOps.fit(image, (size, size), Image.LANCZOS).save(target, 'JPEG', quality=85, optimize=True)
+                avatars.append((size, target))
+    except (OSError, SyntaxError, Image.DecompressionBombError):
+        for _, target in avatars:
+            os.remove(target)
+        raise NotAnImage('The image cannot be read')
+    return avatars
+
+
+def get_avatar_executor():
+    """
+    The process pool the avatars are made in, started on the first upload.
+
+    :return: The executor.
+    :rtype: ProcessPoolExecutor
+    """
+    global AVATAR_EXECUTOR
+    if AVATAR_EXECUTOR is None:
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        AVATAR_EXECUTOR = ProcessPoolExecutor(max_workers=AVATAR_WORKERS,
+                                              mp_context=multiprocessing.get_context('spawn'))
+    return AVATAR_EXECUTOR
+
+
+def avatar_sizes():
+    """
+    Sizes of the avatars made from an upload; 0 stands for the original image, stored as is
+    when Pillow is not installed.
+
+    :return: The sizes, the one used as the user's image first.
+    :rtype: list[int]
+    """
+    return AVATAR_SIZES if PILLOW else [0]
+
+
+def avatar_key(digest, size):
+    """
+    Storage key of an avatar, named after the content of the image so identical uploads share it.
+
+    :param digest: SHA-256 of the image, hex encoded.
+    :type digest: str
+    :param size: Edge length of the avatar, 0 for the original image.
+    :type size: int
+    :return: The key.
+    :rtype: str
+    """
+    return f'avatars/{digest}_{size or "original"}'
+
+
+def file_digest(path):
+    """
+    SHA-256 of a file, hex encoded.
+
+    :param path: Path of the file.
+    :type path: str
+    :return: The digest.
+    :rtype: str
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(64 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+async def render_avatars(upload, sizes, cache=THUMBNAILS):
+    """
+    Avatars of an upload from the thumbnail cache, the missing ones made in the process pool
+    and added to the cache.
+
+    :param upload: The spooled upload; its digest names the cached avatars.
+    :type upload: AvatarUpload
+    :param sizes: Sizes of the avatars.
+    :type sizes: Sequence[int]
+    :param cache: The thumbnail cache.
+    :type cache: DiskLRUCache
+    :return: Paths of the avatars by size, and the temporary files among them to delete.
+    :rtype: tuple[dict[int, str], list[str]]
+    :raises NotAnImage: If the upload cannot be decoded or its file is gone.
+    """
+    paths = {}
+    for size in sizes:
+        cached = await run_in_threadpool(cache.get, f'{upload.digest}_{size}.jpg')
+        if cached is not None:
+            paths[size] = cached
+    missing = tuple(size for size in sizes if size not in paths)
+    if not missing:
+        return paths, []
+    if not os.path.exists(upload.path):
+        raise NotAnImage('The uploaded file is gone, upload the image again')
+    loop = asyncio.get_running_loop()
+    made = await loop.run_in_executor(get_avatar_executor(), make_avatars, upload.path, missing)
+    temporary = [path for _, path in made if path != upload.path]
+    for size, path in made:
+        paths[size] = path
+        if path != upload.path:
+            await run_in_threadpool(cache.put, f'{upload.digest}_{size}.jpg', path)
+    return paths, temporary
+
+
+async def store_avatar(upload, storage, known=None, cache=THUMBNAILS):
+    """
+    Store the avatars of an upload, reusing the ones already stored for the same image.
+
+    :param upload: The spooled upload.
+    :type upload: AvatarUpload
+    :param storage: Where the avatars are stored.
+    :type storage: AvatarStorage
+    :param known: URLs of the avatars already stored for the image, by size.
+    :type known: dict[int, str], optional
+    :param cache: The thumbnail cache.
+    :type cache: DiskLRUCache
+    :return: URLs of all avatars by size.
+    :rtype: dict[int, str]
+    """
+    sizes = avatar_sizes()
+    urls = {size: known[size] for size in sizes if size in (known or {})}
+    RENDITIONS['reused'] += len(urls)
+    missing = [size for size in sizes if size not in urls]
+    if not missing:
+        return urls
+    paths, temporary = await render_avatars(upload, missing, cache)
+    try:
+        for size in missing:
+            urls[size] = await storage.save(paths[size], avatar_key(upload.digest, size))
+            RENDITIONS['stored'] += 1
+    finally:
+        for path in temporary:
+            os.remove(path)
+    return urls
+
+
+async def process_avatar(job, storage=None):
+    """
+    Run an avatar job: store the avatars of the upload, unless the same image was stored
+    before, and set the user's image.
+
+    :param job: The job of the upload.
+    :type job: Job
+    :param storage: Where the avatars are stored, the configured storage if None.
+    :type storage: AvatarStorage, optional
+    :return: URL of the user's new image.
+    :rtype: str
+    :raises NotAnImage: If the upload cannot be decoded or its file is gone.
+    """
+    digest = job.digest
+    if digest is None:
+        if not os.path.exists(job.path):
+            raise NotAnImage('The uploaded file is gone, upload the image again')
+        digest = await run_in_threadpool(file_digest, job.path)
+    async with new_session() as db:
+        known = await AvatarsRepo(db).get_renditions(digest)
+    upload = AvatarUpload(job.path, job.filename, None, digest)
+    urls = await store_avatar(upload, storage or get_storage(), known)
+    url = urls[avatar_sizes()[0]]
+    async with new_session() as db:
+        await AvatarsRepo(db).add_renditions(digest, {size: url for size, url in urls.items() if size not in known})
+        await UserService(db).set_image(job.user_email, url)
+    return url
+
+
+def avatar_metrics():
+    """
+    Counters of the thumbnail cache and of the avatars reused instead of stored again.
+
+    :return: dict with the metrics
+    :rtype: dict
+    """
+    return {'thumbnails': THUMBNAILS.snapshot(), 'renditions': dict(RENDITIONS)}
+
+
+def remove_upload(job):
+    """
+    Delete the spooled upload of a finished avatar job.
+
+    :param job: The job.
+    :type job: Job
+    """
+    AvatarUpload(job.path, job.filename, None, job.digest).remove()
+
+
+JOB_STORES = {
+    'memory': lambda: MemoryJobStore(ttl=AVATAR_JOB_TTL),
+    'database': lambda: DatabaseJobStore(new_session, ttl=AVATAR_JOB_TTL),
+}
+
+AVATAR_JOBS = JobQueue(process_avatar, JOB_STORES[AVATAR_JOB_STORE](), workers=AVATAR_JOB_WORKERS,
+                       cleanup=remove_upload)
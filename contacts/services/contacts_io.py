@@ -0,0 +1,346 @@
+import codecs
+import csv
+import io
+import json
+import re
+
+FORMATS = ('csv', 'json', 'ndjson')
+
+CONTENT_TYPES = {
+    'text/csv': 'csv',
+    'application/json': 'json',
+    'application/x-ndjson': 'ndjson',
+    'application/jsonl': 'ndjson',
+}
+
+
+def detect_format(content_type, first_chunk):
+    """
+    Pick the import format from the Content-Type header, or from the first bytes of the body.
+
+    :param content_type: The Content-Type header of the request.
+    :type content_type: str | None
+    :param first_chunk: The first bytes of the body.
+    :type first_chunk: bytes
+    :return: One of ``FORMATS``.
+    :rtype: str
+    """
+    media_type = (content_type or '').split(';')[0].strip().lower()
+    if media_type in CONTENT_TYPES:
+        return CONTENT_TYPES[media_type]
+    start = first_chunk.lstrip()[:1]
+    if start == b'[':
+        return 'json'
+    if start == b'{':
+        return 'ndjson'
+    return 'csv'
+
+
+async def iter_lines(chunks):
+    """
+    Decode a byte stream as UTF-8 and split it into lines, line endings included.
+
+    Lines end at ``\n`` only (a preceding ``\r`` stays with its line); other characters
+    ``str.splitlines`` breaks on, e.g. U+2028 or form feed, are valid inside values.
+
+    :param chunks: The body of the upload.
+    :type chunks: AsyncIterator[bytes]
+    :return: Async iterator over lines.
+    :rtype: AsyncIterator[str]
+    """
+    decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    buffer = ''
+    async for chunk in chunks:
+        buffer += decoder.decode(chunk)
+        start, end = 0, buffer.find('\n')
+        while end != -1:
+            yield buffer[start:end + 1]
+            start, end = end + 1, buffer.find('\n', end + 1)
+        buffer = buffer[start:]
+    buffer += decoder.decode(b'', final=True)
+    if buffer:
+        yield buffer
+
+
+async def parse_ndjson(chunks):
+    """
+    Parse newline delimited JSON into rows, skipping blank lines.
+
+    :param chunks: The body of the upload.
+    :type chunks: AsyncIterator[bytes]
+    :return: Async iterator over parsed values, or the ValueError for a malformed line.
+    :rtype: AsyncIterator[Any]
+    """
+    async for line in iter_lines(chunks):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            yield e
+
+
+JSON_LITERALS = ('true', 'false', 'null', 'NaN', 'Infinity', '-Infinity')
+PARTIAL_NUMBER = re.compile(r'-?[0-9]*\.?[0-9]*(?:[eE][-+]?[0-9]*)?')
+
+
+def is_truncated(buffer, error):
+    """
+    Tell whether a JSON decode error only comes from the buffer ending in the middle of a value.
+
+    :param buffer: The text that was decoded.
+    :type buffer: str
+    :param error: The decode error.
+    :type error: json.JSONDecodeError
+    :return: True if more data may complete the value.
+    :rtype: bool
+    """
+    rest = buffer[error.pos:]
+    if not rest.strip() or error.msg.startswith('Unterminated string'):
+        return True
+    if error.msg.startswith('Invalid \\uXXXX escape'):
+        return len(rest) < 6
+    return any(literal.startswith(rest) for literal in JSON_LITERALS) or bool(PARTIAL_NUMBER.fullmatch(rest))
+
+
+def skip_element(buffer, pos, state):
+    """
+    Skip a malformed array element up to the ``,`` or ``]`` that ends it, minding strings
+    and nesting.
+
+    :param buffer: The text.
+    :type buffer: str
+    :param pos: Where to continue skipping.
+    :type pos: int
+    :param state: Nesting depth, inside a string, after a backslash; updated in place so
+        skipping can go on in the next chunk.
+    :type state: list
+    :return: Position of the ending ``,`` or ``]``, None if the buffer ends first.
+    :rtype: int | None
+    """
+    depth, in_string, escaped = state
+    for pos in range(pos, len(buffer)):
+        char = buffer[pos]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in '[{':
+            depth += 1
+        elif char in ']}' and depth:
+            depth -= 1
+        elif char in ',]' and not depth:
+            return pos
+    state[:] = depth, in_string, escaped
+    return None
+
+
+async def parse_json_array(chunks):
+    """
+    Parse a JSON array one element at a time, without loading the whole document.
+    A malformed element is given as its ValueError and skipped.
+
+    :param chunks: The body of the upload.
+    :type chunks: AsyncIterator[bytes]
+    :return: Async iterator over array elements, or the ValueError for a malformed one.
+    :rtype: AsyncIterator[Any]
+    :raises ValueError: If the document is not a JSON array.
+    """
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder('utf-8-sig')()
+    buffer = ''
+    pos = 0
+    started = done = False
+    skipping = None
+    iterator = chunks.__aiter__()
+    while not done:
+        try:
+            buffer = buffer[pos:] + text.decode(await iterator.__anext__())
+        except StopAsyncIteration:
+            raise ValueError('Unexpected end of JSON array')
+        pos = 0
+        while True:
+            if skipping is not None:
+                end = skip_element(buffer, pos, skipping)
+                if end is None:
+                    pos = len(buffer)
+                    break
+                pos, skipping = end, None
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                if buffer[pos] == ',' and not started:
+                    raise ValueError('Expected a JSON array')
+                pos += 1
+            if pos == len(buffer):
+                break
+            if not started:
+                if buffer[pos] != '[':
+                    raise ValueError('Expected a JSON array')
+                started = True
+                pos += 1
+                continue
+            if buffer[pos] == ']':
+                done = True
+                break
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+            except ValueError as e:
+                if is_truncated(buffer, e):
+                    # the element is not complete yet, wait for more data
+                    break
+                skipping = [0, False, False]
+                yield e
+                continue
+            if end == len(buffer) and isinstance(value, (int, float)):
+                # a number may continue in the next chunk
+                break
+            pos = end
+            yield value
+
+
+async def parse_csv(chunks):
+    """
+    Parse CSV with a header row into dicts; empty cells become None.
+
+    Quoted values may span lines, so lines are collected until their quotes are balanced.
+
+    :param chunks: The body of the upload.
+    :type chunks: AsyncIterator[bytes]
+    :return: Async iterator over rows.
+    :rtype: AsyncIterator[dict]
+    """
+    header = None
+    record = ''
+    async for line in iter_lines(chunks):
+        record += line
+        if record.count('"') % 2:
+            continue
+        values, record = next(csv.reader([record]), []), ''
+        if not values:
+            continue
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+        yield {name: value or None for name, value in zip(header, values)}
+    if record:
+        values = next(csv.reader([record]), [])
+        if values and header is not None:
+            yield {name: value or None for name, value in zip(header, values)}
+
+
+PARSERS = {
+    'csv': parse_csv,
+    'json': parse_json_array,
+    'ndjson': parse_ndjson,
+}
+
+
+EXPORT_FIELDS = ['id', 'first_name', 'last_name', 'email', 'phone_number', 'birthday', 'favorite']
+
+
+def format_csv(contacts, header=False):
+    """
+    Format contacts as CSV rows that ``parse_csv`` reads back.
+
+    :param contacts: The contacts to format.
+    :type contacts: list[Contact]
+    :param header: Start with the header row.
+    :type header: bool
+    :return: CSV text.
+    :rtype: str
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(EXPORT_FIELDS)
+    for contact in contacts:
+        values = contact.model_dump(mode='json')
+        writer.writerow(['' if values[name] is None else str(values[name]).lower() if isinstance(values[name], bool)
+                         else values[name] for name in EXPORT_FIELDS])
+    return buffer.getvalue()
+
+
+def format_ndjson(contacts, header=False):
+    """
+    Format contacts as newline delimited JSON. U+2028 and U+2029 are escaped, so readers
+    that take them for line breaks still see one contact per line.
+
+    :param contacts: The contacts to format.
+    :type contacts: list[Contact]
+    :param header: Unused, NDJSON has no header.
+    :type header: bool
+    :return: NDJSON text.
+    :rtype: str
+    """
+    return ''.join(contact.model_dump_json().replace('\u2028', '\\u2028').replace('\u2029', '\\u2029') + '\n'
+                   for contact in contacts)
+
+
+def vcard_escape(value):
+    """
+    Escape a vCard property value.
+
+    :param value: The value.
+    :type value: Any
+    :return: The value with backslashes, commas, semicolons and newlines escaped.
+    :rtype: str
+    """
+    return str(value).replace('\\', '\\\\').replace(',', '\\,').replace(';', '\\;').replace('\n', '\\n')
+
+
+def vcard_fold(line):
+    """
+    Fold a content line longer than 75 octets as RFC 6350 requires.
+
+    :param line: The content line.
+    :type line: str
+    :return: The folded line with its CRLF.
+    :rtype: str
+    """
+    parts, current, size = [], '', 0
+    for char in line:
+        width = len(char.encode())
+        if size + width > 75:
+            parts.append(current)
+            current, size = ' ', 1
+        current += char
+        size += width
+    parts.append(current)
+    return '\r\n'.join(parts) + '\r\n'
+
+
+def format_vcf(contacts, header=False):
+    """
+    Format contacts as vCard 3.0 entries.
+
+    :param contacts: The contacts to format.
+    :type contacts: list[Contact]
+    :param header: Unused, vCard files have no header.
+    :type header: bool
+    :return: vCard text.
+    :rtype: str
+    """
+    lines = []
+    for contact in contacts:
+        first_name, last_name = vcard_escape(contact.first_name), vcard_escape(contact.last_name or '')
+        lines += ['BEGIN:VCARD', 'VERSION:3.0', f'N:{last_name};{first_name};;;',
+                  f'FN:{" ".join(name for name in (first_name, last_name) if name)}']
+        if contact.phone_number:
+            lines.append(f'TEL;TYPE=CELL:{vcard_escape(contact.phone_number)}')
+        if contact.email:
+            lines.append(f'EMAIL;TYPE=INTERNET:{vcard_escape(contact.email)}')
+        if contact.birthday:
+            lines.append(f'BDAY:{contact.birthday.isoformat()}')
+        lines.append('END:VCARD')
+    return ''.join(vcard_fold(line) for line in lines)
+
+
+EXPORTERS = {
+    'csv': ('text/csv', format_csv),
+    'ndjson': ('application/x-ndjson', format_ndjson),
+    'vcf': ('text/vcard', format_vcf),
+}
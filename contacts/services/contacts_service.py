@@ -1,142 +1,431 @@
-from repository.contacts_repo import ContactsRepo
-from schemas.contacts_schemas import Contact, ContactCreate, ContactUpdate
-from models.contacts_model import ContactModel
-
-
-class ContactService():
-    """
-    Service class for managing contacts.
-    """
-
-    def __init__(self, db):
-        """
-        Initialize the ContactService instance.
-
-        :param db: A database session.
-        :type db: SessionLocal
-        """
-        self.repo = ContactsRepo(db=db)
-
-    async def get_all_contacts(self, user_email) -> list[Contact]:
-        """
-        Retrieve all contacts for a specific user.
-
-        :param user_email: The email of the user.
-        :type user_email: str
-        :return: List of contacts.
-        :rtype: list[Contact]
-        """
-        all_contacts_from_db = await self.repo.get_all(user_email)
-        return [Contact.from_orm(item) for item in all_contacts_from_db]
-
-    async def get_by_id(self, id: int, user_email) -> Contact:
-        """
-        Retrieve a contact by its ID for a specific user.
-
-        :param id: The ID of the contact to retrieve.
-        :type id: int
-        :param user_email: The email of the user.
-        :type user_email: str
-        :return: The retrieved contact.
-        :rtype: Contact
-        """
-        contact = await self.repo.get_by_id(id, user_email)
-        return Contact.from_orm(contact)
-
-    async def create_contact(self, contact_item: ContactCreate, user_email) -> Contact:
-        """
-        Create a new contact for a specific user.
-
-        :param contact_item: The contact data to create.
-        :type contact_item: ContactCreate
-        :param user_email: The email of the user.
-        :type user_email: str
-        :return: The newly created contact.
-        :rtype: Contact
-        """
-        new_contact_for_db = await self.repo.create(contact_item, user_email)
-        return Contact.from_orm(new_contact_for_db)
-
-    async def update(self, contact_item: ContactUpdate, id: int, user_email):
-        """
-        Update an existing contact for a specific user.
-
-        :param contact_item: The updated contact data.
-        :type contact_item: ContactUpdate
-        :param id: The ID of the contact to update.
-        :type id: int
-        :param user_email: The email of the user.
-        :type user_email: str
-        :return: The updated contact.
-        :rtype: Contact
-        """
-        updated_contact = await self.repo.update(id, contact_item, user_email)
-        return Contact.from_orm(updated_contact)
-
-    async def remove(self, id: int, user_email):
-        """
-        Remove a contact for a specific user.
-
-        :param id: The ID of the contact to remove.
-        :type id: int
-        :param user_email: The email of the user.
-        :type user_email: str
-        :return: The removed contact.
-        :rtype: Contact
-        """
-        removed_contact = await self.repo.remove(id, user_email)
-        return Contact.from_orm(removed_contact)
-
-    async def get_by_first_name(self, first_name: str, user_email):
-        """
-        Retrieve a contact by first name for a specific user.
-
-        :param first_name: The first name of the contact.
-        :type first_name: str
-        :param user_email: The email of the user.
-        :type user_email: str
-        :return: The retrieved contact.
-        :rtype: Contact
-        """
-        contact = await self.repo.get_by_first_name(first_name, user_email)
-        return Contact.from_orm(contact)
-
-    async def get_by_last_name(self, last_name: str, user_email):
-        """
-        Retrieve a contact by last name for a specific user.
-
-        :param last_name: The last name of the contact.
-        :type last_name: str
-        :param user_email: The email of the user.
-        :type user_email: str
-        :return: The retrieved contact.
-        :rtype: Contact
-        """
-        contact = await self.repo.get_by_last_name(last_name, user_email)
-        return Contact.from_orm(contact)
-
-    async def get_by_email(self, email: str, user_email):
-        """
-        Retrieve a contact by email for a specific user.
-
-        :param email: The email of the contact.
-        :type email: str
-        :param user_email: The email of the user.
-        :type user_email: str
-        :return: The retrieved contact.
-        :rtype: Contact
-        """
-        contact = await self.repo.get_by_email(email, user_email)
-        return Contact.from_orm(contact)
-
-    async def contacts_birthdays_in_7_days(self, user_email):
-        """
-        Retrieve contacts with birthdays in the next 7 days for a specific user.
-
-        :param user_email: The email of the user.
-        :type user_email: str
-        :return: List of contacts with upcoming birthdays.
-        :rtype: list[Contact]
-        """
-        contacts = await self.repo.contacts_birthdays_in_7_days(user_email)
-        return [Contact.from_orm(item) for item in contacts]
+import zlib
+
+from pydantic import ValidationError
+
+from contacts.dependencies.contact_index import CONTACT_INDEX
+from contacts.dependencies.etag import collection_etag, contact_etag, etag_matches
+from contacts.repository.contacts_repo import ContactsRepo
+from contacts.schemas.contacts_schemas import (Contact, ContactCreate, ContactUpdate, ContactImportResult,
+                                               ContactBatchUpdate, ContactFilter, ContactChanges)
+from contacts.services.contacts_io import EXPORTERS, PARSERS, detect_format, format_ndjson
+
+
+class ContactService():
+    """
+    Service class for managing contacts.
+    """
+
+    def __init__(self, db):
+        """
+        Initialize the ContactService instance.
+
+        :param db: A database session.
+        :type db: AsyncSession
+        """
+        self.repo = ContactsRepo(db=db)
+
+    async def get_all_contacts(self, user_email, limit=None, after_id=None) -> list[Contact]:
+        """
+        Retrieve contacts for a specific user, optionally one keyset page at a time.
+
+        :param user_email: The email of the user.
+        :type user_email: str
+        :param limit: Maximum number of contacts to return.
+        :type limit: int, optional
+        :param after_id: Return only contacts with id greater than this one.
+        :type after_id: int, optional
+        :return: List of contacts.
+        :rtype: list[Contact]
+        """
+        all_contacts_from_db = await self.repo.get_all(user_email, limit=limit, after_id=after_id)
+        return [Contact.from_orm(item) for item in all_contacts_from_db]
+
+    async def stream_contacts(self, user_email, chunk_size=1000):
+        """
+        Stream all contacts for a specific user as NDJSON, one chunk of lines at a time.
+
+        :param user_email: The email of the user.
+        :type user_email: str
+        :param chunk_size: Number of rows fetched from the database at a time.
+        :type chunk_size: int
+        :return: Async iterator over NDJSON text chunks.
+        :rtype: AsyncIterator[str]
+        """
+        async for chunk in self.repo.stream_all(user_email, chunk_size=chunk_size):
+            yield format_ndjson([Contact.from_orm(item) for item in chunk])
+
+    async def export_contacts(self, user_email, format='ndjson', compress=False, chunk_size=1000):
+        """
+        Stream all contacts for a specific user as CSV, NDJSON or vCard.
+
+        Rows are read from a server-side cursor and formatted one chunk at a time, so memory
+        use does not grow with the size of the address book. With ``compress`` the output is
+        gzipped on the fly and flushed after every chunk.
+
+        :param user_email: The email of the user.
+        :type user_email: str
+        :param format: One of csv, ndjson or vcf.
+        :type format: str
+        :param compress: Gzip the output.
+        :type compress: bool
+        :param chunk_size: Number of rows fetched from the database at a time.
+        :type chunk_size: int
+        :return: Async iterator over chunks of the file.
+        :rtype: AsyncIterator[bytes]
+        """
+        formatter = EXPORTERS[format][1]
+        encoder = zlib.compressobj(wbits=31) if compress else None
+
+        def encode(text, flush=zlib.Z_SYNC_FLUSH):
+            data = text.encode()
+            if encoder is None:
+                return data
+            return encoder.compress(data) + encoder.flush(flush)
+
+        header = formatter([], header=True)
+        if header:
+            yield encode(header)
+        async for chunk in self.repo.stream_all(user_email, chunk_size=chunk_size):
+            yield encode(formatter([Contact.from_orm(item) for item in chunk]))
+        if encoder is not None:
+            yield encoder.flush()
+
+    async def get_collection_etag(self, user_email) -> str:
+        """
+        Get the ETag of all contacts of a specific user with one aggregate query.
+
+        :param user_email: The email of the user.
+        :type user_email: str
+        :return: The weak ETag.
+        :rtype: str
+        """
+        count, updated_at = await self.repo.get_version(user_email)
+        return collection_etag(count, updated_at)
+
+    async def get_changes(self, user_email, since=None, limit=1000):
+        """
+        Retrieve what changed in the contacts of a specific user since a sync token.
+
+        Without a token only the current token is returned, to be taken before a full fetch.
+        Several changes of one contact are folded into one: a contact inserted and deleted
+        again is left out, one inserted and then updated is reported as inserted.
+
+        :param user_email: The email of the user.
+        :type user_email: str
+        :param since: The token of the previous sync.
+        :type since: int, optional
+        :param limit: Maximum number of change log entries read at once.
+        :type limit: int
+        :return: The changes, or None if the token is older than the kept change log.
+        :rtype: ContactChanges | None
+        """
+        last_seq, compacted_seq = await self.repo.get_sync_state(user_email)
+        if since is None:
+            return ContactChanges(token=last_seq)
+        if since < compacted_seq or since > last_seq:
+            return None
+        changes = await self.repo.get_changes(user_email, since, limit=limit + 1)
+        has_more = len(changes) > limit
+        changes = changes[:limit]
+        inserted, updated, deleted = set(), set(), set()
+        for change in changes:
+            contact_id = change.contact_id
+            if change.op == 'delete':
+                if contact_id in inserted:
+                    inserted.discard(contact_id)
+                else:
+                    updated.discard(contact_id)
+                    deleted.add(contact_id)
+            elif change.op == 'insert' and contact_id not in deleted:
+                inserted.add(contact_id)
+            elif contact_id not in inserted:
+                # an id reused after a delete is a replacement for the client
+                deleted.discard(contact_id)
+                updated.add(contact_id)
+        token = changes[-1].seq if has_more else max(last_seq, changes[-1].seq if changes else 0)
+        ids = [*inserted, *updated]
+        contacts = await self.repo.batch_select(ContactFilter(ids=ids), user_email) if ids else []
+        return ContactChanges(token=token, has_more=has_more, inserted=sorted(inserted), updated=sorted(updated),
+                              deleted=sorted(deleted), contacts=[Contact.from_orm(item) for item in contacts])
+
+    async def get_if_modified(self, id: int, user_email, if_none_match=None):
+        """
+        Retrieve a contact by its ID for a specific user unless the client already has it.
+
+        :param id: The ID of the contact to retrieve.
+        :type id: int
+        :param user_email: The email of the user.
+        :type user_email: str
+        :param if_none_match: The If-None-Match header of the request.
+        :type if_none_match: str, optional
+        :return: The ETag of the contact, and the contact or None if the client's copy is current;
+            None if the contact does not exist.
+        :rtype: tuple[str, Contact | None] | None
+        """
+        contact = await self.repo.get_by_id(id, user_email)
+        if contact is None:
+            return None
+        etag = contact_etag(contact)
+        if etag_matches(if_none_match, etag):
+            return etag, None
+        return etag, Contact.from_orm(contact)
+
+    async def get_by_id(self, id: int, user_email) -> Contact:
+        """
+        Retrieve a contact by its ID for a specific user.
+
+        :param id: The ID of the contact to retrieve.
+        :type id: int
+        :param user_email: The email of the user.
+        :type user_email: str
+        :return: The retrieved contact, None if it does not exist.
+        :rtype: Contact | None
+        """
+        contact = await self.repo.get_by_id(id, user_email)
+        return Contact.from_orm(contact) if contact is not None else None
+
+    async def create_contact(self, contact_item: ContactCreate, user_email) -> Contact:
+        """
+        Create a new contact for a specific user.
+
+        :param contact_item: The contact data to create.
+        :type contact_item: ContactCreate
+        :param user_email: The email of the user.
+        :type user_email: str
+        :return: The newly created contact.
+        :rtype: Contact
+        """
+        new_contact_for_db = await self.repo.create(contact_item, user_email)
+        return Contact.from_orm(new_contact_for_db)
+
+    async def import_contacts(self, chunks, user_email, format=None, content_type=None,
+                              batch_size=1000) -> ContactImportResult:
+        """
+        Import contacts from a streamed CSV, JSON array or NDJSON upload.
+
+        Rows are parsed as they arrive, validated one by one and written in batches, each
+        in its own transaction. Invalid rows are reported and skipped; the batches written
+        before a malformed document is detected stay in place.
+
+        :param chunks: The body of the upload.
+        :type chunks: AsyncIterator[bytes]
+        :param user_email: The email of the user.
+        :type user_email: str
+        :param format: One of csv, json or ndjson, detected if None.
+        :type format: str, optional
+        :param content_type: Media type of the upload, used to detect the format.
+        :type content_type: str, optional
+        :param batch_size: Number of contacts written per transaction.
+        :type batch_size: int
+        :return: The format, the number of imported contacts and the errors per row.
+        :rtype: ContactImportResult
+        """
+        chunks = chunks.__aiter__()
+        first_chunk = await anext(chunks, b'')
+
+        async def body():
+            yield first_chunk
+            async for chunk in chunks:
+                yield chunk
+
+        format = format or detect_format(content_type, first_chunk)
+        inserted, errors, batch, rows = 0, [], [], []
+
+        async def flush():
+            count, rejected = await self.repo.bulk_create(batch, user_email)
+            errors.extend({'row': rows[index], 'errors': item_errors} for index, item_errors in rejected.items())
+            batch.clear()
+            rows.clear()
+            return count
+
+        row = 0
+        try:
+            async for value in PARSERS[format](body()):
+                row += 1
+                try:
+                    if isinstance(value, Exception):
+                        raise value
+                    batch.append(ContactCreate.model_validate(value))
+                    rows.append(row)
+                except ValidationError as e:
+                    errors.append({'row': row, 'errors': [{'loc': list(error['loc']), 'msg': error['msg']}
+                                                          for error in e.errors()]})
+                except ValueError as e:
+                    errors.append({'row': row, 'errors': [{'loc': [], 'msg': str(e)}]})
+                if len(batch) >= batch_size:
+                    inserted += await flush()
+        except (ValueError, UnicodeDecodeError) as e:
+            errors.append({'row': row + 1, 'errors': [{'loc': [], 'msg': str(e)}]})
+        if batch:
+            inserted += await flush()
+        errors.sort(key=lambda error: error['row'])
+        return ContactImportResult(format=format, inserted=inserted, errors=errors)
+
+    async def update(self, contact_item: ContactUpdate, id: int, user_email):
+        """
+        Update an existing contact for a specific user.
+
+        :param contact_item: The updated contact data.
+        :type contact_item: ContactUpdate
+        :param id: The ID of the contact to update.
+        :type id: int
+        :param user_email: The email of the user.
+        :type user_email: str
+        :return: The updated contact, None if it does not exist.
+        :rtype: Contact | None
+        """
+        updated_contact = await self.repo.update(contact_item, id, user_email)
+        return Contact.from_orm(updated_contact) if updated_contact is not None else None
+
+    async def batch_update(self, contact_batch: ContactBatchUpdate, user_email) -> list[Contact]:
+        """
+        Update all matching contacts of a specific user at once.
+
+        :param contact_batch: Which contacts to update and the fields to change.
+        :type contact_batch: ContactBatchUpdate
+        :param user_email: The email of the user.
+        :type user_email: str
+        :return: The updated contacts.
+        :rtype: list[Contact]
+        """
+        contacts = await self.repo.batch_update(contact_batch.where, contact_batch.values, user_email)
+        return [Contact.from_orm(item) for item in contacts]
+
+    async def batch_remove(self, contact_filter: ContactFilter, user_email) -> list[Contact]:
+        """
+        Remove all matching contacts of a specific user at once.
+
+        :param contact_filter: Which contacts to remove.
+        :type contact_filter: ContactFilter
+        :param user_email: The email of the user.
+        :type user_email: str
+        :return: The removed contacts.
+        :rtype: list[Contact]
+        """
+        contacts = await self.repo.batch_remove(contact_filter, user_email)
+        return [Contact.from_orm(item) for item in contacts]
+
+    async def remove(self, id: int, user_email):
+        """
+        Remove a contact for a specific user.
+
+        :param id: The ID of the contact to remove.
+        :type id: int
+        :param user_email: The email of the user.
+        :type user_email: str
+        :return: The removed contact, None if it does not exist.
+        :rtype: Contact | None
+        """
+        removed_contact = await self.repo.remove(id, user_email)
+        return Contact.from_orm(removed_contact) if removed_contact is not None else None
+
+    async def search(self, q: str, user_email, limit=50, offset=0) -> list[Contact]:
+        """
+        Search contacts by a substring of their name, email or phone for a specific user.
+
+        :param q: The search text.
+        :type q: str
+        :param user_email: The email of the user.
+        :type user_email: str
+        :param limit: Page size.
+        :type limit: int
+        :param offset: Number of results to skip.
+        :type offset: int
+        :return: Matching contacts, best matches first.
+        :rtype: list[Contact]
+        """
+        contacts = await self.repo.search(q, user_email, limit=limit, offset=offset)
+        return [Contact.from_orm(item) for item in contacts]
+
+    async def lookup(self, user_email, name=None, phone=None, limit=10) -> list[Contact]:
+        """
+        Look up contacts by name prefix and/or phone number suffix for a specific user.
+
+        Served from the in-memory index of the user, which is built from the database on
+        first use. With the index disabled it is built for every call.
+
+        :param user_email: The email of the user.
+        :type user_email: str
+        :param name: Prefix of the first, last or full name.
+        :type name: str, optional
+        :param phone: Trailing digits of the phone number.
+        :type phone: str, optional
+        :param limit: Maximum number of contacts to return.
+        :type limit: int
+        :return: Matching contacts.
+        :rtype: list[Contact]
+        """
+        index = CONTACT_INDEX.get(user_email)
+        if index is None:
+            index = await CONTACT_INDEX.load(user_email, self.repo.stream_all(user_email))
+        return index.lookup(name=name, phone=phone, limit=limit)
+
+    async def get_by_first_name(self, first_name: str, user_email):
+        """
+        Retrieve a contact by first name for a specific user.
+
+        :param first_name: The first name of the contact.
+        :type first_name: str
+        :param user_email: The email of the user.
+        :type user_email: str
+        :return: The retrieved contact.
+        :rtype: Contact
+        """
+        contact = await self.repo.get_by_first_name(first_name, user_email)
+        return Contact.from_orm(contact)
+
+    async def get_by_last_name(self, last_name: str, user_email):
+        """
+        Retrieve a contact by last name for a specific user.
+
+        :param last_name: The last name of the contact.
+        :type last_name: str
+        :param user_email: The email of the user.
+        :type user_email: str
+        :return: The retrieved contact.
+        :rtype: Contact
+        """
+        contact = await self.repo.get_by_last_name(last_name, user_email)
+        return Contact.from_orm(contact)
+
+    async def get_by_email(self, email: str, user_email):
+        """
+        Retrieve a contact by email for a specific user.
+
+        :param email: The email of the contact.
+        :type email: str
+        :param user_email: The email of the user.
+        :type user_email: str
+        :return: The retrieved contact.
+        :rtype: Contact
+        """
+        contact = await self.repo.get_by_email(email, user_email)
+        return Contact.from_orm(contact)
+
+    async def get_by_phone(self, phone_number: str, user_email) -> list[Contact]:
+        """
+        Retrieve contacts by phone number, written in any format, for a specific user.
+
+        :param phone_number: The phone number of the contact.
+        :type phone_number: str
+        :param user_email: The email of the user.
+        :type user_email: str
+        :return: Contacts with this phone number.
+        :rtype: list[Contact]
+        """
+        contacts = await self.repo.get_by_phone(phone_number, user_email)
+        return [Contact.from_orm(item) for item in contacts]
+
+    async def contacts_birthdays_in_7_days(self, user_email, days=7):
+        """
+        Retrieve contacts with birthdays in the next days for a specific user.
+
+        :param user_email: The email of the user.
+        :type user_email: str
+        :param days: How many days ahead to look.
+        :type days: int
+        :return: List of contacts with upcoming birthdays.
+        :rtype: list[Contact]
+        """
+        contacts = await self.repo.contacts_birthdays_in_7_days(user_email, days=days)
+        return [Contact.from_orm(item) for item in contacts]
@@ -1,43 +1,46 @@
+import asyncio
+import os
+
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+
+SQLALCHEMY_DATABASE_URL = "sqlite+aiosqlite:///./test.db"
+os.environ.setdefault("DATABASE_URL", SQLALCHEMY_DATABASE_URL)
 
-from contacts.main import app
-from contacts.dependencies.database import Base, get_db
+from contacts.main import app  # noqa: E402
+from contacts.dependencies.database import Base, get_db  # noqa: E402
 
+engine = create_async_engine(SQLALCHEMY_DATABASE_URL)
+TestingSessionLocal = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+async def create_schema():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
 
 
 @pytest.fixture(scope="module")
 def session():
     # Create the database
 
-    Base.metadata.drop_all(bind=engine)
-    Base.metadata.create_all(bind=engine)
+    asyncio.run(create_schema())
 
     db = TestingSessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+    yield db
 
 
 @pytest.fixture(scope="module")
 def client(session):
     # Dependency override
 
-    def override_get_db():
+    async def override_get_db():
         try:
             yield session
         finally:
-            session.close()
+            await session.close()
 
     app.dependency_overrides[get_db] = override_get_db
 
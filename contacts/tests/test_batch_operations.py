@@ -0,0 +1,98 @@
+import unittest
+from datetime import date
+
+from pydantic import ValidationError
+from sqlalchemy import event, insert, select
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from contacts.dependencies.database import Base
+from contacts.models.contacts_model import ContactModel
+from contacts.models.user import UserModel
+from contacts.repository.contacts_repo import ContactsRepo
+from contacts.schemas.contacts_schemas import ContactFilter, ContactPatch
+
+
+class TestBatchOperations(unittest.IsolatedAsyncioTestCase):
+    user_email = 'tenant@example.com'
+    other_email = 'other@example.com'
+
+    async def asyncSetUp(self):
+        self.engine = create_async_engine('sqlite+aiosqlite://', poolclass=StaticPool)
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.execute(insert(UserModel), [{'email': self.user_email}, {'email': self.other_email}])
+            await conn.execute(insert(ContactModel), [
+                {'id': n, 'first_name': f'First{n}', 'last_name': 'Doe' if n % 2 else 'Roe', 'phone_number': f'{n}',
+                 'favorite': False, 'user_email': self.user_email if n <= 6 else self.other_email}
+                for n in range(1, 9)
+            ])
+        self.statements = []
+        event.listen(self.engine.sync_engine, 'before_cursor_execute', self._record)
+        self.session = async_sessionmaker(bind=self.engine, expire_on_commit=False)()
+        self.repo = ContactsRepo(self.session)
+
+    async def asyncTearDown(self):
+        await self.session.close()
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+        await self.engine.dispose()
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement.split()[0])
+
+    async def favorites(self):
+        async with self.engine.connect() as conn:
+            stmt = select(ContactModel.id).where(ContactModel.favorite).order_by(ContactModel.id)
+            return list(await conn.scalars(stmt))
+
+    async def test_update_by_ids_in_one_statement(self):
+        contacts = await self.repo.batch_update(ContactFilter(ids=[1, 2, 7]), ContactPatch(favorite=True),
+                                                self.user_email)
+
+        self.assertEqual(sorted(contact.id for contact in contacts), [1, 2])
+        self.assertTrue(all(contact.favorite for contact in contacts))
+        self.assertEqual(self.statements, ['UPDATE', 'INSERT', 'INSERT'])
+        self.assertEqual(await self.favorites(), [1, 2])
+
+    async def test_update_by_filter(self):
+        contacts = await self.repo.batch_update(ContactFilter(last_name='Doe'),
+                                                ContactPatch(birthday=date(1990, 2, 14)), self.user_email)
+
+        self.assertEqual(sorted(contact.id for contact in contacts), [1, 3, 5])
+        async with self.engine.connect() as conn:
+            stmt = select(ContactModel.birthday_md).where(ContactModel.id.in_([1, 7]))
+            self.assertEqual(set(await conn.scalars(stmt)), {214, None})
+
+    async def test_update_normalizes_phone(self):
+        contacts = await self.repo.batch_update(ContactFilter(ids=[3]), ContactPatch(phone_number='067 123 45 67'),
+                                                self.user_email)
+
+        self.assertEqual(contacts[0].phone_e164, '+380671234567')
+
+    async def test_remove(self):
+        contacts = await self.repo.batch_remove(ContactFilter(ids=[2, 4, 8], last_name='Roe'), self.user_email)
+
+        self.assertEqual(sorted(contact.id for contact in contacts), [2, 4])
+        self.assertEqual(self.statements, ['DELETE', 'INSERT', 'INSERT'])
+        async with self.engine.connect() as conn:
+            self.assertEqual(list(await conn.scalars(select(ContactModel.id).order_by(ContactModel.id))),
+                             [1, 3, 5, 6, 7, 8])
+
+    async def test_empty_ids_match_nothing(self):
+        self.assertEqual(await self.repo.batch_remove(ContactFilter(ids=[]), self.user_email), [])
+
+    def test_filter_requires_criteria(self):
+        with self.assertRaises(ValidationError):
+            ContactFilter()
+
+    def test_required_fields_cannot_be_null(self):
+        for name in ('first_name', 'last_name', 'phone_number'):
+            with self.subTest(name=name), self.assertRaises(ValidationError):
+                ContactPatch.model_validate({name: None})
+        self.assertEqual(ContactPatch(email=None, birthday=None).dict(exclude_unset=True),
+                         {'email': None, 'birthday': None})
+
+
+if __name__ == '__main__':
+    unittest.main()
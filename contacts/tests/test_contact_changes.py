@@ -0,0 +1,111 @@
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from contacts.dependencies.database import Base
+from contacts.models.contact_change import ContactChangeModel
+from contacts.models.user import UserModel
+from contacts.repository.contacts_repo import ContactsRepo
+from contacts.schemas.contacts_schemas import ContactCreate, ContactFilter, ContactPatch, ContactUpdate
+from contacts.services.contacts_service import ContactService
+
+
+def contact_create(n):
+    return ContactCreate(first_name=f'First{n}', last_name='Doe', phone_number=f'{n}')
+
+
+class TestContactChanges(unittest.IsolatedAsyncioTestCase):
+    user_email = 'tenant@example.com'
+    other_email = 'other@example.com'
+
+    async def asyncSetUp(self):
+        self.engine = create_async_engine('sqlite+aiosqlite://', poolclass=StaticPool)
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.execute(insert(UserModel), [{'email': self.user_email}, {'email': self.other_email}])
+        self.session = async_sessionmaker(bind=self.engine, expire_on_commit=False)()
+        self.repo = ContactsRepo(self.session)
+        self.service = ContactService(self.session)
+
+    async def asyncTearDown(self):
+        await self.session.close()
+        await self.engine.dispose()
+
+    async def test_without_token_returns_current_token(self):
+        self.assertEqual((await self.service.get_changes(self.user_email)).token, 0)
+        await self.repo.create(contact_create(1), self.user_email)
+
+        changes = await self.service.get_changes(self.user_email)
+
+        self.assertEqual((changes.token, changes.inserted, changes.contacts), (1, [], []))
+
+    async def test_changes_are_folded_per_contact(self):
+        removed = await self.repo.create(contact_create(1), self.user_email)
+        changed = await self.repo.create(contact_create(2), self.user_email)
+        kept = await self.repo.create(contact_create(3), self.user_email)
+        token = (await self.service.get_changes(self.user_email)).token
+
+        await self.repo.update(ContactUpdate(first_name='Changed', last_name='Doe', email=None, phone_number='2',
+                                             birthday=None, favorite=None), changed.id, self.user_email)
+        await self.repo.remove(removed.id, self.user_email)
+        new = await self.repo.create(contact_create(4), self.user_email)
+        await self.repo.batch_update(ContactFilter(ids=[new.id]), ContactPatch(favorite=True), self.user_email)
+        transient = await self.repo.create(contact_create(5), self.user_email)
+        await self.repo.batch_remove(ContactFilter(ids=[transient.id]), self.user_email)
+        await self.repo.create(contact_create(6), self.other_email)
+        # SQLite hands out the id of a deleted last row again, to the client that is a replacement
+        reused = await self.repo.create(contact_create(7), self.user_email)
+        await self.repo.remove(reused.id, self.user_email)
+        self.assertEqual((await self.repo.create(contact_create(8), self.user_email)).id, reused.id)
+
+        changes = await self.service.get_changes(self.user_email, since=token)
+
+        self.assertEqual((changes.inserted, changes.updated, changes.deleted),
+                         ([new.id, reused.id], [changed.id], [removed.id]))
+        self.assertEqual({contact.id: contact.first_name for contact in changes.contacts if contact.id != reused.id},
+                         {new.id: 'First4', changed.id: 'Changed'})
+        self.assertEqual(len(changes.contacts), 3)
+        self.assertNotIn(kept.id, changes.updated)
+        self.assertFalse(changes.has_more)
+        self.assertEqual((await self.service.get_changes(self.user_email, since=changes.token)).inserted, [])
+
+    async def test_pages(self):
+        await self.repo.bulk_create([contact_create(n) for n in range(5)], self.user_email)
+
+        first = await self.service.get_changes(self.user_email, since=0, limit=3)
+        second = await self.service.get_changes(self.user_email, since=first.token, limit=3)
+
+        self.assertEqual((first.has_more, first.token, first.inserted), (True, 3, [1, 2, 3]))
+        self.assertEqual((second.has_more, second.token, second.inserted), (False, 5, [4, 5]))
+
+    async def test_compacted_token_is_rejected(self):
+        await self.repo.create(contact_create(1), self.user_email)
+        await self.repo.create(contact_create(2), self.user_email)
+
+        self.assertEqual(await self.repo.compact_changes(self.user_email, before=datetime.utcnow()), 2)
+        await self.session.commit()
+        await self.repo.create(contact_create(3), self.user_email)
+
+        self.assertIsNone(await self.service.get_changes(self.user_email, since=1))
+        self.assertIsNone(await self.service.get_changes(self.user_email, since=99))
+        self.assertEqual((await self.service.get_changes(self.user_email, since=2)).inserted, [3])
+
+    async def test_log_is_compacted_while_writing(self):
+        await self.repo.create(contact_create(1), self.user_email)
+        later = datetime.utcnow() + timedelta(days=31)
+        with patch('contacts.repository.contacts_repo.CONTACT_CHANGES_COMPACT_EVERY', 3), \
+                patch('contacts.repository.contacts_repo.datetime', wraps=datetime) as mock_datetime:
+            mock_datetime.utcnow.return_value = later
+            await self.repo.bulk_create([contact_create(n) for n in range(2, 4)], self.user_email)
+
+        seqs = await self.session.scalars(select(ContactChangeModel.seq).order_by(ContactChangeModel.seq))
+        self.assertEqual(seqs.all(), [2, 3])
+        self.assertEqual(await self.repo.get_sync_state(self.user_email), (3, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
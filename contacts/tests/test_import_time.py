@@ -0,0 +1,60 @@
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# microseconds; generous enough for a slow CI runner, it catches heavy imports creeping back in
+IMPORT_TIME_BUDGET = int(os.getenv("IMPORT_TIME_BUDGET", 3000000))
+# clients that are created on first use and must not be imported with the application
+LAZY_MODULES = ['cloudinary', 'PIL', 'multiprocessing']
+
+SCRIPT = '''
+import json, sys
+import contacts.main
+from contacts.dependencies import database
+print(json.dumps({"modules": sorted(sys.modules), "engine": database.ENGINE is not None}))
+'''
+
+
+def import_main():
+    """
+    Import the application in a fresh interpreter with ``-X importtime``.
+
+    :return: Cumulative import times in microseconds by module, and what the script printed.
+    :rtype: tuple[dict[str, int], dict]
+    """
+    env = dict(os.environ, PYTHONPATH=ROOT, DATABASE_URL='sqlite+aiosqlite:///./never-opened.db')
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', SCRIPT], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            _, cumulative, module = line.split('|')
+            if cumulative.strip().isdigit():
+                times[module.strip()] = int(cumulative)
+    return times, json.loads(result.stdout.splitlines()[-1])
+
+
+class TestImportTime(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.times, cls.state = import_main()
+
+    def test_within_budget(self):
+        self.assertLess(self.times['contacts.main'], IMPORT_TIME_BUDGET)
+
+    def test_clients_are_not_imported(self):
+        imported = {module.split('.')[0] for module in self.state['modules']}
+
+        self.assertEqual([module for module in LAZY_MODULES if module in imported], [])
+
+    def test_engine_is_not_created(self):
+        self.assertFalse(self.state['engine'])
+        self.assertFalse(os.path.exists(os.path.join(ROOT, 'never-opened.db')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,34 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+CONTACTS = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def alembic(database_url, *args):
+    """
+    Run an alembic command on a database in a fresh interpreter, so the cached settings
+    of the test process do not pick the database.
+
+    :return: The finished process.
+    :rtype: subprocess.CompletedProcess
+    """
+    return subprocess.run([sys.executable, '-m', 'alembic', *args], cwd=CONTACTS, capture_output=True, text=True,
+                          env=dict(os.environ, DATABASE_URL=database_url))
+
+
+class TestMigrations(unittest.TestCase):
+    def test_models_match_migrations(self):
+        with tempfile.TemporaryDirectory() as directory:
+            database_url = f'sqlite+aiosqlite:///{os.path.join(directory, "migrations.db")}'
+
+            upgrade = alembic(database_url, 'upgrade', 'head')
+            self.assertEqual(upgrade.returncode, 0, upgrade.stderr)
+            check = alembic(database_url, 'check')
+            self.assertEqual(check.returncode, 0, check.stdout + check.stderr)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,154 @@
+import os
+import re
+import unittest
+from unittest.mock import patch
+from datetime import date, timedelta
+
+from sqlalchemy import event, insert
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from contacts.dependencies.database import Base
+from contacts.models.contacts_model import ContactModel, birthday_key
+from contacts.models.user import UserModel
+from contacts.repository.contacts_repo import ContactsRepo
+
+
+TENANTS = [f"tenant{i}@example.com" for i in range(5)]
+CONTACTS_PER_TENANT = 200
+
+
+class QueryPlanMixin:
+    """
+    Runs every ContactsRepo read query against a seeded database, records the SQL it
+    emits and fails if the plan for any of them scans the contacts table or does not
+    use an index on all of the columns the query filters on.
+    """
+    database_url = None
+
+    async def asyncSetUp(self):
+        self.engine = create_async_engine(self.database_url, poolclass=StaticPool)
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.execute(insert(UserModel), [{"email": email} for email in TENANTS])
+            birthdays = [date.today() - timedelta(days=365 * 30 + n) for n in range(CONTACTS_PER_TENANT)]
+            await conn.execute(insert(ContactModel), [
+                {"first_name": f"First{n}", "last_name": f"Last{n}", "email": f"c{n}@{tenant}",
+                 "phone_number": f"+38067{n:07d}", "phone_e164": f"+38067{n:07d}",
+                 "birthday": birthdays[n], "birthday_md": birthday_key(birthdays[n]), "user_email": tenant}
+                for tenant in TENANTS for n in range(CONTACTS_PER_TENANT)
+            ])
+            await conn.exec_driver_sql(self.analyze_sql)
+
+        self.statements = []
+        event.listen(self.engine.sync_engine, "before_cursor_execute", self._record)
+        self.session = async_sessionmaker(bind=self.engine, expire_on_commit=False)()
+        self.repo = ContactsRepo(self.session)
+        self.user_email = TENANTS[2]
+
+    async def asyncTearDown(self):
+        await self.session.close()
+        event.remove(self.engine.sync_engine, "before_cursor_execute", self._record)
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+        await self.engine.dispose()
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            self.statements.append((statement, parameters))
+
+    async def explain(self, statement, parameters):
+        async with self.engine.connect() as conn:
+            if self.setup_sql:
+                await conn.exec_driver_sql(self.setup_sql)
+            result = await conn.exec_driver_sql(self.explain_prefix + statement, parameters)
+            return "\n".join(str(row[-1]) for row in result)
+
+    async def assertIndexOnly(self, query, columns=(), covering=False):
+        self.statements.clear()
+        await query
+        self.assertTrue(self.statements, "query did not reach the database")
+        for statement, parameters in self.statements:
+            plan = await self.explain(statement, parameters)
+            self.assertIsNone(re.search(self.scan_pattern, plan),
+                              f"sequential scan in plan for:\n{statement}\n{plan}")
+            for column in columns:
+                self.assertRegex(plan, rf"\b{column}\b", f"index on {column} not used for:\n{statement}\n{plan}")
+            if covering:
+                self.assertRegex(plan, self.covering_pattern, f"table read for:\n{statement}\n{plan}")
+
+    async def test_get_all(self):
+        await self.assertIndexOnly(self.repo.get_all(self.user_email), columns=("user_email",))
+
+    async def test_get_all_page(self):
+        await self.assertIndexOnly(self.repo.get_all(self.user_email, limit=50, after_id=450),
+                                   columns=("user_email", "id"))
+
+    async def test_get_version(self):
+        await self.assertIndexOnly(self.repo.get_version(self.user_email), columns=("user_email",), covering=True)
+
+    async def test_get_changes(self):
+        await self.assertIndexOnly(self.repo.get_changes(self.user_email, 100, limit=1000),
+                                   columns=("user_email", "seq"))
+
+    async def test_get_by_id(self):
+        await self.assertIndexOnly(self.repo.get_by_id(450, self.user_email))
+
+    async def test_get_by_first_name(self):
+        await self.assertIndexOnly(self.repo.get_by_first_name("First10", self.user_email),
+                                   columns=("user_email", "first_name"))
+
+    async def test_get_by_last_name(self):
+        await self.assertIndexOnly(self.repo.get_by_last_name("Last10", self.user_email),
+                                   columns=("user_email", "last_name"))
+
+    async def test_get_by_email(self):
+        await self.assertIndexOnly(self.repo.get_by_email(f"c10@{self.user_email}", self.user_email),
+                                   columns=("user_email", "email"))
+
+    async def test_get_by_phone(self):
+        await self.assertIndexOnly(self.repo.get_by_phone("+380670000010", self.user_email),
+                                   columns=("user_email", "phone_e164"))
+
+    async def test_birthdays(self):
+        await self.assertIndexOnly(self.repo.contacts_birthdays_in_7_days(self.user_email),
+                                   columns=("user_email", "birthday_md"))
+
+    async def test_birthdays_across_new_year(self):
+        with patch("contacts.repository.contacts_repo.date", wraps=date) as mock_date:
+            mock_date.today.return_value = date(2026, 12, 28)
+            await self.assertIndexOnly(self.repo.contacts_birthdays_in_7_days(self.user_email, days=10),
+                                       columns=("user_email", "birthday_md"))
+
+    async def test_search(self):
+        await self.assertIndexOnly(self.repo.search("irst12", self.user_email))
+
+    async def test_search_short(self):
+        await self.assertIndexOnly(self.repo.search("12", self.user_email), columns=("user_email",))
+
+
+class TestSqliteQueryPlans(QueryPlanMixin, unittest.IsolatedAsyncioTestCase):
+    database_url = "sqlite+aiosqlite://"
+    analyze_sql = "ANALYZE"
+    setup_sql = None
+    explain_prefix = "EXPLAIN QUERY PLAN "
+    scan_pattern = r"\bSCAN contacts\b"
+    covering_pattern = r"COVERING INDEX ix_contacts_user_email_updated_at"
+
+
+@unittest.skipUnless(os.getenv("TEST_POSTGRES_URL"), "TEST_POSTGRES_URL is not set")
+class TestPostgresQueryPlans(QueryPlanMixin, unittest.IsolatedAsyncioTestCase):
+    database_url = os.getenv("TEST_POSTGRES_URL")
+    analyze_sql = "ANALYZE contacts"
+    # the seeded table is small enough for the planner to prefer a seq scan even with a usable
+    # index, so make seq scans prohibitively expensive and check that an index path exists
+    setup_sql = "SET enable_seqscan = off"
+    explain_prefix = "EXPLAIN "
+    scan_pattern = r"Seq Scan on contacts"
+    # an index only scan needs an up to date visibility map, which the freshly seeded table may lack
+    covering_pattern = r"Index (Only )?Scan using ix_contacts_user_email_updated_at"
+
+
+if __name__ == '__main__':
+    unittest.main()
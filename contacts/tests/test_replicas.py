@@ -0,0 +1,125 @@
+import os
+import tempfile
+import unittest
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from contacts.dependencies.database import Base
+from contacts.dependencies.replicas import ReplicaSet
+from contacts.models.contacts_model import ContactModel
+from contacts.models.user import UserModel
+from contacts.repository.contacts_repo import ContactsRepo
+from contacts.schemas.contacts_schemas import ContactCreate, ContactUpdate
+
+
+class TestReplicaRouting(unittest.IsolatedAsyncioTestCase):
+    """
+    A primary and replicas as separate SQLite files, each seeded with a contact named after
+    the database, so every read shows where it was served from.
+    """
+    user_email = 'tenant@example.com'
+    other_email = 'other@example.com'
+
+    async def asyncSetUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.primary = await self.database('Primary')
+        self.replica = await self.database('Replica')
+        self.engines = [self.primary, self.replica]
+
+    async def asyncTearDown(self):
+        for engine in self.engines:
+            await engine.dispose()
+        self.directory.cleanup()
+
+    async def database(self, name):
+        engine = create_async_engine(f'sqlite+aiosqlite:///{os.path.join(self.directory.name, name)}.db')
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.execute(insert(UserModel), [{'email': self.user_email}, {'email': self.other_email}])
+            await conn.execute(insert(ContactModel), [
+                {'id': n, 'first_name': name, 'last_name': 'Doe', 'phone_number': '1', 'user_email': email}
+                for n, email in enumerate([self.user_email, self.other_email], start=1)
+            ])
+        return engine
+
+    def repo(self, replicas):
+        session = async_sessionmaker(bind=self.primary, info={'replicas': replicas}, expire_on_commit=False)()
+        self.addAsyncCleanup(session.close)
+        return ContactsRepo(session)
+
+    async def names(self, repo, user_email=None):
+        return [contact.first_name for contact in await repo.get_all(user_email or self.user_email)]
+
+    async def test_reads_go_to_replica(self):
+        repo = self.repo(ReplicaSet([self.replica]))
+
+        self.assertEqual(await self.names(repo), ['Replica'])
+        self.assertEqual((await repo.get_by_id(1, self.user_email)).first_name, 'Replica')
+        self.assertEqual([item.first_name async for chunk in repo.stream_all(self.user_email) for item in chunk],
+                         ['Replica'])
+
+    async def test_writes_go_to_primary_and_stick_the_user_to_it(self):
+        replicas = ReplicaSet([self.replica], sticky_for=60)
+        repo = self.repo(replicas)
+
+        await repo.create(ContactCreate(first_name='New', last_name='Doe', phone_number='2'), self.user_email)
+
+        self.assertEqual(await self.names(self.repo(replicas)), ['Primary', 'New'])
+        self.assertEqual(await self.names(self.repo(replicas), self.other_email), ['Replica'])
+        self.assertEqual(await self.names(self.repo(ReplicaSet([self.replica]))), ['Replica'])
+
+    async def test_sticky_window_ends(self):
+        replicas = ReplicaSet([self.replica], sticky_for=0)
+        await self.repo(replicas).create(ContactCreate(first_name='New', last_name='Doe', phone_number='2'),
+                                         self.user_email)
+
+        self.assertEqual(await self.names(self.repo(replicas)), ['Replica'])
+
+    async def test_reads_inside_writes_use_primary(self):
+        repo = self.repo(ReplicaSet([self.replica]))
+        empty = ContactUpdate.model_construct()
+
+        self.assertEqual((await repo.update(empty, 1, self.user_email)).first_name, 'Primary')
+
+    async def test_round_robin(self):
+        second = await self.database('Second')
+        self.engines.append(second)
+        replicas = ReplicaSet([self.replica, second])
+
+        self.assertEqual([(await self.names(self.repo(replicas)))[0] for _ in range(4)],
+                         ['Replica', 'Second', 'Replica', 'Second'])
+
+    async def test_failed_replica_falls_back_to_primary(self):
+        broken = create_async_engine(f'sqlite+aiosqlite:///{os.path.join(self.directory.name, "missing", "x.db")}')
+        self.engines.append(broken)
+        replicas = ReplicaSet([broken, self.replica], retry_after=60)
+
+        self.assertEqual(await self.names(self.repo(replicas)), ['Primary'])
+        self.assertIn(broken, replicas.down)
+        self.assertEqual([(await self.names(self.repo(replicas)))[0] for _ in range(2)], ['Replica', 'Replica'])
+
+    async def test_failed_replica_leaves_the_session_alone(self):
+        broken = create_async_engine(f'sqlite+aiosqlite:///{os.path.join(self.directory.name, "missing", "x.db")}')
+        self.engines.append(broken)
+        repo = self.repo(ReplicaSet([broken], retry_after=60))
+        await repo.db.execute(insert(ContactModel).values(id=3, first_name='Pending', last_name='Doe',
+                                                          phone_number='2', user_email=self.user_email))
+
+        self.assertEqual(await self.names(repo), ['Primary', 'Pending'])
+        await repo.db.commit()
+        self.assertEqual(await self.names(self.repo(ReplicaSet())), ['Primary', 'Pending'])
+
+    async def test_replica_is_used_again_once_healthy(self):
+        replicas = ReplicaSet([self.replica], retry_after=0)
+        replicas.mark_down(self.replica)
+
+        self.assertEqual(await self.names(self.repo(replicas)), ['Replica'])
+        self.assertNotIn(self.replica, replicas.down)
+
+    async def test_no_replicas(self):
+        self.assertEqual(await self.names(self.repo(ReplicaSet())), ['Primary'])
+
+
+if __name__ == '__main__':
+    unittest.main()
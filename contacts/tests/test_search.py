@@ -0,0 +1,71 @@
+import unittest
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from contacts.dependencies.database import Base
+from contacts.models.contacts_model import ContactModel
+from contacts.models.user import UserModel
+from contacts.repository.contacts_repo import ContactsRepo
+from contacts.schemas.contacts_schemas import ContactUpdate
+
+
+class TestSearch(unittest.IsolatedAsyncioTestCase):
+    user_email = 'tenant@example.com'
+
+    async def asyncSetUp(self):
+        self.engine = create_async_engine('sqlite+aiosqlite://', poolclass=StaticPool)
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.execute(insert(UserModel), [{'email': self.user_email}, {'email': 'other@example.com'}])
+            await conn.execute(insert(ContactModel), [
+                {'first_name': 'John', 'last_name': 'Smith', 'email': 'john@work.com', 'phone_number': '+380671112233',
+                 'user_email': self.user_email},
+                {'first_name': 'Johnny', 'last_name': 'Walker', 'email': None, 'phone_number': '+380504445566',
+                 'user_email': self.user_email},
+                {'first_name': 'Anna', 'last_name': 'Johnson', 'email': 'anna_100%@mail.com',
+                 'phone_number': '+380671119999', 'user_email': self.user_email},
+                {'first_name': 'John', 'last_name': 'Other', 'email': None, 'phone_number': '+380670000000',
+                 'user_email': 'other@example.com'},
+            ])
+        self.session = async_sessionmaker(bind=self.engine, expire_on_commit=False)()
+        self.repo = ContactsRepo(self.session)
+
+    async def asyncTearDown(self):
+        await self.session.close()
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+        await self.engine.dispose()
+
+    async def names(self, q, **kwargs):
+        return [contact.first_name for contact in await self.repo.search(q, self.user_email, **kwargs)]
+
+    async def test_matches_any_field_of_own_contacts(self):
+        self.assertEqual(sorted(await self.names('john')), ['Anna', 'John', 'Johnny'])
+        self.assertEqual(await self.names('WORK.C'), ['John'])
+        self.assertEqual(await self.names('4445'), ['Johnny'])
+
+    async def test_short_query_and_wildcards(self):
+        self.assertEqual(await self.names('Jo'), ['John', 'Johnny', 'Anna'])
+        self.assertEqual(await self.names('%'), ['Anna'])
+        self.assertEqual(await self.names('a_1'), ['Anna'])
+
+    async def test_pagination(self):
+        first = await self.names('+38067', limit=1)
+        second = await self.names('+38067', limit=1, offset=1)
+
+        self.assertEqual(len(first + second), 2)
+        self.assertEqual(set(first + second), {'John', 'Anna'})
+
+    async def test_index_follows_changes(self):
+        await self.repo.update(ContactUpdate(first_name='Bob', last_name='Smith', email=None, phone_number='1',
+                                             birthday=None, favorite=None), 1, self.user_email)
+        await self.repo.remove(2, self.user_email)
+
+        self.assertEqual(await self.names('john'), ['Anna'])
+        self.assertEqual(await self.names('Bob'), ['Bob'])
+
+
+if __name__ == '__main__':
+    unittest.main()
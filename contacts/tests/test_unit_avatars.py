@@ -0,0 +1,239 @@
+import hashlib
+import io
+import os
+import tempfile
+import unittest
+
+from contacts.dependencies.cache import DiskLRUCache
+from contacts.dependencies.storage import LocalStorage
+from contacts.services import avatars
+from contacts.services.avatars import (AvatarUpload, NotAnImage, UploadTooLarge, image_format, make_avatars,
+                                       receive_avatar, spool_image, store_avatar)
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'\x00' * 24
+BOUNDARY = 'xYzZy'
+CONTENT_TYPE = f'multipart/form-data; boundary={BOUNDARY}'
+
+
+async def byte_chunks(data, size=1):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+def multipart(*parts):
+    body = b''
+    for name, filename, data in parts:
+        disposition = f'form-data; name="{name}"' + (f'; filename="{filename}"' if filename else '')
+        body += f'--{BOUNDARY}\r\nContent-Disposition: {disposition}\r\n\r\n'.encode() + data + b'\r\n'
+    return body + f'--{BOUNDARY}--\r\n'.encode()
+
+
+class TestImageFormat(unittest.TestCase):
+    def test_known_formats(self):
+        self.assertEqual(image_format(b'\xff\xd8\xff\xe0' + b'\x00' * 8), 'jpeg')
+        self.assertEqual(image_format(PNG), 'png')
+        self.assertEqual(image_format(b'GIF89a' + b'\x00' * 6), 'gif')
+        self.assertEqual(image_format(b'RIFF\x00\x00\x00\x00WEBPVP8 '), 'webp')
+
+    def test_other_files(self):
+        self.assertIsNone(image_format(b'<svg xmlns="'))
+        self.assertIsNone(image_format(b'RIFF\x00\x00\x00\x00WAVE'))
+        self.assertIsNone(image_format(b''))
+
+
+class TestReceiveAvatar(unittest.IsolatedAsyncioTestCase):
+    async def receive(self, body, size=7, max_bytes=1024):
+        upload = await receive_avatar(CONTENT_TYPE, byte_chunks(body, size), max_bytes=max_bytes)
+        self.addCleanup(upload.remove)
+        return upload
+
+    async def test_file_part_is_spooled(self):
+        upload = await self.receive(multipart(('note', None, b'skipped'), ('file', 'me.png', PNG)))
+
+        with open(upload.path, 'rb') as file:
+            self.assertEqual(file.read(), PNG)
+        self.assertEqual((upload.filename, upload.format, upload.digest),
+                         ('me.png', 'png', hashlib.sha256(PNG).hexdigest()))
+
+    async def test_too_large_is_cut_off(self):
+        consumed = []
+
+        async def body():
+            async for chunk in byte_chunks(multipart(('file', 'me.png', PNG + b'\x00' * 4096)), 64):
+                consumed.append(chunk)
+                yield chunk
+
+        with self.assertRaises(UploadTooLarge):
+            await receive_avatar(CONTENT_TYPE, body(), max_bytes=256)
+        self.assertLess(len(consumed), 10)
+
+    async def test_not_an_image_is_refused_on_header(self):
+        with self.assertRaises(NotAnImage):
+            await self.receive(multipart(('file', 'me.svg', b'<svg xmlns="http://www.w3.org/2000/svg"/>')))
+
+    async def test_missing_file(self):
+        with self.assertRaises(NotAnImage):
+            await self.receive(multipart(('note', None, PNG)))
+
+    async def test_not_multipart(self):
+        with self.assertRaises(ValueError):
+            await receive_avatar('application/json', byte_chunks(b'{}'))
+
+    async def test_temporary_file_is_removed_on_error(self):
+        before = set(os.listdir(tempfile.gettempdir()))
+
+        with self.assertRaises(UploadTooLarge):
+            await spool_image(byte_chunks(PNG * 4), max_bytes=len(PNG))
+        self.assertEqual({name for name in set(os.listdir(tempfile.gettempdir())) - before
+                          if name.startswith('avatar-')}, set())
+
+
+@unittest.skipUnless(avatars.PILLOW, 'Pillow is not installed')
+class TestMakeAvatars(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def image(self, mode, size, format):
+        path = os.path.join(self.directory.name, 'upload')
+        Image.new(mode, size, 'red').save(path, format)
+        return path
+
+    def test_squares_of_each_size(self):
+        path = self.image('RGBA', (800, 500), 'PNG')
+
+        made = make_avatars(path, sizes=(400, 100))
+
+        self.assertEqual([size for size, _ in made], [400, 100])
+        for size, target in made:
+            with Image.open(target) as image:
+                self.assertEqual((image.format, image.mode, image.size), ('JPEG', 'RGB', (size, size)))
+
+    def test_too_many_pixels(self):
+        with self.assertRaises(NotAnImage):
+            make_avatars(self.image('RGB', (300, 300), 'JPEG'), sizes=(100,), max_pixels=1000)
+
+    def test_broken_image(self):
+        path = os.path.join(self.directory.name, 'upload')
+        with open(path, 'wb') as file:
+            file.write(PNG)
+
+        with self.assertRaises(NotAnImage):
+            make_avatars(path, sizes=(100,))
+
+    async def spooled(self, color='blue'):
+        buffer = io.BytesIO()
+        Image.new('RGB', (640, 480), color).save(buffer, 'JPEG')
+        path, format, digest = await spool_image(byte_chunks(buffer.getvalue(), 1024))
+        upload = AvatarUpload(path, 'me.jpg', format, digest)
+        self.addCleanup(upload.remove)
+        return upload
+
+    async def test_store_avatar(self):
+        upload = await self.spooled()
+        storage = CountingStorage(os.path.join(self.directory.name, 'media'), 'https://cdn.example.com/media')
+        cache = DiskLRUCache(os.path.join(self.directory.name, 'cache'), 1024 * 1024)
+
+        urls = await store_avatar(upload, storage, cache=cache)
+
+        self.assertEqual(urls, {size: f'https://cdn.example.com/media/avatars/{upload.digest}_{size}.jpg'
+                                for size in (400, 100)})
+        self.assertEqual(len(storage.saved), 2)
+        self.assertEqual(cache.snapshot()['files'], 2)
+        self.assertEqual([name for name in os.listdir(tempfile.gettempdir())
+                          if name.startswith(os.path.basename(upload.path) + '_')], [])
+
+    async def test_known_avatars_are_reused(self):
+        upload = await self.spooled()
+        storage = CountingStorage(self.directory.name)
+        cache = DiskLRUCache(os.path.join(self.directory.name, 'cache'), 1024 * 1024)
+        known = {400: 'https://cdn.example.com/400.jpg'}
+
+        urls = await store_avatar(upload, storage, known=known, cache=cache)
+
+        self.assertEqual(urls[400], 'https://cdn.example.com/400.jpg')
+        self.assertEqual([key for _, key in storage.saved], [f'avatars/{upload.digest}_100'])
+        self.assertEqual(await store_avatar(upload, storage, known=urls, cache=cache), urls)
+        self.assertEqual(len(storage.saved), 1)
+
+    async def test_cached_avatars_are_not_made_again(self):
+        upload = await self.spooled()
+        storage = CountingStorage(self.directory.name)
+        cache = DiskLRUCache(os.path.join(self.directory.name, 'cache'), 1024 * 1024)
+        urls = await store_avatar(upload, storage, cache=cache)
+        upload.remove()
+
+        self.assertEqual(await store_avatar(upload, storage, cache=cache), urls)
+        self.assertEqual(len(storage.saved), 4)
+        self.assertEqual((cache.hits, cache.misses), (2, 2))
+
+
+class CountingStorage(LocalStorage):
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.saved = []
+
+    async def save(self, path, key):
+        self.saved.append((path, key))
+        return await super().save(path, key)
+
+
+class TestDiskLRUCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.cache = DiskLRUCache(os.path.join(self.directory.name, 'cache'), 250)
+
+    def source(self, size):
+        path = os.path.join(self.directory.name, 'source')
+        with open(path, 'wb') as file:
+            file.write(b'x' * size)
+        return path
+
+    def test_hits_and_misses(self):
+        self.assertIsNone(self.cache.get('a'))
+        path = self.cache.put('a', self.source(100))
+
+        self.assertEqual(self.cache.get('a'), path)
+        with open(path, 'rb') as file:
+            self.assertEqual(len(file.read()), 100)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_least_recently_used_is_evicted_by_size(self):
+        for key in 'ab':
+            self.cache.put(key, self.source(100))
+        self.cache.get('a')
+        self.cache.put('c', self.source(100))
+
+        self.assertIsNone(self.cache.get('b'))
+        self.assertIsNotNone(self.cache.get('a'))
+        self.assertEqual(sorted(os.listdir(self.cache.directory)), ['a', 'c'])
+        self.assertEqual((self.cache.snapshot()['bytes'], self.cache.evictions), (200, 1))
+
+    def test_existing_files_are_picked_up(self):
+        self.cache.put('a', self.source(100))
+        self.cache.put('b', self.source(100))
+
+        reopened = DiskLRUCache(self.cache.directory, 250)
+        reopened.put('c', self.source(100))
+
+        self.assertEqual(sorted(os.listdir(self.cache.directory)), ['b', 'c'])
+
+    def test_deleted_file_is_a_miss(self):
+        os.remove(self.cache.put('a', self.source(100)))
+
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(self.cache.snapshot()['bytes'], 0)
+
+    def test_key_cannot_leave_the_directory(self):
+        with self.assertRaises(ValueError):
+            self.cache.get('../a')
+
+
+if __name__ == '__main__':
+    unittest.main()
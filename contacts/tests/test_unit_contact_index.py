@@ -0,0 +1,140 @@
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from contacts.dependencies.contact_index import CONTACT_INDEX, ContactIndex, TenantIndex
+from contacts.models.contacts_model import ContactModel
+from contacts.repository.contacts_repo import ContactsRepo
+from contacts.schemas.contacts_schemas import Contact, ContactCreate
+from contacts.services.contacts_service import ContactService
+
+
+def make_contact(id, first_name, last_name, phone_number):
+    return Contact(id=id, first_name=first_name, last_name=last_name, email=None, phone_number=phone_number,
+                   birthday=None, favorite=False)
+
+
+async def chunks(*contacts):
+    yield list(contacts)
+
+
+class TestTenantIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = TenantIndex([
+            make_contact(1, 'John', 'Smith', '+38 (067) 111-22-33'),
+            make_contact(2, 'Johanna', 'Doe', '+380501112233'),
+            make_contact(3, 'Anna', 'Johnson', '+380679998877'),
+        ])
+
+    def ids(self, **kwargs):
+        return [contact.id for contact in self.index.lookup(**kwargs)]
+
+    def test_name_prefix(self):
+        self.assertEqual(self.ids(name='joh'), [2, 1, 3])
+        self.assertEqual(self.ids(name='JOHN'), [1, 3])
+        self.assertEqual(self.ids(name='john s'), [1])
+        self.assertEqual(self.ids(name='x'), [])
+
+    def test_phone_suffix(self):
+        self.assertEqual(sorted(self.ids(phone='1112233')), [1, 2])
+        self.assertEqual(self.ids(phone='067 111 22 33'), [1])
+        self.assertEqual(self.ids(phone='2233', name='jo'), [2, 1])
+
+    def test_name_prefix_before_astral_characters(self):
+        self.index.add(make_contact(4, 'Jo\U0001f600', 'Smith', '+380670000000'))
+        self.index.add(make_contact(5, '\U0010ffff', 'Doe', '+380670000001'))
+
+        self.assertEqual(self.ids(name='jo'), [2, 1, 3, 4])
+        self.assertEqual(self.ids(name='\U0010ffff'), [5])
+
+    def test_limit(self):
+        self.assertEqual(len(self.ids(name='j', limit=1)), 1)
+
+    def test_add_and_remove(self):
+        self.index.add(make_contact(1, 'Bob', 'Smith', '+380670000000'))
+        self.index.remove(2)
+        self.index.remove(42)
+
+        self.assertEqual(self.ids(name='jo'), [3])
+        self.assertEqual(self.ids(name='bob'), [1])
+        self.assertEqual(self.ids(phone='2233'), [])
+        self.assertEqual(len(self.index.names), 6)
+
+
+class TestContactIndex(unittest.IsolatedAsyncioTestCase):
+    async def test_tenants_are_bounded(self):
+        contact_index = ContactIndex(max_tenants=2, ttl=60)
+        for user_email in ('a', 'b', 'c'):
+            await contact_index.load(user_email, chunks())
+
+        self.assertEqual(list(contact_index.tenants), ['b', 'c'])
+
+    async def test_index_expires(self):
+        contact_index = ContactIndex(max_tenants=2, ttl=60)
+        with patch('contacts.dependencies.contact_index.time.monotonic', return_value=100):
+            await contact_index.load('a', chunks())
+        with patch('contacts.dependencies.contact_index.time.monotonic', return_value=161):
+            self.assertIsNone(contact_index.get('a'))
+
+    async def test_build_racing_with_a_write_is_discarded(self):
+        contact_index = ContactIndex(max_tenants=2, ttl=60)
+
+        async def racing_chunks():
+            contact_index.removed('a', 1)
+            yield [ContactModel(id=1, first_name='John', last_name='Smith', phone_number='1')]
+
+        index = await contact_index.load('a', racing_chunks())
+
+        self.assertEqual(len(index.contacts), 1)
+        self.assertIsNone(contact_index.get('a'))
+
+    async def test_disabled_index_is_not_kept(self):
+        contact_index = ContactIndex(max_tenants=0, ttl=60)
+        await contact_index.load('a', chunks())
+
+        self.assertIsNone(contact_index.get('a'))
+
+
+class TestContactIndexHooks(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        CONTACT_INDEX.clear()
+        self.user_email = 'test@example.com'
+        self.session = MagicMock(spec=AsyncSession)
+        self.repo = ContactsRepo(self.session)
+        self.repo.next_seq = AsyncMock(return_value=1)
+        self.repo.add_changes = AsyncMock()
+        self.repo.stream_all = MagicMock(return_value=chunks(
+            ContactModel(id=1, first_name='John', last_name='Smith', phone_number='+380671112233')))
+        self.service = ContactService(self.session)
+        self.service.repo = self.repo
+
+    def tearDown(self):
+        CONTACT_INDEX.clear()
+
+    async def test_index_is_built_once_and_follows_changes(self):
+        self.assertEqual([c.id for c in await self.service.lookup(self.user_email, phone='2233')], [1])
+
+        self.session.scalar.side_effect = [
+            ContactModel(id=2, first_name='Jane', last_name='Doe', phone_number='+380502222233'),
+            ContactModel(id=1, first_name='John', last_name='Smith', phone_number='+380671112233'),
+        ]
+        await self.repo.create(ContactCreate(first_name='Jane', last_name='Doe', phone_number='+380502222233'),
+                               self.user_email)
+        await self.repo.remove(1, self.user_email)
+
+        self.assertEqual([c.first_name for c in await self.service.lookup(self.user_email, phone='2233')], ['Jane'])
+        self.repo.stream_all.assert_called_once()
+
+    async def test_bulk_create_invalidates(self):
+        await self.service.lookup(self.user_email, name='j')
+        self.session.get_bind.return_value.dialect.driver = 'aiosqlite'
+        self.session.scalars.return_value.all = MagicMock(return_value=[2])
+        await self.repo.bulk_create([ContactCreate(first_name='Jane', last_name='Doe', phone_number='1')],
+                                    self.user_email)
+
+        self.assertIsNone(CONTACT_INDEX.get(self.user_email))
+
+
+if __name__ == '__main__':
+    unittest.main()
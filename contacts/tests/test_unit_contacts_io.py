@@ -0,0 +1,226 @@
+import gzip
+import json
+import unittest
+from datetime import date
+
+from sqlalchemy import event, insert, select
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from contacts.dependencies.database import Base
+from contacts.models.contacts_model import ContactModel
+from contacts.models.user import UserModel
+from contacts.schemas.contacts_schemas import Contact
+from contacts.services.contacts_io import (detect_format, parse_csv, parse_json_array, parse_ndjson, format_csv,
+                                           format_ndjson, format_vcf)
+from contacts.services.contacts_service import ContactService
+
+
+async def byte_chunks(data, size=1):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+async def collect(rows):
+    return [row async for row in rows]
+
+
+class TestParsers(unittest.IsolatedAsyncioTestCase):
+    async def test_csv_across_chunk_boundaries(self):
+        data = 'first_name,last_name,phone_number\r\nJohn,Doe,123\r\n"Jane ""J""","Multi\nline",\r\n'.encode()
+
+        rows = await collect(parse_csv(byte_chunks(data)))
+
+        self.assertEqual(rows, [
+            {'first_name': 'John', 'last_name': 'Doe', 'phone_number': '123'},
+            {'first_name': 'Jane "J"', 'last_name': 'Multi\nline', 'phone_number': None},
+        ])
+
+    async def test_csv_without_trailing_newline_and_bom(self):
+        data = '\ufefffirst_name,last_name\nJöhn,Doe'.encode()
+
+        rows = await collect(parse_csv(byte_chunks(data, size=3)))
+
+        self.assertEqual(rows, [{'first_name': 'Jöhn', 'last_name': 'Doe'}])
+
+    async def test_json_array(self):
+        items = [{'first_name': 'A', 'n': 12345}, {'first_name': 'B,]'}, 42, 'x']
+        data = json.dumps(items).encode()
+
+        self.assertEqual(await collect(parse_json_array(byte_chunks(data))), items)
+        self.assertEqual(await collect(parse_json_array(byte_chunks(b' [ ] '))), [])
+
+    async def test_json_array_errors(self):
+        with self.assertRaises(ValueError):
+            await collect(parse_json_array(byte_chunks(b'{"a": 1}')))
+        with self.assertRaises(ValueError):
+            await collect(parse_json_array(byte_chunks(b'[{"a": 1}, {"b"')))
+
+    async def test_json_array_reports_bad_elements(self):
+        data = b'[{"a": 1,}, {"b": "x,]\\""}, {"c": 1 2}, {"d": tru}, {"e": 2}]'
+
+        for size in (1, 3, len(data)):
+            with self.subTest(size=size):
+                rows = await collect(parse_json_array(byte_chunks(data, size=size)))
+
+                self.assertEqual([row if not isinstance(row, ValueError) else None for row in rows],
+                                 [None, {'b': 'x,]"'}, None, None, {'e': 2}])
+
+    async def test_ndjson_reports_bad_lines(self):
+        data = b'{"a": 1}\n\nnot json\n{"b": 2}'
+
+        rows = await collect(parse_ndjson(byte_chunks(data, size=4)))
+
+        self.assertEqual(rows[0], {'a': 1})
+        self.assertIsInstance(rows[1], ValueError)
+        self.assertEqual(rows[2], {'b': 2})
+
+    async def test_only_newlines_end_lines(self):
+        # raw control characters are not allowed in JSON strings, so \x0c is only tried in CSV
+        ndjson = '{"first_name": "A\u2028B", "last_name": "C\x85D"}\r\n{"first_name": "E"}\n'.encode()
+        csv_data = 'first_name,last_name\nA\u2028B,C\x0cD\n'.encode()
+
+        self.assertEqual(await collect(parse_ndjson(byte_chunks(ndjson, size=4))),
+                         [{'first_name': 'A\u2028B', 'last_name': 'C\x85D'}, {'first_name': 'E'}])
+        self.assertEqual(await collect(parse_csv(byte_chunks(csv_data, size=4))),
+                         [{'first_name': 'A\u2028B', 'last_name': 'C\x0cD'}])
+
+    def test_detect_format(self):
+        self.assertEqual(detect_format('text/csv; charset=utf-8', b'[1]'), 'csv')
+        self.assertEqual(detect_format(None, b'  [{"a": 1}]'), 'json')
+        self.assertEqual(detect_format('application/octet-stream', b'{"a": 1}\n'), 'ndjson')
+        self.assertEqual(detect_format(None, b'first_name,last_name'), 'csv')
+
+    async def test_csv_export_round_trip(self):
+        contacts = [Contact(id=1, first_name='Jane, "J"', last_name='Doe', email=None, phone_number='1',
+                            birthday=date(1990, 2, 14), favorite=True)]
+
+        rows = await collect(parse_csv(byte_chunks(format_csv(contacts, header=True).encode(), size=5)))
+
+        self.assertEqual(rows, [{'id': '1', 'first_name': 'Jane, "J"', 'last_name': 'Doe', 'email': None,
+                                 'phone_number': '1', 'birthday': '1990-02-14', 'favorite': 'true'}])
+
+    async def test_ndjson_export_round_trip(self):
+        contacts = [Contact(id=1, first_name='Jane\u2028J', last_name='Doe\u2029', email=None, phone_number='1',
+                            birthday=date(1990, 2, 14), favorite=True)]
+        data = format_ndjson(contacts)
+
+        self.assertNotIn('\u2028', data)
+        self.assertEqual(await collect(parse_ndjson(byte_chunks(data.encode(), size=5))),
+                         [contacts[0].model_dump(mode='json')])
+
+    def test_vcf(self):
+        contacts = [Contact(id=1, first_name='Jane', last_name='Doe;Smith', email='jane@example.com',
+                            phone_number='+380671234567', birthday=date(1990, 2, 14), favorite=False)]
+
+        self.assertEqual(format_vcf(contacts), 'BEGIN:VCARD\r\nVERSION:3.0\r\nN:Doe\\;Smith;Jane;;;\r\n'
+                                               'FN:Jane Doe\\;Smith\r\nTEL;TYPE=CELL:+380671234567\r\n'
+                                               'EMAIL;TYPE=INTERNET:jane@example.com\r\nBDAY:1990-02-14\r\n'
+                                               'END:VCARD\r\n')
+
+
+class TestImportContacts(unittest.IsolatedAsyncioTestCase):
+    user_email = 'tenant@example.com'
+
+    async def asyncSetUp(self):
+        self.engine = create_async_engine('sqlite+aiosqlite://', poolclass=StaticPool)
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.execute(insert(UserModel), [{'email': self.user_email}])
+        self.statements = []
+        event.listen(self.engine.sync_engine, 'before_cursor_execute', self._record)
+        self.session = async_sessionmaker(bind=self.engine, expire_on_commit=False)()
+
+    async def asyncTearDown(self):
+        await self.session.close()
+        await self.engine.dispose()
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    async def test_ndjson_import_in_batches(self):
+        lines = [json.dumps({'first_name': f'First{n}', 'last_name': f'Last{n}', 'phone_number': f'{n}',
+                             'birthday': '1990-02-14'}) for n in range(25)]
+        data = '\n'.join(lines).encode()
+
+        result = await ContactService(self.session).import_contacts(byte_chunks(data, size=100), self.user_email,
+                                                                    batch_size=10)
+
+        self.assertEqual((result.format, result.inserted, result.errors), ('ndjson', 25, []))
+        inserts = [statement for statement in self.statements if statement.startswith('INSERT INTO contacts ')]
+        self.assertEqual(len(inserts), 3)
+        contacts = (await self.session.scalars(select(ContactModel).order_by(ContactModel.id))).all()
+        self.assertEqual(len(contacts), 25)
+        self.assertEqual((contacts[0].birthday, contacts[0].birthday_md, contacts[0].favorite),
+                         (date(1990, 2, 14), 214, False))
+        self.assertEqual({contact.user_email for contact in contacts}, {self.user_email})
+
+    async def test_invalid_rows_are_reported_and_skipped(self):
+        data = ('first_name,last_name,phone_number,birthday\n'
+                'John,Doe,123,\n'
+                ',Doe,123,\n'
+                'Jane,Doe,,\n'
+                'Jim,Doe,456,not a date\n'
+                'Jack,Doe,789,2000-01-01\n').encode()
+
+        result = await ContactService(self.session).import_contacts(byte_chunks(data, size=7), self.user_email,
+                                                                    content_type='text/csv')
+
+        self.assertEqual(result.inserted, 2)
+        self.assertEqual([error.row for error in result.errors], [2, 3, 4])
+        self.assertEqual(result.errors[1].errors, [{'loc': ['phone_number'], 'msg': 'Field required'}])
+        self.assertEqual(result.errors[2].errors[0]['loc'], ['birthday'])
+
+    async def test_malformed_json_element_is_reported_by_row(self):
+        data = (b'[{"first_name": "A", "last_name": "B", "phone_number": "1"}, {"first_name": "C",},'
+                b' {"first_name": "D", "last_name": "E", "phone_number": "2"}]')
+
+        result = await ContactService(self.session).import_contacts(byte_chunks(data, size=16), self.user_email)
+
+        self.assertEqual((result.inserted, [error.row for error in result.errors]), (2, [2]))
+
+    async def test_malformed_document_keeps_written_batches(self):
+        data = b'[{"first_name": "A", "last_name": "B", "phone_number": "1"}, {"first_name": '
+
+        result = await ContactService(self.session).import_contacts(byte_chunks(data, size=16), self.user_email,
+                                                                    batch_size=1)
+
+        self.assertEqual(result.inserted, 1)
+        self.assertEqual(result.errors[0].row, 2)
+
+
+    async def seed(self, count):
+        async with self.engine.begin() as conn:
+            await conn.execute(insert(ContactModel), [
+                {'first_name': f'First{n}', 'last_name': f'Last{n}', 'phone_number': f'{n}',
+                 'user_email': self.user_email}
+                for n in range(count)
+            ])
+
+    async def test_export_streams_in_chunks(self):
+        await self.seed(5)
+
+        chunks = await collect(ContactService(self.session).export_contacts(self.user_email, 'csv', chunk_size=2))
+
+        self.assertEqual(len(chunks), 4)
+        rows = await collect(parse_csv(byte_chunks(b''.join(chunks), size=64)))
+        self.assertEqual([row['first_name'] for row in rows], [f'First{n}' for n in range(5)])
+
+    async def test_gzip_export(self):
+        await self.seed(3)
+        service = ContactService(self.session)
+
+        plain = b''.join(await collect(service.export_contacts(self.user_email, 'vcf')))
+        compressed = b''.join(await collect(service.export_contacts(self.user_email, 'vcf', compress=True)))
+
+        self.assertEqual(gzip.decompress(compressed), plain)
+        self.assertEqual(plain.count(b'BEGIN:VCARD'), 3)
+
+    async def test_empty_csv_export_has_header(self):
+        chunks = await collect(ContactService(self.session).export_contacts(self.user_email, 'csv'))
+
+        self.assertEqual(chunks, [b'id,first_name,last_name,email,phone_number,birthday,favorite\r\n'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import smtplib
+import socket
+import unittest
+from unittest.mock import MagicMock, patch
+
+from contacts.dependencies.emails import EmailOutbox
+
+try:
+    from aiosmtpd.controller import Controller
+except ImportError:
+    Controller = None
+
+
+class RecordingHandler:
+    def __init__(self):
+        self.messages = []
+        self.connections = 0
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        self.connections += 1
+        session.host_name = hostname
+        return responses
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append((envelope.mail_from, envelope.rcpt_tos, envelope.content))
+        return '250 Message accepted for delivery'
+
+
+@unittest.skipIf(Controller is None, "aiosmtpd is not installed")
+class TestEmailOutboxDelivery(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            port = sock.getsockname()[1]
+        self.handler = RecordingHandler()
+        self.controller = Controller(self.handler, hostname='127.0.0.1', port=port)
+        self.controller.start()
+        self.outbox = EmailOutbox('127.0.0.1', port, sender='noreply@example.com', use_tls=False, workers=1)
+
+    def tearDown(self):
+        self.controller.stop()
+
+    async def test_messages_share_one_connection(self):
+        for n in range(5):
+            self.outbox.put('Email activation', f'Your OTP is {n}', f'user{n}@example.com')
+        await self.outbox.stop()
+
+        self.assertEqual(len(self.handler.messages), 5)
+        self.assertEqual(self.handler.connections, 1)
+        self.assertEqual(self.handler.messages[0][:2], ('noreply@example.com', ['user0@example.com']))
+
+
+class TestEmailOutboxRetries(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.outbox = EmailOutbox('smtp.example.com', 587, sender='noreply@example.com', workers=1,
+                                  max_retries=2, backoff=0)
+
+    async def test_reconnects_when_connection_dropped(self):
+        stale, fresh = MagicMock(), MagicMock()
+        stale.sendmail.side_effect = smtplib.SMTPServerDisconnected('gone')
+        with patch.object(self.outbox, 'connect', side_effect=[stale, fresh]):
+            self.outbox.put('subject', 'body', 'user@example.com')
+            await self.outbox.stop()
+
+        fresh.sendmail.assert_called_once()
+
+    async def test_retries_with_backoff_then_gives_up(self):
+        server = MagicMock()
+        server.sendmail.side_effect = smtplib.SMTPRecipientsRefused({})
+        with patch.object(self.outbox, 'connect', return_value=server):
+            self.outbox.put('subject', 'body', 'user@example.com')
+            await self.outbox.stop()
+
+        self.assertEqual(server.sendmail.call_count, 3)
+
+    async def test_connection_is_closed_after_unexpected_error(self):
+        server = MagicMock()
+        server.sendmail.side_effect = [None, ValueError('bad message'), None]
+        with patch.object(self.outbox, 'connect', return_value=server):
+            self.outbox.put('subject', 'body', 'user@example.com')
+            await self.outbox.queue.join()
+            self.outbox.put('subject', 'body', 'user@example.com')
+            await self.outbox.stop()
+
+        server.quit.assert_called()
+        self.assertEqual(server.sendmail.call_count, 3)
+
+    def test_connect_has_a_timeout(self):
+        outbox = EmailOutbox('smtp.example.com', 465, timeout=5)
+        with patch.object(smtplib, 'SMTP_SSL') as smtp:
+            outbox.connect()
+
+        smtp.assert_called_once_with('smtp.example.com', 465, timeout=5)
+
+    async def test_put_does_not_block_on_smtp(self):
+        with patch.object(self.outbox, 'connect') as connect:
+            self.outbox.put('subject', 'body', 'user@example.com')
+            connect.assert_not_called()
+            await self.outbox.stop()
+        connect.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import unittest
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from contacts.dependencies.auth import get_current_user_email
+from contacts.dependencies.database import Base, get_db
+from contacts.dependencies.etag import etag_matches
+from contacts.dependencies.rate_limiter import rate_limit
+from contacts.main import app
+from contacts.models.user import UserModel
+from contacts.schemas.contacts_schemas import ContactBatchUpdate, ContactCreate, ContactPatch, ContactFilter, \
+    ContactUpdate
+from contacts.services.contacts_service import ContactService
+
+
+class TestEtagMatches(unittest.TestCase):
+    def test_weak_comparison(self):
+        self.assertTrue(etag_matches('W/"1-a"', 'W/"1-a"'))
+        self.assertTrue(etag_matches('"1-a"', 'W/"1-a"'))
+        self.assertTrue(etag_matches('"x", W/"1-a"', 'W/"1-a"'))
+        self.assertTrue(etag_matches('*', 'W/"1-a"'))
+        self.assertFalse(etag_matches('W/"1-b"', 'W/"1-a"'))
+        self.assertFalse(etag_matches(None, 'W/"1-a"'))
+
+
+class TestContactEtags(unittest.IsolatedAsyncioTestCase):
+    user_email = 'tenant@example.com'
+
+    async def asyncSetUp(self):
+        self.engine = create_async_engine('sqlite+aiosqlite://', poolclass=StaticPool)
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.execute(insert(UserModel), [{'email': self.user_email}])
+        self.session = async_sessionmaker(bind=self.engine, expire_on_commit=False)()
+        self.service = ContactService(self.session)
+
+    async def asyncTearDown(self):
+        await self.session.close()
+        await self.engine.dispose()
+
+    async def test_collection_etag_follows_changes(self):
+        etags = [await self.service.get_collection_etag(self.user_email)]
+        first = await self.service.create_contact(ContactCreate(first_name='A', last_name='B', phone_number='1'),
+                                                  self.user_email)
+        second = await self.service.create_contact(ContactCreate(first_name='C', last_name='D', phone_number='2'),
+                                                   self.user_email)
+        etags.append(await self.service.get_collection_etag(self.user_email))
+        self.assertEqual(await self.service.get_collection_etag(self.user_email), etags[-1])
+
+        await self.service.batch_update(ContactBatchUpdate(where=ContactFilter(ids=[first.id]),
+                                                           values=ContactPatch(favorite=True)), self.user_email)
+        etags.append(await self.service.get_collection_etag(self.user_email))
+        await self.service.remove(second.id, self.user_email)
+        etags.append(await self.service.get_collection_etag(self.user_email))
+
+        self.assertEqual(len(set(etags)), 4)
+
+    async def test_contact_not_modified(self):
+        contact = await self.service.create_contact(ContactCreate(first_name='A', last_name='B', phone_number='1'),
+                                                    self.user_email)
+        etag, fetched = await self.service.get_if_modified(contact.id, self.user_email)
+        self.assertEqual(fetched.first_name, 'A')
+
+        with patch('contacts.services.contacts_service.Contact.from_orm') as from_orm:
+            self.assertEqual(await self.service.get_if_modified(contact.id, self.user_email, etag), (etag, None))
+        from_orm.assert_not_called()
+
+        await self.service.repo.update(ContactPatch(first_name='Z'), contact.id, self.user_email)
+        new_etag, fetched = await self.service.get_if_modified(contact.id, self.user_email, etag)
+        self.assertNotEqual(new_etag, etag)
+        self.assertEqual(fetched.first_name, 'Z')
+
+
+    async def test_missing_contact(self):
+        update = ContactUpdate(first_name='Z', last_name=None, email=None, phone_number=None, birthday=None,
+                               favorite=None)
+
+        self.assertIsNone(await self.service.get_if_modified(404, self.user_email, '*'))
+        self.assertIsNone(await self.service.get_by_id(404, self.user_email))
+        self.assertIsNone(await self.service.update(update, 404, self.user_email))
+        self.assertIsNone(await self.service.remove(404, self.user_email))
+
+    async def test_missing_contact_is_404(self):
+        update = ContactUpdate(first_name='Z', last_name=None, email=None, phone_number=None, birthday=None,
+                               favorite=None)
+        overrides = dict(app.dependency_overrides)
+        self.addCleanup(lambda: setattr(app, 'dependency_overrides', overrides))
+        app.dependency_overrides.update({get_db: lambda: self.session, rate_limit: lambda: True,
+                                         get_current_user_email: lambda: self.user_email})
+        contact = await self.service.create_contact(ContactCreate(first_name='A', last_name='B', phone_number='1'),
+                                                    self.user_email)
+        client = TestClient(app)
+
+        self.assertEqual(client.get('/contacts/404').status_code, 404)
+        self.assertEqual(client.put('/contacts/404', json=update.model_dump()).status_code, 404)
+        self.assertEqual(client.put(f'/contacts/{contact.id}', json=dict(update.model_dump(), last_name='B',
+                                                                         phone_number='1')).json()['first_name'], 'Z')
+        self.assertEqual(client.delete(f'/contacts/{contact.id}').status_code, 200)
+        self.assertEqual(client.delete(f'/contacts/{contact.id}').status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+import asyncio
+import os
+import tempfile
+import unittest
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from contacts.dependencies.database import Base
+from contacts.dependencies.jobs import DONE, FAILED, QUEUED, RUNNING, DatabaseJobStore, Job, JobQueue, \
+    MemoryJobStore
+from contacts.models.user import UserModel
+
+
+class TestJobQueue(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.release = asyncio.Event()
+        self.cleaned = []
+
+    async def handler(self, job):
+        await self.release.wait()
+        if job.path == 'broken':
+            raise ValueError('The image cannot be read')
+        if job.path == 'crash':
+            raise RuntimeError('connection reset')
+        return f'https://cdn.example.com/{job.path}'
+
+    def queue(self, store=None):
+        queue = JobQueue(self.handler, store or MemoryJobStore(), workers=2, cleanup=self.cleaned.append)
+        self.addAsyncCleanup(queue.stop)
+        return queue
+
+    async def test_submit_returns_before_the_job_runs(self):
+        queue = self.queue()
+
+        job = await queue.submit('user@example.com', 'a.png', 'me.png')
+        await asyncio.sleep(0)
+
+        self.assertEqual((await queue.get(job.id)).status, RUNNING)
+        self.release.set()
+        await queue.stop()
+        done = await queue.get(job.id)
+        self.assertEqual((done.status, done.result, done.error), (DONE, 'https://cdn.example.com/a.png', None))
+        self.assertEqual(self.cleaned, [done])
+
+    async def test_failures_are_recorded(self):
+        queue = self.queue()
+        self.release.set()
+
+        broken = await queue.submit('user@example.com', 'broken')
+        crash = await queue.submit('user@example.com', 'crash')
+        await queue.stop()
+
+        self.assertEqual(((await queue.get(broken.id)).status, (await queue.get(broken.id)).error),
+                         (FAILED, 'The image cannot be read'))
+        self.assertEqual((await queue.get(crash.id)).error, 'There was an error processing the job')
+        self.assertEqual(len(self.cleaned), 2)
+
+    async def test_unknown_job(self):
+        self.assertIsNone(await self.queue().get('missing'))
+
+
+class TestDatabaseJobStore(unittest.IsolatedAsyncioTestCase):
+    user_email = 'user@example.com'
+
+    async def asyncSetUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.engine = create_async_engine(f'sqlite+aiosqlite:///{os.path.join(self.directory.name, "jobs.db")}')
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.execute(insert(UserModel), [{'email': self.user_email}])
+        self.store = DatabaseJobStore(async_sessionmaker(bind=self.engine), ttl=60)
+
+    async def asyncTearDown(self):
+        await self.engine.dispose()
+        self.directory.cleanup()
+
+    async def test_status_is_saved(self):
+        job = Job(self.user_email, '/tmp/avatar-1', 'me.png')
+        await self.store.add(job)
+        job.status, job.result = DONE, 'https://cdn.example.com/me.jpg'
+        await self.store.save(job)
+
+        stored = await self.store.get(job.id)
+
+        self.assertEqual((stored.user_email, stored.filename, stored.status, stored.result),
+                         (self.user_email, 'me.png', DONE, 'https://cdn.example.com/me.jpg'))
+        self.assertIsNone(await self.store.get('missing'))
+
+    async def test_unfinished_jobs_are_run_after_restart(self):
+        finished = Job(self.user_email, 'done', status=DONE)
+        queued = Job(self.user_email, 'queued')
+        running = Job(self.user_email, 'running', status=RUNNING)
+        for job in (finished, queued, running):
+            await self.store.add(job)
+
+        async def handler(job):
+            return job.path
+
+        queue = JobQueue(handler, self.store)
+        self.assertEqual(await queue.recover(), 2)
+        await queue.stop()
+
+        self.assertEqual([(await self.store.get(job.id)).result for job in (queued, running)], ['queued', 'running'])
+        self.assertEqual((await self.store.get(finished.id)).status, DONE)
+
+    async def test_old_finished_jobs_are_deleted(self):
+        old = Job(self.user_email, 'old', status=FAILED)
+        old.updated_at = old.updated_at.replace(year=2000)
+        waiting = Job(self.user_email, 'waiting', status=QUEUED)
+        waiting.updated_at = old.updated_at
+        await self.store.add(old)
+        await self.store.add(waiting)
+
+        await self.store.add(Job(self.user_email, 'new'))
+
+        self.assertIsNone(await self.store.get(old.id))
+        self.assertIsNotNone(await self.store.get(waiting.id))
+
+
+if __name__ == '__main__':
+    unittest.main()
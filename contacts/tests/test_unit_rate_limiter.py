@@ -0,0 +1,111 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+from fastapi import HTTPException
+
+from contacts.dependencies.rate_limiter import RateLimiter, InMemoryBackend, SharedStoreBackend
+
+
+class FakeStore:
+    """
+    In-memory stand-in for the subset of the Redis API used by SharedStoreBackend.
+    """
+    def __init__(self):
+        self.data = {}
+        self.ttl = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def incr(self, key):
+        self.data[key] = self.data.get(key, 0) + 1
+        return self.data[key]
+
+    async def decr(self, key):
+        self.data[key] = self.data.get(key, 0) - 1
+        return self.data[key]
+
+    async def expire(self, key, seconds):
+        self.ttl[key] = seconds
+
+
+class BackendTests:
+    def make_backend(self):
+        raise NotImplementedError
+
+    async def asyncSetUp(self):
+        self.backend = self.make_backend()
+        self.limiter = RateLimiter(3, 60, backend=self.backend)
+
+    async def hits(self, now, count, client='1.1.1.1'):
+        with patch('contacts.dependencies.rate_limiter.time.time', return_value=now):
+            return [await self.limiter.is_allowed(client) for _ in range(count)]
+
+    async def test_limit_within_window(self):
+        self.assertEqual(await self.hits(1000, 4), [True, True, True, False])
+
+    async def test_clients_are_counted_separately(self):
+        await self.hits(1000, 3)
+        self.assertEqual(await self.hits(1000, 1, client='2.2.2.2'), [True])
+
+    async def test_window_slides(self):
+        # at 1030 the three hits made at 1010 in the previous fixed window still count as 2.5,
+        # by 1081 they have slid out and only the one made at 1030 is left, weighted 59/60
+        await self.hits(1010, 3)
+        self.assertEqual(await self.hits(1030, 2), [True, False])
+        self.assertEqual(await self.hits(1081, 4), [True, True, True, False])
+
+    async def test_scopes_are_separate(self):
+        other = RateLimiter(1, 60, scope='upload', backend=self.backend)
+        await self.hits(1000, 3)
+        with patch('contacts.dependencies.rate_limiter.time.time', return_value=1000):
+            self.assertTrue(await other.is_allowed('1.1.1.1'))
+            self.assertFalse(await other.is_allowed('1.1.1.1'))
+
+    async def test_dependency_raises_429(self):
+        request = MagicMock()
+        request.client.host = '1.1.1.1'
+        await self.hits(1000, 3)
+        with patch('contacts.dependencies.rate_limiter.time.time', return_value=1000):
+            with self.assertRaises(HTTPException) as error:
+                await self.limiter(request)
+        self.assertEqual(error.exception.status_code, 429)
+
+
+class TestInMemoryBackend(BackendTests, unittest.IsolatedAsyncioTestCase):
+    def make_backend(self):
+        return InMemoryBackend(max_clients=100)
+
+    async def test_idle_clients_are_evicted(self):
+        await self.hits(1000, 1, client='idle')
+        await self.hits(1200, 1, client='active')
+
+        self.assertEqual(list(self.backend.requests), ['global:active'])
+
+    async def test_number_of_clients_is_bounded(self):
+        for n in range(150):
+            await self.hits(1000, 1, client=f'10.0.0.{n}')
+
+        self.assertEqual(len(self.backend.requests), 100)
+        self.assertIn('global:10.0.0.149', self.backend.requests)
+
+
+class TestSharedStoreBackend(BackendTests, unittest.IsolatedAsyncioTestCase):
+    def make_backend(self):
+        self.store = FakeStore()
+        return SharedStoreBackend(self.store)
+
+    async def test_workers_share_counters(self):
+        worker = RateLimiter(3, 60, backend=SharedStoreBackend(self.store))
+        await self.hits(1000, 2)
+        with patch('contacts.dependencies.rate_limiter.time.time', return_value=1000):
+            self.assertEqual([await worker.is_allowed('1.1.1.1') for _ in range(2)], [True, False])
+
+    async def test_keys_expire(self):
+        await self.hits(1000, 1)
+
+        self.assertEqual(self.store.ttl, {'rate_limit:global:1.1.1.1:16': 120})
+
+
+if __name__ == '__main__':
+    unittest.main()
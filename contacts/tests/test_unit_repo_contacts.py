@@ -1,18 +1,26 @@
 import unittest
-from unittest.mock import MagicMock
+from unittest.mock import AsyncMock, MagicMock, patch
 from datetime import date, timedelta
 
-from sqlalchemy.orm import Session
+from sqlalchemy import event, insert
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+from sqlalchemy.pool import StaticPool
 
-from contacts.models.contacts_model import ContactModel
-from contacts.repository.contacts_repo import ContactsRepo
-from contacts.schemas.contacts_schemas import ContactCreate, ContactUpdate
+from contacts.dependencies.database import Base
+from contacts.models.contacts_model import ContactModel, birthday_key
+from contacts.models.user import UserModel
+from contacts.repository.contacts_repo import ContactsRepo, contact_values, update_values
+from contacts.schemas.contacts_schemas import ContactCreate, ContactPatch, ContactUpdate
+from contacts.schemas.phone import normalize_phone
 
 
 class TestContacts(unittest.IsolatedAsyncioTestCase):
     def setUp(self):
-        self.session = MagicMock(spec=Session)
+        self.session = MagicMock(spec=AsyncSession)
         self.contacts_repo = ContactsRepo(self.session)
+        self.contacts_repo.next_seq = AsyncMock(return_value=1)
+        self.contacts_repo.add_changes = AsyncMock()
         self.user_email = "test@example.com"
 
     async def test_get_all_contacts(self):
@@ -20,18 +28,56 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
             ContactModel(),
             ContactModel()
         ]
-        self.session.query().filter().all.return_value = mock_contacts
+        self.session.scalars.return_value.all = MagicMock(return_value=mock_contacts)
 
         contacts = await self.contacts_repo.get_all(self.user_email)
         self.assertEqual(contacts, mock_contacts)
 
+    async def test_get_all_contacts_page(self):
+        mock_contacts = [ContactModel(id=11), ContactModel(id=12)]
+        self.session.scalars.return_value.all = MagicMock(return_value=mock_contacts)
+
+        contacts = await self.contacts_repo.get_all(self.user_email, limit=2, after_id=10)
+
+        stmt = self.session.scalars.await_args.args[0]
+        compiled = stmt.compile(compile_kwargs={"literal_binds": True})
+        self.assertIn("contacts.id > 10", str(compiled))
+        self.assertIn("ORDER BY contacts.id", str(compiled))
+        self.assertIn("LIMIT 2", str(compiled))
+        self.assertEqual(contacts, mock_contacts)
+
+    async def test_stream_all_contacts(self):
+        chunks = [[ContactModel(id=1), ContactModel(id=2)], [ContactModel(id=3)]]
+
+        async def partitions():
+            for chunk in chunks:
+                yield chunk
+
+        self.session.stream_scalars.return_value.partitions = MagicMock(return_value=partitions())
+
+        result = [chunk async for chunk in self.contacts_repo.stream_all(self.user_email, chunk_size=2)]
+
+        stmt = self.session.stream_scalars.await_args.args[0]
+        self.assertEqual(stmt.get_execution_options()["yield_per"], 2)
+        self.assertEqual(result, chunks)
+
     async def test_create_contact(self):
         contact_data = ContactCreate(first_name="John", last_name="Doe", phone_number="123456789")
+        self.session.scalar.return_value = ContactModel(id=1, user_email=self.user_email, first_name="John",
+                                                        last_name="Doe", phone_number="123456789")
+
         created_contact = await self.contacts_repo.create(contact_data, self.user_email)
 
-        self.session.add.return_value = None
-        self.session.commit.return_value = None
-        self.session.refresh.return_value = None
+        stmt = self.session.scalar.await_args.args[0]
+        compiled = str(stmt.compile(compile_kwargs={"literal_binds": True}))
+        self.assertIn("INSERT INTO contacts", compiled)
+        self.assertIn("'test@example.com'", compiled)
+        self.assertIn("RETURNING", compiled)
+        self.assertEqual(self.session.scalar.await_count, 1)
+        self.session.refresh.assert_not_awaited()
+        self.session.add.assert_not_called()
+        self.session.commit.assert_awaited_once()
+        self.contacts_repo.add_changes.assert_awaited_once_with(self.user_email, "insert", [1], 1)
 
         self.assertEqual(created_contact.user_email, self.user_email)
         self.assertEqual(created_contact.first_name, "John")
@@ -39,47 +85,63 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
 
     async def test_get_contact_by_id_found(self):
         contact = ContactModel
-        self.session.query().filter().first.return_value = contact
+        self.session.scalar.return_value = contact
 
         result = await self.contacts_repo.get_by_id(id=1, user_email=self.user_email)
 
         self.assertEqual(result, contact)
 
     async def test_get_contact_by_id_not_found(self):
-        self.session.query().filter().first.return_value = None
+        self.session.scalar.return_value = None
         result = await self.contacts_repo.get_by_id(id=1, user_email=self.user_email)
 
         self.assertIsNone(result)
 
     async def test_remove_contact_found(self):
         contact = ContactModel
-        self.session.query().filter().first.return_value = contact
+        self.session.scalar.return_value = contact
 
         result = await self.contacts_repo.remove(id=1, user_email=self.user_email)
 
+        stmt = self.session.scalar.await_args.args[0]
+        compiled = str(stmt.compile(compile_kwargs={"literal_binds": True}))
+        self.assertIn("DELETE FROM contacts WHERE contacts.id = 1 AND contacts.user_email = 'test@example.com'",
+                      compiled)
+        self.assertIn("RETURNING", compiled)
+        self.assertEqual(self.session.scalar.await_count, 1)
+        self.session.delete.assert_not_awaited()
+        self.contacts_repo.add_changes.assert_awaited_once_with(self.user_email, "delete", [1], 1)
         self.assertEqual(result, contact)
 
     async def test_remove_contact_not_found(self):
-        self.session.query().filter().first.return_value = None
+        self.session.scalar.return_value = None
         result = await self.contacts_repo.remove(id=1, user_email=self.user_email)
 
         self.assertIsNone(result)
+        self.contacts_repo.add_changes.assert_not_awaited()
 
     async def test_update_contact_found(self):
         contact_item = ContactUpdate(first_name='Test', last_name='Tessssst', email=None,
                                      phone_number=None, birthday=None, favorite=True)
         contact = ContactModel
-        self.session.query().filter().first.return_value = contact
+        self.session.scalar.return_value = contact
         self.session.commit.return_value = None
 
         result = await self.contacts_repo.update(contact_item, id=1, user_email=self.user_email)
 
+        stmt = self.session.scalar.await_args.args[0]
+        compiled = str(stmt.compile(compile_kwargs={"literal_binds": True}))
+        self.assertIn("UPDATE contacts SET", compiled)
+        self.assertIn("WHERE contacts.id = 1 AND contacts.user_email = 'test@example.com'", compiled)
+        self.assertIn("RETURNING", compiled)
+        self.assertEqual(self.session.scalar.await_count, 1)
+        self.contacts_repo.add_changes.assert_awaited_once_with(self.user_email, "update", [1], 1)
         self.assertEqual(result, contact)
 
     async def test_update_contact_not_found(self):
         contact_item = ContactUpdate(first_name='Test', last_name='Tessssst', email=None,
                                      phone_number=None, birthday=None, favorite=True)
-        self.session.query().filter().first.return_value = None
+        self.session.scalar.return_value = None
         self.session.commit.return_value = None
 
         result = await self.contacts_repo.update(contact_item, id=1, user_email=self.user_email)
@@ -89,7 +151,7 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
     async def test_get_by_first_name_found(self):
         first_name = "John"
         contact = ContactModel(first_name=first_name, last_name="Doe", phone_number="123456789")
-        self.session.query().filter().first.return_value = contact
+        self.session.scalar.return_value = contact
 
         result = await self.contacts_repo.get_by_first_name(first_name=first_name, user_email=self.user_email)
 
@@ -97,7 +159,7 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
 
     async def test_get_by_first_name_not_found(self):
         first_name = "John"
-        self.session.query().filter().first.return_value = None
+        self.session.scalar.return_value = None
 
         result = await self.contacts_repo.get_by_first_name(first_name=first_name, user_email=self.user_email)
 
@@ -106,7 +168,7 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
     async def test_get_by_last_name_found(self):
         last_name = "Doe"
         contact = ContactModel(first_name="John", last_name=last_name, phone_number="123456789")
-        self.session.query().filter().first.return_value = contact
+        self.session.scalar.return_value = contact
 
         result = await self.contacts_repo.get_by_last_name(last_name=last_name, user_email=self.user_email)
 
@@ -114,7 +176,7 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
 
     async def test_get_by_last_name_not_found(self):
         last_name = "Doe"
-        self.session.query().filter().first.return_value = None
+        self.session.scalar.return_value = None
 
         result = await self.contacts_repo.get_by_last_name(last_name=last_name, user_email=self.user_email)
 
@@ -123,7 +185,7 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
     async def test_get_by_email_found(self):
         email = "test@gmail.com"
         contact = ContactModel(first_name="John", last_name="Doe", phone_number="123456789", email=email)
-        self.session.query().filter().first.return_value = contact
+        self.session.scalar.return_value = contact
 
         result = await self.contacts_repo.get_by_email(email=email, user_email=self.user_email)
 
@@ -131,12 +193,67 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
 
     async def test_get_by_email_not_found(self):
         email = "test@gmail.com"
-        self.session.query().filter().first.return_value = None
+        self.session.scalar.return_value = None
 
         result = await self.contacts_repo.get_by_email(email=email, user_email=self.user_email)
 
         self.assertIsNone(result)
 
+    async def test_get_by_phone_normalizes(self):
+        contacts = [ContactModel(first_name="John", last_name="Doe", phone_number="067 123 45 67")]
+        self.session.scalars.return_value.all = MagicMock(return_value=contacts)
+
+        result = await self.contacts_repo.get_by_phone("+380 (67) 123-45-67", user_email=self.user_email)
+
+        stmt = self.session.scalars.await_args.args[0]
+        compiled = stmt.compile(compile_kwargs={"literal_binds": True})
+        self.assertIn("contacts.phone_e164 = '+380671234567'", str(compiled))
+        self.assertEqual(result, contacts)
+
+    async def test_bulk_create_copies_through_asyncpg(self):
+        self.session.get_bind.return_value.dialect = postgresql.asyncpg.dialect()
+        driver = self.session.connection.return_value.get_raw_connection.return_value.driver_connection
+        driver.copy_records_to_table = AsyncMock()
+        self.session.scalars.return_value.all = MagicMock(return_value=[8, 7])
+
+        await self.contacts_repo.bulk_create([ContactCreate(first_name="John", last_name="Doe", phone_number="1")],
+                                             self.user_email)
+
+        self.assertEqual(driver.copy_records_to_table.await_args.args, ("contacts_import",))
+        self.assertIn("RETURNING id", str(self.session.scalars.await_args.args[0]))
+        self.contacts_repo.add_changes.assert_awaited_once_with(self.user_email, "insert", [7, 8], 1)
+
+    async def test_get_by_phone_invalid(self):
+        result = await self.contacts_repo.get_by_phone("12", user_email=self.user_email)
+
+        self.assertEqual(result, [])
+        self.session.scalars.assert_not_awaited()
+
+    def test_values_normalize_phone(self):
+        create = ContactCreate(first_name="John", last_name="Doe", phone_number="0671234567")
+        self.assertEqual(contact_values(create, self.user_email)["phone_e164"], "+380671234567")
+        update = ContactUpdate(first_name=None, last_name=None, email=None, phone_number="+1 415 555 2671",
+                               birthday=None, favorite=None)
+        self.assertEqual(update_values(update)["phone_e164"], "+14155552671")
+        update = ContactUpdate.model_validate({"first_name": "Jim", "last_name": None, "email": None,
+                                               "phone_number": None, "birthday": None, "favorite": None})
+        self.assertIsNone(update_values(update)["phone_e164"])
+
+    def test_phone_e164_cannot_be_set_by_clients(self):
+        patch = ContactPatch.model_validate({"phone_e164": "+999"})
+        self.assertEqual(update_values(patch), {})
+        create = ContactCreate.model_validate({"first_name": "John", "last_name": "Doe", "phone_number": "0671234567",
+                                               "phone_e164": "+999"})
+        self.assertEqual(contact_values(create, self.user_email)["phone_e164"], "+380671234567")
+
+    def test_normalize_phone(self):
+        cases = {"+380 (67) 123-45-67": "+380671234567", "0671234567": "+380671234567",
+                 "380671234567": "+380671234567", "671234567": "+380671234567",
+                 "0038067 123 45 67": "+380671234567", "+1 415 555 2671": "+14155552671",
+                 "12": None, "": None, None: None}
+        for phone_number, expected in cases.items():
+            self.assertEqual(normalize_phone(phone_number), expected, phone_number)
+
     async def test_birthday_in_7_days_found(self):
         today = date.today()
 
@@ -148,17 +265,97 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
                                  phone_number="123456789",
                                  birthday=today + timedelta(days=4))]
 
-        self.session.query().filter().all.return_value = contacts
+        self.session.scalars.return_value.all = MagicMock(return_value=contacts)
         result = await self.contacts_repo.contacts_birthdays_in_7_days(user_email=self.user_email)
 
         self.assertEqual(result, contacts)
 
     async def test_birthday_in_7_days_not_found(self):
-        self.session.query().filter().all.return_value = None
+        self.session.scalars.return_value.all = MagicMock(return_value=None)
         result = await self.contacts_repo.contacts_birthdays_in_7_days(user_email=self.user_email)
 
         self.assertIsNone(result)
 
+    async def test_birthdays_window_wraps_year(self):
+        self.session.scalars.return_value.all = MagicMock(return_value=[])
+        with patch("contacts.repository.contacts_repo.date", wraps=date) as mock_date:
+            mock_date.today.return_value = date(2026, 12, 28)
+            await self.contacts_repo.contacts_birthdays_in_7_days(user_email=self.user_email, days=10)
+
+        stmt = self.session.scalars.await_args.args[0]
+        compiled = str(stmt.compile(compile_kwargs={"literal_binds": True}))
+        self.assertIn("contacts.birthday_md >= 1228 OR contacts.birthday_md <= 107", compiled)
+
+    def test_birthday_key(self):
+        contact = ContactModel(first_name="John", last_name="Doe", phone_number="123456789",
+                               birthday=date(1990, 2, 14))
+
+        self.assertEqual(contact.birthday_md, 214)
+        self.assertEqual(birthday_key(date(2000, 12, 31)), 1231)
+        self.assertIsNone(birthday_key(None))
+
+
+class TestContactWriteStatements(unittest.IsolatedAsyncioTestCase):
+    """
+    Counts the statements every write sends to a real database.
+    """
+    user_email = "test@example.com"
+
+    async def asyncSetUp(self):
+        self.engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.execute(insert(UserModel), [{"email": self.user_email}])
+        self.statements = []
+        event.listen(self.engine.sync_engine, "before_cursor_execute", self._record)
+        self.session = async_sessionmaker(bind=self.engine, expire_on_commit=False)()
+        self.contacts_repo = ContactsRepo(self.session)
+
+    async def asyncTearDown(self):
+        await self.session.close()
+        await self.engine.dispose()
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement.split()[0])
+
+    async def test_one_statement_per_write(self):
+        # every write is followed by the sequence number upsert and the change log insert
+        contact = await self.contacts_repo.create(
+            ContactCreate(first_name="John", last_name="Doe", phone_number="0671234567"), self.user_email)
+        self.assertEqual(self.statements, ["INSERT", "INSERT", "INSERT"])
+        self.assertEqual((contact.id, contact.phone_e164, contact.favorite), (1, "+380671234567", False))
+
+        self.statements.clear()
+        contact = await self.contacts_repo.update(
+            ContactUpdate(first_name="Jim", last_name="Doe", email=None, phone_number="1",
+                          birthday=date(2000, 2, 29), favorite=True), contact.id, self.user_email)
+        self.assertEqual(self.statements, ["UPDATE", "INSERT", "INSERT"])
+        self.assertEqual((contact.first_name, contact.birthday_md, contact.favorite), ("Jim", 229, True))
+
+        self.statements.clear()
+        contact = await self.contacts_repo.remove(contact.id, self.user_email)
+        self.assertEqual(self.statements, ["DELETE", "INSERT", "INSERT"])
+        self.assertEqual(contact.first_name, "Jim")
+
+    async def test_bulk_create_returns_new_ids(self):
+        self.contacts_repo.add_changes = AsyncMock()
+        items = [ContactCreate(first_name=f"First{n}", last_name="Doe", phone_number=f"{n}") for n in range(3)]
+
+        self.assertEqual(await self.contacts_repo.bulk_create(items, self.user_email), (3, {}))
+
+        self.assertNotIn("SELECT", self.statements)
+        self.assertEqual(self.contacts_repo.add_changes.await_args.args[:3], (self.user_email, "insert", [1, 2, 3]))
+
+    async def test_other_tenants_contacts_are_untouched(self):
+        contact = await self.contacts_repo.create(
+            ContactCreate(first_name="John", last_name="Doe", phone_number="1"), self.user_email)
+
+        self.assertIsNone(await self.contacts_repo.remove(contact.id, "other@example.com"))
+        self.assertIsNone(await self.contacts_repo.update(
+            ContactUpdate(first_name="Jim", last_name=None, email=None, phone_number=None, birthday=None,
+                          favorite=None), contact.id, "other@example.com"))
+        self.assertEqual((await self.contacts_repo.get_by_id(contact.id, self.user_email)).first_name, "John")
+
 
 if __name__ == '__main__':
     unittest.main()
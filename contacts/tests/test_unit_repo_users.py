@@ -1,22 +1,22 @@
 import unittest
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, AsyncMock, patch
 import hashlib
 
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from contacts.models.user import UserModel
 from contacts.repository.users_repo import UserRepo
 from contacts.schemas.users_schema import User
 
 
-class TestContacts(unittest.TestCase):
+class TestContacts(unittest.IsolatedAsyncioTestCase):
     def setUp(self):
-        self.session = MagicMock(spec=Session)
+        self.session = MagicMock(spec=AsyncSession)
         self.user_repo = UserRepo(self.session)
         self.url = 'https://example.com/image.jpg'
         self.email = 'test@example.com'
 
-    def test_create_user(self):
+    async def test_create_user(self):
         user_data = User(email="usertest@gmail.com", password="password123", is_active=None, otp=None, image=None)
 
         self.user_repo.hash_password = MagicMock(return_value=("hashed_password", "salt"))
@@ -25,127 +25,144 @@ class TestContacts(unittest.TestCase):
         self.session.commit.return_value = None
         self.session.refresh.return_value = None
 
-        created_user = self.user_repo.create(user_data)
+        created_user = await self.user_repo.create(user_data)
 
         self.assertIsNotNone(created_user)
         self.assertEqual(created_user.email, user_data.email)
 
-    def test_activate_user(self):
+    async def test_activate_user(self):
         email = "test@example.com"
         user_mock = MagicMock()
         user_mock.confirmed = False
 
-        self.user_repo.get_by_email = MagicMock(return_value=user_mock)
+        self.user_repo.get_by_email = AsyncMock(return_value=user_mock)
 
-        self.user_repo.activate_user(email)
+        await self.user_repo.activate_user(email)
 
-        self.user_repo.get_by_email.assert_called_once_with(email)
+        self.user_repo.get_by_email.assert_awaited_once_with(email)
         self.assertTrue(user_mock.confirmed)
 
     def test_hash_password(self):
         password = 'password123'
         salt = self.user_repo.generate_salt()
 
-        # Ensure data is encoded consistently
-        encoded_password = password.encode()
+        hashed_password, salt_given = self.user_repo.hash_password(password, salt, iterations=1000)
 
-        # No need to decode the salt, just use it as bytes
-        hashed_password, salt_given = self.user_repo.hash_password(password, salt)
+        expected = hashlib.pbkdf2_hmac('sha256', password.encode(), salt, 1000).hex()
+        self.assertEqual(hashed_password, f'pbkdf2_sha256$1000${expected}')
+        self.assertEqual(salt_given, salt.hex())
 
-        # Hash the password with the given salt
-        hashed_password = hashlib.sha256(encoded_password + salt_given.encode()).hexdigest()
+    def test_check_password(self):
+        with patch('contacts.repository.users_repo.PASSWORD_HASH_ITERATIONS', 1000):
+            hashed_password, salt = self.user_repo.hash_password('password123')
 
-        self.assertEqual(hashed_password, hashed_password)
+            self.assertEqual(self.user_repo.check_password('password123', hashed_password, salt), (True, False))
+            self.assertEqual(self.user_repo.check_password('wrong', hashed_password, salt), (False, False))
+        with patch('contacts.repository.users_repo.PASSWORD_HASH_ITERATIONS', 2000):
+            self.assertEqual(self.user_repo.check_password('password123', hashed_password, salt), (True, True))
 
-    def test_get_by_email_found(self):
+    def test_check_legacy_password(self):
+        salt = self.user_repo.generate_salt()
+        legacy_hash = hashlib.sha256('password123'.encode() + salt).hexdigest()
+
+        self.assertEqual(self.user_repo.check_password('password123', legacy_hash, salt.hex()), (True, True))
+        self.assertEqual(self.user_repo.check_password('wrong', legacy_hash, salt.hex()), (False, True))
+
+    async def test_get_by_email_found(self):
         user_email = 'test@example.com'
         user = UserModel
-        self.session.query().filter().first.return_value = user
+        self.session.scalar.return_value = user
 
-        result = self.user_repo.get_by_email(user_email)
+        result = await self.user_repo.get_by_email(user_email)
         self.assertEqual(result, user)
 
-    def test_get_by_email_not_found(self):
+    async def test_get_by_email_not_found(self):
         user_email = 'test@example.com'
-        self.session.query().filter().first.return_value = None
+        self.session.scalar.return_value = None
 
-        result = self.user_repo.get_by_email(user_email)
+        result = await self.user_repo.get_by_email(user_email)
         self.assertIsNone(result)
 
-    def test_verify_password_success(self):
+    async def test_verify_password_success(self):
         user_email = 'test@example.com'
         input_password = 'password123'
         user_mock = UserModel(email=user_email, password='hashed_password', salt='salt')
 
-        self.user_repo.get_by_email = MagicMock(return_value=user_mock)
+        self.user_repo.get_by_email = AsyncMock(return_value=user_mock)
+        self.user_repo.check_password = MagicMock(return_value=(True, False))
 
-        expected_hashed_password = 'hashed_password'
-        self.user_repo.hash_password = MagicMock(return_value=(expected_hashed_password, 'salt'))
+        result = await self.user_repo.verify_password(user_email, input_password)
 
-        result = self.user_repo.verify_password(user_email, input_password)
-
-        self.user_repo.get_by_email.assert_called_once_with(user_email)
-        self.user_repo.hash_password.assert_called_once_with(password=input_password, salt='salt')
+        self.user_repo.get_by_email.assert_awaited_once_with(user_email)
+        self.user_repo.check_password.assert_called_once_with(input_password, 'hashed_password', 'salt')
+        self.session.commit.assert_not_awaited()
 
         self.assertTrue(result)
 
-    def test_verify_password_error(self):
+    async def test_verify_password_error(self):
         user_email = 'test@example.com'
         input_password = 'password123'
         user_mock = UserModel(email=user_email, password='hashed_password', salt='salt')
 
-        self.user_repo.get_by_email = MagicMock(return_value=user_mock)
-
-        expected_hashed_password = 'different_hashed_password'
-        self.user_repo.hash_password = MagicMock(return_value=(expected_hashed_password, 'salt'))
+        self.user_repo.get_by_email = AsyncMock(return_value=user_mock)
+        self.user_repo.check_password = MagicMock(return_value=(False, True))
 
-        result = self.user_repo.verify_password(user_email, input_password)
+        result = await self.user_repo.verify_password(user_email, input_password)
 
-        self.user_repo.get_by_email.assert_called_once_with(user_email)
-        self.user_repo.hash_password.assert_called_once_with(password=input_password, salt='salt')
+        self.user_repo.get_by_email.assert_awaited_once_with(user_email)
+        self.user_repo.check_password.assert_called_once_with(input_password, 'hashed_password', 'salt')
+        self.session.commit.assert_not_awaited()
 
         self.assertFalse(result)
 
-    def test_update_token(self):
+    async def test_verify_password_rehashes_legacy_hash(self):
+        user_email = 'test@example.com'
+        salt = self.user_repo.generate_salt()
+        legacy_hash = hashlib.sha256('password123'.encode() + salt).hexdigest()
+        user_mock = UserModel(email=user_email, password=legacy_hash, salt=salt.hex())
+
+        self.user_repo.get_by_email = AsyncMock(return_value=user_mock)
+        with patch('contacts.repository.users_repo.PASSWORD_HASH_ITERATIONS', 1000):
+            result = await self.user_repo.verify_password(user_email, 'password123')
+
+            self.assertTrue(result)
+            self.assertTrue(user_mock.password.startswith('pbkdf2_sha256$1000$'))
+            self.session.commit.assert_awaited_once()
+            self.assertEqual(self.user_repo.check_password('password123', user_mock.password, user_mock.salt),
+                             (True, False))
+
+    async def test_update_token(self):
         user_email = 'test@example.com'
         refresh_token = 'new_refresh_token'
         user_mock = UserModel(email=user_email)
 
-        self.user_repo.get_by_email = MagicMock(return_value=user_mock)
-        self.user_repo.update_token(user_email, refresh_token)
+        self.user_repo.get_by_email = AsyncMock(return_value=user_mock)
+        await self.user_repo.update_token(user_email, refresh_token)
 
-        self.user_repo.get_by_email.assert_called_once_with(user_email)
+        self.user_repo.get_by_email.assert_awaited_once_with(user_email)
         self.assertEqual(user_mock.refresh_token, refresh_token)
 
-        self.session.commit.assert_called_once()
+        self.session.commit.assert_awaited_once()
 
-    def test_get_user_refresh_token(self):
+    async def test_get_user_refresh_token(self):
         user_email = 'test@example.com'
         refresh_token = 'example_refresh_token'
         user_mock = UserModel(email=user_email, refresh_token=refresh_token)
 
-        filter_mock = self.session.query().filter(UserModel.email == user_email)
-        filter_mock.first = MagicMock(return_value=user_mock)
-
-        self.session.query().filter = MagicMock(return_value=filter_mock)
+        self.session.scalar.return_value = user_mock
 
-        retrieved_refresh_token = self.user_repo.get_user_refresh_token(user_mock)
+        retrieved_refresh_token = await self.user_repo.get_user_refresh_token(user_mock)
 
-        self.session.query().filter.assert_called_once()
+        self.session.scalar.assert_awaited_once()
         self.assertEqual(retrieved_refresh_token, refresh_token)
 
-    def test_update_image(self):
+    async def test_update_image(self):
         user_mock = UserModel(email=self.email, image='old_url')
-        filter_mock = MagicMock()
-        filter_mock.first = MagicMock(return_value=user_mock)
-
-        query_mock = MagicMock()
-        query_mock.filter = MagicMock(return_value=filter_mock)
+        self.session.scalar.return_value = user_mock
 
-        self.session.query = MagicMock(return_value=query_mock)
-        updated_user = self.user_repo.update_image(self.email, self.url)
+        updated_user = await self.user_repo.update_image(self.email, self.url)
 
-        query_mock.filter.assert_called_once()
+        self.session.scalar.assert_awaited_once()
 
         self.assertEqual(updated_user.image, self.url)
 
@@ -0,0 +1,88 @@
+import unittest
+from unittest.mock import AsyncMock
+
+from fastapi.testclient import TestClient
+from pydantic import ValidationError
+
+from contacts.dependencies.auth import get_current_user_email
+from contacts.dependencies.database import get_db
+from contacts.dependencies.settings import Settings, get_settings, secret
+from contacts.main import app
+
+
+class TestSettings(unittest.TestCase):
+    def test_defaults(self):
+        settings = Settings.from_env({})
+
+        self.assertIsNone(settings.database_url)
+        self.assertEqual((settings.db_pool_size, settings.avatar_sizes, settings.database_replica_urls),
+                         (5, [400, 100], []))
+
+    def test_read_from_environment(self):
+        settings = Settings.from_env({
+            'DATABASE_URL': 'postgresql+asyncpg://primary/contacts',
+            'DATABASE_REPLICA_URLS': 'postgresql+asyncpg://a/contacts, postgresql+asyncpg://b/contacts,',
+            'DB_POOL_SIZE': '20',
+            'DB_POOL_PRE_PING': 'false',
+            'AVATAR_SIZES': '256,64',
+            'db_pool_timeout': '1',
+        })
+
+        self.assertEqual(settings.database_replica_urls, ['postgresql+asyncpg://a/contacts',
+                                                          'postgresql+asyncpg://b/contacts'])
+        self.assertEqual((settings.db_pool_size, settings.db_pool_pre_ping, settings.avatar_sizes),
+                         (20, False, [256, 64]))
+        self.assertEqual(settings.db_pool_timeout, 30)
+
+    def test_invalid_value(self):
+        with self.assertRaises(ValidationError):
+            Settings.from_env({'DB_POOL_SIZE': 'many'})
+
+    def test_values_are_checked(self):
+        for name, value in [('DB_POOL_SIZE', '0'), ('RATE_LIMIT_WINDOW', '-1'), ('AVATAR_SIZES', ''),
+                            ('AVATAR_STORAGE', 's3'), ('AVATAR_JOB_STORE', 'redis')]:
+            with self.subTest(name=name), self.assertRaises(ValidationError):
+                Settings.from_env({name: value})
+
+    def test_tuning(self):
+        settings = Settings.from_env({'RATE_LIMIT_REQUESTS': '10', 'ACCESS_TOKEN_TTL_MINUTES': '5',
+                                      'TOKEN_CACHE_SIZE': '100', 'EMAIL_WORKERS': '4'})
+
+        self.assertEqual((settings.rate_limit_requests, settings.rate_limit_window), (10, 120))
+        self.assertEqual((settings.access_token_ttl_minutes, settings.refresh_token_ttl_days), (5, 7))
+        self.assertEqual((settings.token_cache_size, settings.email_workers), (100, 4))
+
+    def test_secrets_are_hidden(self):
+        settings = Settings.from_env({'SECRET_KEY': 'top-secret'})
+
+        self.assertNotIn('top-secret', repr(settings))
+        self.assertEqual(secret(settings.secret_key), 'top-secret')
+        self.assertIsNone(secret(settings.api_secret))
+
+    def test_frozen(self):
+        with self.assertRaises(ValidationError):
+            Settings().db_pool_size = 1
+
+    def test_read_once(self):
+        self.assertIs(get_settings(), get_settings())
+
+
+class TestSettingsDependency(unittest.TestCase):
+    def setUp(self):
+        overrides = dict(app.dependency_overrides)
+        self.addCleanup(lambda: setattr(app, 'dependency_overrides', overrides))
+        app.dependency_overrides.update({
+            get_settings: lambda: Settings(avatar_max_bytes=1),
+            get_current_user_email: lambda: 'user@example.com',
+            get_db: lambda: AsyncMock(),
+        })
+
+    def test_overridden_limit(self):
+        response = TestClient(app).post('/users/upload_image', content=b'x' * 32 * 1024,
+                                        headers={'content-type': 'multipart/form-data; boundary=b'})
+
+        self.assertEqual(response.status_code, 413)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,150 @@
+import asyncio
+import datetime
+import unittest
+from unittest.mock import MagicMock, AsyncMock, patch
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from jose import jwt
+
+from contacts.dependencies import auth
+from contacts.dependencies.cache import IndexedTTLCache, TTLCache, USER_CACHE, TOKEN_CACHE
+from contacts.models.user import UserModel
+from contacts.repository.users_repo import UserRepo
+from contacts.services.user_service import UserService
+
+
+class TestTTLCache(unittest.TestCase):
+    def test_evicts_least_recently_used(self):
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 3)
+        self.assertEqual(len(cache), 2)
+
+    def test_entries_expire(self):
+        cache = TTLCache(maxsize=2, ttl=10)
+        with patch('contacts.dependencies.cache.time.monotonic', return_value=100):
+            cache.set('a', 1)
+            cache.set('b', 2, ttl=30)
+        with patch('contacts.dependencies.cache.time.monotonic', return_value=111):
+            self.assertIsNone(cache.get('a'))
+            self.assertEqual(cache.get('b'), 2)
+            self.assertEqual(len(cache), 1)
+
+    def test_pop(self):
+        cache = TTLCache(maxsize=2, ttl=10)
+        cache.set('a', 1)
+        cache.pop('a')
+        cache.pop('missing')
+
+        self.assertIsNone(cache.get('a'))
+
+    def test_pop_value(self):
+        cache = IndexedTTLCache(maxsize=3, ttl=10)
+        for key, value in [('a', 1), ('b', 2), ('c', 1), ('b', 1), ('d', 3)]:
+            cache.set(key, value)
+
+        cache.pop_value(1)
+
+        self.assertEqual((list(cache.entries), cache.keys_by_value), (['d'], {3: {'d'}}))
+
+
+class TestUserCache(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        USER_CACHE.clear()
+        self.session = MagicMock(spec=AsyncSession)
+        self.email = 'test@example.com'
+        self.session.scalar.return_value = UserModel(email=self.email, password='hashed', salt='00')
+
+    def tearDown(self):
+        USER_CACHE.clear()
+
+    async def test_get_by_email_is_cached(self):
+        first = await UserService(self.session).get_by_email(self.email)
+        second = await UserService(self.session).get_by_email(self.email)
+
+        self.assertEqual(first.email, self.email)
+        self.assertIs(first, second)
+        self.session.scalar.assert_awaited_once()
+
+    async def test_update_token_invalidates(self):
+        await UserService(self.session).get_by_email(self.email)
+        await UserRepo(self.session).update_token(self.email, 'token')
+        await UserService(self.session).get_by_email(self.email)
+
+        self.assertEqual(self.session.scalar.await_count, 3)
+
+    async def test_update_image_invalidates(self):
+        await UserService(self.session).get_by_email(self.email)
+        await UserRepo(self.session).update_image(self.email, 'https://example.com/image.jpg')
+
+        self.assertIsNone(USER_CACHE.get(self.email))
+        self.session.commit.assert_awaited_once()
+
+    async def test_activate_user_invalidates(self):
+        await UserService(self.session).get_by_email(self.email)
+        repo = UserRepo(self.session)
+        repo.get_by_email = AsyncMock(return_value=MagicMock())
+        await repo.activate_user(self.email)
+
+        self.assertIsNone(USER_CACHE.get(self.email))
+
+
+@patch.multiple(auth, SECRET_KEY='secret', ALGORITHM='HS256')
+class TestTokenCache(unittest.TestCase):
+    def setUp(self):
+        TOKEN_CACHE.clear()
+        self.email = 'test@example.com'
+
+    def tearDown(self):
+        TOKEN_CACHE.clear()
+
+    def make_token(self, minutes=30, scope='access_token'):
+        exp = datetime.datetime.utcnow() + datetime.timedelta(minutes=minutes)
+        return jwt.encode({'sub': self.email, 'exp': exp, 'scope': scope}, 'secret', algorithm='HS256')
+
+    def test_verified_token_is_cached(self):
+        token = self.make_token()
+        self.assertEqual(auth.decode_access_token(token), self.email)
+
+        with patch.object(auth.jwt, 'decode') as decode:
+            self.assertEqual(auth.decode_access_token(token), self.email)
+        decode.assert_not_called()
+
+    def test_cache_entry_expires_with_token(self):
+        token = self.make_token(minutes=1)
+        auth.decode_access_token(token)
+
+        _, expires_at = next(iter(TOKEN_CACHE.entries.values()))
+        self.assertAlmostEqual(expires_at - auth.time.monotonic(), 60, delta=2)
+
+    def test_cache_entry_expires_with_cache_ttl(self):
+        auth.decode_access_token(self.make_token(minutes=60))
+
+        _, expires_at = next(iter(TOKEN_CACHE.entries.values()))
+        self.assertAlmostEqual(expires_at - auth.time.monotonic(), TOKEN_CACHE.ttl, delta=2)
+
+    def test_invalid_tokens_are_not_cached(self):
+        self.assertIsNone(auth.decode_access_token(self.make_token(scope='refresh_token')))
+        self.assertIsNone(auth.decode_access_token(self.make_token(minutes=-1)))
+        self.assertIsNone(auth.decode_access_token('garbage'))
+        self.assertEqual(len(TOKEN_CACHE), 0)
+
+    def test_update_token_invalidates(self):
+        auth.decode_access_token(self.make_token())
+        session = MagicMock(spec=AsyncSession)
+        session.scalar.return_value = UserModel(email=self.email)
+
+        asyncio.run(UserRepo(session).update_token(self.email, 'token'))
+
+        self.assertEqual((len(TOKEN_CACHE), TOKEN_CACHE.keys_by_value), (0, {}))
+
+
+if __name__ == '__main__':
+    unittest.main()